@@ -0,0 +1,287 @@
+import os
+import random
+import tempfile
+import time
+
+import db
+import migrations
+import progress
+
+# Instructor analytics, served from precomputed rollup tables.
+# Joining enrollments, completed_lessons and quiz_attempts on every page view
+# would get slower as a course gets busier, so the page only ever reads small
+# per-course / per-lesson summaries that refresh() keeps up to date:
+#
+#   analytics_enrollments_daily   new enrollments per course per day
+#   analytics_lesson_stats        completions and quiz results per lesson
+#   analytics_completion_buckets  how many students are 0%, 1-24%, ... 100% through a course
+#
+# refresh() is incremental. analytics_watermarks remembers the highest id of
+# each source table that has already been counted, and the next run only reads
+# rows past it. Ids are AUTOINCREMENT and SQLite has one writer at a time, so
+# every committed row below the current MAX(id) has already been seen.
+# Run it from `flask refresh-analytics` (add --every N to keep it running).
+
+SOURCES = ('enrollments', 'completed_lessons', 'quiz_attempts')
+# The "has any course changed shape" check (lessons added or removed) uses content_versions times.
+# A stamp's time is taken just before its write waits for the lock, so look back a little.
+CONTENT_WATERMARK = 'content_versions'
+CONTENT_SLACK = 60
+
+BUCKET_LABELS = ['Not started', '1-24%', '25-49%', '50-74%', '75-99%', 'Completed']
+_BUCKET_SQL = '''
+    CASE WHEN completed_count = 0 THEN 0
+         WHEN completed_count >= total_lessons THEN 5
+         ELSE 1 + (completed_count * 4) / total_lessons END
+'''
+
+
+class RefreshStats:
+    def __init__(self):
+        self.new_rows = {source: 0 for source in SOURCES}
+        self.courses = 0   # courses whose completion distribution was recomputed
+        self.elapsed = 0.0
+
+
+def _watermarks(conn):
+    rows = conn.execute('SELECT source, last_id, refreshed_at FROM analytics_watermarks -- full scan: one row per source').fetchall()
+    return {row['source']: (row['last_id'], row['refreshed_at']) for row in rows}
+
+
+def refresh(conn):
+    """Fold every new enrollment, completion and quiz attempt into the rollups. Returns RefreshStats."""
+    stats = RefreshStats()
+    started = time.perf_counter()
+    if conn.in_transaction:
+        conn.commit()
+    # IMMEDIATE: two refreshes running at once must not both count the same rows
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        now = time.time()
+        marks = _watermarks(conn)
+        low = {source: marks.get(source, (0, 0))[0] for source in SOURCES}
+        high = {source: conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {source}').fetchone()[0]
+                for source in SOURCES}
+        touched = set()
+
+        # The GROUP BY results are small (one row per course-day or lesson), so
+        # they are read back and applied with executemany
+        rows = conn.execute('''
+            SELECT course_id, date(COALESCE(created_at, ?), 'unixepoch') AS day, COUNT(*)
+            FROM enrollments WHERE id > ? AND id <= ?
+            GROUP BY course_id, day
+        ''', (now, low['enrollments'], high['enrollments'])).fetchall()
+        conn.executemany('''
+            INSERT INTO analytics_enrollments_daily (course_id, day, enrollments) VALUES (?, ?, ?)
+            ON CONFLICT (course_id, day) DO UPDATE SET enrollments = enrollments + excluded.enrollments
+        ''', [tuple(row) for row in rows])
+        stats.new_rows['enrollments'] = sum(row[2] for row in rows)
+        touched.update(row[0] for row in rows)
+
+        rows = conn.execute('''
+            SELECT completed_lessons.lesson_id, lessons.course_id, COUNT(*)
+            FROM completed_lessons JOIN lessons ON lessons.id = completed_lessons.lesson_id
+            WHERE completed_lessons.id > ? AND completed_lessons.id <= ?
+            GROUP BY completed_lessons.lesson_id
+        ''', (low['completed_lessons'], high['completed_lessons'])).fetchall()
+        conn.executemany('''
+            INSERT INTO analytics_lesson_stats (lesson_id, course_id, completions) VALUES (?, ?, ?)
+            ON CONFLICT (lesson_id) DO UPDATE SET completions = completions + excluded.completions
+        ''', [tuple(row) for row in rows])
+        stats.new_rows['completed_lessons'] = sum(row[2] for row in rows)
+        touched.update(row[1] for row in rows)
+
+        rows = conn.execute('''
+            SELECT quiz_attempts.lesson_id, lessons.course_id, COUNT(*), SUM(passed), SUM(score), SUM(total)
+            FROM quiz_attempts JOIN lessons ON lessons.id = quiz_attempts.lesson_id
+            WHERE quiz_attempts.id > ? AND quiz_attempts.id <= ?
+            GROUP BY quiz_attempts.lesson_id
+        ''', (low['quiz_attempts'], high['quiz_attempts'])).fetchall()
+        conn.executemany('''
+            INSERT INTO analytics_lesson_stats (lesson_id, course_id, quiz_attempts, quiz_passes, quiz_score, quiz_questions)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (lesson_id) DO UPDATE SET
+                quiz_attempts = quiz_attempts + excluded.quiz_attempts,
+                quiz_passes = quiz_passes + excluded.quiz_passes,
+                quiz_score = quiz_score + excluded.quiz_score,
+                quiz_questions = quiz_questions + excluded.quiz_questions
+        ''', [tuple(row) for row in rows])
+        stats.new_rows['quiz_attempts'] = sum(row[2] for row in rows)
+
+        # Adding or deleting a lesson moves every student's percentage without
+        # creating a new event, so also pick up courses whose version changed
+        since = marks.get(CONTENT_WATERMARK, (0, 0))[1] - CONTENT_SLACK
+        for row in conn.execute('''
+            SELECT scope FROM content_versions WHERE updated_at >= ? AND scope LIKE 'course:%' -- full scan: one row per course
+        ''', (since,)):
+            touched.add(int(row['scope'].split(':')[1]))
+
+        # The distribution is recomputed (not adjusted) for each touched course,
+        # from the stored progress counters, which are indexed by course
+        touched = [(course_id,) for course_id in sorted(touched)]
+        conn.executemany('DELETE FROM analytics_completion_buckets WHERE course_id = ?', touched)
+        conn.executemany(f'''
+            INSERT INTO analytics_completion_buckets (course_id, bucket, students)
+            SELECT course_id, {_BUCKET_SQL} AS bucket, COUNT(*) FROM course_progress
+            WHERE course_id = ? GROUP BY bucket
+        ''', touched)
+        stats.courses = len(touched)
+
+        conn.executemany('''
+            INSERT INTO analytics_watermarks (source, last_id, refreshed_at) VALUES (?, ?, ?)
+            ON CONFLICT (source) DO UPDATE SET last_id = excluded.last_id, refreshed_at = excluded.refreshed_at
+        ''', [(source, high[source], now) for source in SOURCES] + [(CONTENT_WATERMARK, 0, now)])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def lesson_deleted(conn, lesson_id):
+    """Drop a deleted lesson's rollup. The caller commits."""
+    conn.execute('DELETE FROM analytics_lesson_stats WHERE lesson_id = ?', (lesson_id,))
+
+
+def course_deleted(conn, course_id):
+    """Drop a deleted course's rollups. The caller commits."""
+    conn.execute('DELETE FROM analytics_enrollments_daily WHERE course_id = ?', (course_id,))
+    conn.execute('DELETE FROM analytics_lesson_stats WHERE course_id = ?', (course_id,))
+    conn.execute('DELETE FROM analytics_completion_buckets WHERE course_id = ?', (course_id,))
+
+
+def get_course_analytics(conn, course_id):
+    """Everything the analytics page shows for one course, read from the rollups only."""
+    enrollments = []
+    total_enrolled = 0
+    for row in conn.execute('SELECT day, enrollments FROM analytics_enrollments_daily WHERE course_id = ? ORDER BY day',
+                            (course_id,)):
+        total_enrolled += row['enrollments']
+        enrollments.append({'day': row['day'], 'enrollments': row['enrollments'], 'total': total_enrolled})
+
+    lessons = []
+    previous = total_enrolled
+    for row in conn.execute('''
+        SELECT lessons.id, lessons.title, analytics_lesson_stats.*
+        FROM lessons LEFT JOIN analytics_lesson_stats ON analytics_lesson_stats.lesson_id = lessons.id
+        WHERE lessons.course_id = ?
+        ORDER BY lessons.lesson_order IS NULL, lessons.lesson_order, lessons.id
+    ''', (course_id,)):
+        completions = row['completions'] or 0
+        lessons.append({
+            'id': row['id'],
+            'title': row['title'],
+            'completions': completions,
+            'reached_percent': round(100 * completions / total_enrolled, 1) if total_enrolled else 0.0,
+            # Students who finished the lesson before this one but not this one
+            'drop_off': max(previous - completions, 0),
+            'quiz_attempts': row['quiz_attempts'] or 0,
+            'quiz_pass_rate': round(100 * row['quiz_passes'] / row['quiz_attempts'], 1) if row['quiz_attempts'] else None,
+            'quiz_average_percent': (round(100 * row['quiz_score'] / row['quiz_questions'], 1)
+                                     if row['quiz_questions'] else None),
+        })
+        previous = completions
+
+    counts = dict(conn.execute('SELECT bucket, students FROM analytics_completion_buckets WHERE course_id = ?',
+                               (course_id,)).fetchall())
+    distribution = [{'bucket': label, 'students': counts.get(index, 0)} for index, label in enumerate(BUCKET_LABELS)]
+
+    row = conn.execute('SELECT refreshed_at FROM analytics_watermarks WHERE source = ?', (SOURCES[0],)).fetchone()
+    return {
+        'course_id': course_id,
+        'refreshed_at': row['refreshed_at'] if row else None,
+        'total_enrolled': total_enrolled,
+        'enrollments_over_time': enrollments,
+        'lessons': lessons,
+        'completion_distribution': distribution,
+    }
+
+
+# --- Benchmark: how much a refresh costs on a big synthetic dataset ---
+
+def _generate(conn, rng, completions, courses=100, lessons_per_course=20, first_user=1, days=90):
+    """Insert students who each enroll in a few courses and finish the first k lessons of each."""
+    now = time.time()
+    made = 0
+    user_id = first_user
+    while made < completions:
+        users, enrollments, completed = [], [], []
+        # One batch of students per transaction
+        for _ in range(1000):
+            users.append((user_id, f'student{user_id}', f'student{user_id}@bench.test', 'x', 'student'))
+            for course_id in rng.sample(range(1, courses + 1), 4):
+                enrolled_at = now - rng.random() * days * 86400
+                enrollments.append((user_id, course_id, enrolled_at))
+                # Fewer students reach each later lesson
+                finished = min(int(rng.expovariate(1 / 10)), lessons_per_course)
+                for order in range(finished):
+                    if made == completions:
+                        break
+                    lesson_id = (course_id - 1) * lessons_per_course + order + 1
+                    completed.append((user_id, lesson_id, enrolled_at + order * 3600))
+                    made += 1
+            user_id += 1
+            if made == completions:
+                break
+        conn.executemany('INSERT INTO users (id, name, email, password, role) VALUES (?, ?, ?, ?, ?)', users)
+        conn.executemany('INSERT INTO enrollments (user_id, course_id, created_at) VALUES (?, ?, ?)', enrollments)
+        conn.executemany('INSERT INTO completed_lessons (user_id, lesson_id, created_at) VALUES (?, ?, ?)', completed)
+        conn.commit()
+    return user_id
+
+
+def benchmark(completions=1_000_000, extra=10_000, seed=42, path=None):
+    """Build a synthetic database and yield (step, seconds, detail) for each refresh step."""
+    courses, lessons_per_course = 100, 20
+    owns_file = path is None
+    if owns_file:
+        fd, path = tempfile.mkstemp(suffix='.db', prefix='analytics-bench-')
+        os.close(fd)
+    conn = db.connect(path)
+    try:
+        migrations.migrate(conn)
+        rng = random.Random(seed)
+
+        started = time.perf_counter()
+        conn.execute("INSERT INTO users (id, name, email, password, role) VALUES (0, 'Bench', 'bench@bench.test', 'x', 'instructor')")
+        conn.executemany('INSERT INTO courses (id, title, instructor_id) VALUES (?, ?, 0)',
+                         [(course_id, f'Course {course_id}') for course_id in range(1, courses + 1)])
+        conn.executemany('INSERT INTO lessons (id, course_id, title, lesson_order) VALUES (?, ?, ?, ?)',
+                         [((course_id - 1) * lessons_per_course + order + 1, course_id, f'Lesson {order + 1}', order + 1)
+                          for course_id in range(1, courses + 1) for order in range(lessons_per_course)])
+        next_user = _generate(conn, rng, completions, courses, lessons_per_course)
+        progress.rebuild_progress(conn)
+        conn.commit()
+        yield 'generate', time.perf_counter() - started, f'{completions:,} completions'
+
+        stats = refresh(conn)
+        yield 'full refresh', stats.elapsed, f'{sum(stats.new_rows.values()):,} rows, {stats.courses} courses'
+
+        stats = refresh(conn)
+        yield 'refresh, nothing new', stats.elapsed, f'{sum(stats.new_rows.values()):,} rows'
+
+        _generate(conn, rng, extra, courses, lessons_per_course, first_user=next_user)
+        progress.rebuild_progress(conn)
+        conn.commit()
+        stats = refresh(conn)
+        yield 'incremental refresh', stats.elapsed, f'{sum(stats.new_rows.values()):,} rows, {stats.courses} courses'
+
+        started = time.perf_counter()
+        get_course_analytics(conn, 1)
+        yield 'page read (rollups)', time.perf_counter() - started, 'one course'
+
+        # What the page would cost without rollups, for comparison
+        started = time.perf_counter()
+        conn.execute('''
+            SELECT lessons.id, COUNT(completed_lessons.id) FROM lessons
+            LEFT JOIN completed_lessons ON completed_lessons.lesson_id = lessons.id
+            WHERE lessons.course_id = ? GROUP BY lessons.id
+        ''', (1,)).fetchall()
+        yield 'same numbers from raw joins', time.perf_counter() - started, 'one course'
+    finally:
+        conn.close()
+        if owns_file:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
@@ -0,0 +1,409 @@
+import functools
+import hashlib
+import json
+import secrets
+import time
+
+from flask import Blueprint, current_app, g, jsonify, request
+
+import certificates
+import lesson_bodies
+import pagination
+import passwords
+import progress
+import quizzes
+import search
+from db import get_db_connection
+
+# Versioned JSON API for the mobile app and other non-browser clients.
+# Everything lives under /api/v1, so a future /api/v2 can change shapes
+# without breaking apps that are already installed.
+#
+# Auth: POST /api/v1/tokens with email + password returns a bearer token.
+# That is the only password check; later requests send
+#   Authorization: Bearer <token>
+# and are matched on a SHA-256 of the token (one indexed lookup, no slow hash).
+#
+# Sparse fieldsets: ?fields=id,title selects only those columns in SQL.
+# Large responses are gzipped for clients that accept it (see compression.py).
+#
+#   POST   /tokens                       email, password -> token
+#   DELETE /tokens/current               revoke the token used for this request
+#   GET    /courses                      ?search= ?cursor= ?limit= ?fields=
+#   GET    /courses/<id>                 ?fields=
+#   GET    /courses/<id>/lessons         the outline (no bodies) ?fields=
+#   GET    /lessons/<id>                 one lesson, with its body ?fields=
+#   POST   /courses/<id>/enrollment      enroll                          (token)
+#   GET    /progress                     every enrolled course           (token)
+#   GET    /courses/<id>/progress        one course                      (token)
+#   POST   /completions                  {"lessons": [{"id": 3, "completed_at": 1700000000}, 4, ...]}
+#                                        many lessons at once, e.g. after working offline  (token, student)
+#   GET    /lessons/<id>/quiz            questions, without the answers  (token, student)
+#   POST   /lessons/<id>/quiz            {"answers": {"<question id>": "A", ...}}  (token, student)
+
+DEFAULT_TOKEN_TTL = 30 * 86400   # seconds
+DEFAULT_MAX_PAGE_SIZE = 100
+DEFAULT_MAX_SYNC_LESSONS = 500   # lessons per POST /completions
+TOUCH_EVERY = 3600               # write last_used_at at most once an hour per token
+
+# What ?fields= may ask for, and what you get without it
+COURSE_FIELDS = ('id', 'title', 'description', 'instructor_id', 'thumbnail')
+LESSON_FIELDS = ('id', 'course_id', 'title', 'video_url', 'lesson_order', 'quiz_pass_percent')
+LESSON_BODY_FIELDS = LESSON_FIELDS + ('content',)
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def init_app(app):
+    app.config.setdefault('API_TOKEN_TTL', DEFAULT_TOKEN_TTL)
+    app.config.setdefault('API_MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+    app.config.setdefault('API_MAX_SYNC_LESSONS', DEFAULT_MAX_SYNC_LESSONS)
+    app.register_blueprint(bp)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@bp.errorhandler(ApiError)
+def api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+
+# --- Tokens ---
+
+def _hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _current_user():
+    """The user behind this request's bearer token, or None."""
+    if 'api_user' in g:
+        return g.api_user
+    g.api_user = None
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT api_tokens.id AS token_id, api_tokens.expires_at, api_tokens.last_used_at,
+               users.id, users.name, users.role
+        FROM api_tokens JOIN users ON users.id = api_tokens.user_id
+        WHERE api_tokens.token_hash = ?
+    ''', (_hash_token(token.strip()),)).fetchone()
+    now = time.time()
+    if row is None or row['expires_at'] < now:
+        return None
+    # Knowing roughly when a token was last used is enough; don't write on every request
+    if (row['last_used_at'] or 0) < now - TOUCH_EVERY:
+        conn.execute('UPDATE api_tokens SET last_used_at = ? WHERE id = ?', (now, row['token_id']))
+        conn.commit()
+    g.api_user = row
+    return row
+
+
+def token_required(role=None):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            user = _current_user()
+            if user is None:
+                raise ApiError(401, 'A valid bearer token is required.')
+            if role and user['role'] != role:
+                raise ApiError(403, f'Only {role}s can do this.')
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@bp.route('/tokens', methods=['POST'])
+def create_token():
+    data = request.get_json(silent=True) or request.form
+    email, password = data.get('email'), data.get('password')
+    if not email or not password:
+        raise ApiError(400, 'email and password are required.')
+
+    conn = get_db_connection()
+    user = conn.execute('SELECT id, name, role, password FROM users WHERE email = ?', (email,)).fetchone()
+    if not user or not passwords.verify_password(user['password'], password):
+        raise ApiError(401, 'Invalid email or password.')
+
+    token = secrets.token_urlsafe(32)
+    now = time.time()
+    expires_at = now + current_app.config['API_TOKEN_TTL']
+    conn.execute('INSERT INTO api_tokens (user_id, token_hash, created_at, expires_at, last_used_at) VALUES (?, ?, ?, ?, ?)',
+                 (user['id'], _hash_token(token), now, expires_at, now))
+    conn.commit()
+    return jsonify({'token': token, 'expires_at': int(expires_at),
+                    'user': {'id': user['id'], 'name': user['name'], 'role': user['role']}}), 201
+
+
+@bp.route('/tokens/current', methods=['DELETE'])
+@token_required()
+def revoke_token():
+    conn = get_db_connection()
+    conn.execute('DELETE FROM api_tokens WHERE id = ?', (g.api_user['token_id'],))
+    conn.commit()
+    return '', 204
+
+
+# --- Helpers ---
+
+def _fields(allowed, always=('id',)):
+    """The columns named by ?fields= (all of allowed by default), checked against allowed."""
+    requested = request.args.get('fields')
+    if not requested:
+        return list(allowed)
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ApiError(400, f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}.")
+    # The id is needed for paging and for links, so it is always included
+    return list(always) + [field for field in fields if field not in always]
+
+
+def _page_size():
+    try:
+        size = int(request.args.get('limit', current_app.config['PAGE_SIZE']))
+    except ValueError:
+        raise ApiError(400, 'limit must be a number.') from None
+    return max(1, min(size, current_app.config['API_MAX_PAGE_SIZE']))
+
+
+def _as_dict(row, fields):
+    return {field: row[field] for field in fields}
+
+
+def _progress_dict(course_id, completed_count, total_lessons):
+    percent = round(100 * completed_count / total_lessons) if total_lessons else 0
+    return {'course_id': course_id, 'completed_count': completed_count, 'total_lessons': total_lessons,
+            'percent': percent}
+
+
+def _lesson_or_404(conn, lesson_id):
+    lesson = conn.execute('SELECT id, course_id, title, quiz_pass_percent FROM lessons WHERE id = ?',
+                          (lesson_id,)).fetchone()
+    if lesson is None:
+        raise ApiError(404, 'Lesson not found.')
+    return lesson
+
+
+# --- Courses and lessons ---
+
+@bp.route('/courses')
+def list_courses():
+    conn = get_db_connection()
+    fields = _fields(COURSE_FIELDS)
+    # Only whitelisted names ever reach the SQL
+    columns = ', '.join(f'courses.{field}' for field in fields)
+    search_query = request.args.get('search', '').strip()
+    cursor = request.args.get('cursor')
+    if search_query:
+        page = search.search_courses(conn, search_query, cursor=cursor, page_size=_page_size(), columns=columns)
+    else:
+        page = pagination.paginate(conn, f'SELECT {columns} FROM courses', (), ('id',),
+                                   cursor=cursor, page_size=_page_size())
+    return jsonify({'items': [_as_dict(row, fields) for row in page],
+                    'next_cursor': page.next_cursor, 'prev_cursor': page.prev_cursor})
+
+
+@bp.route('/courses/<int:course_id>')
+def get_course(course_id):
+    fields = _fields(COURSE_FIELDS)
+    row = get_db_connection().execute(f'SELECT {", ".join(fields)} FROM courses WHERE id = ?',
+                                      (course_id,)).fetchone()
+    if row is None:
+        raise ApiError(404, 'Course not found.')
+    return jsonify(_as_dict(row, fields))
+
+
+@bp.route('/courses/<int:course_id>/lessons')
+def course_outline(course_id):
+    conn = get_db_connection()
+    if conn.execute('SELECT id FROM courses WHERE id = ?', (course_id,)).fetchone() is None:
+        raise ApiError(404, 'Course not found.')
+    fields = _fields(LESSON_FIELDS)
+    lessons = conn.execute(f'SELECT {", ".join(fields)} FROM lessons WHERE course_id = ? ORDER BY lesson_order IS NULL, lesson_order, id',
+                           (course_id,)).fetchall()
+    items = [_as_dict(row, fields) for row in lessons]
+
+    # A student also sees which lessons they finished
+    user = _current_user()
+    if user is not None and user['role'] == 'student':
+        completed = {row[0] for row in conn.execute('''
+            SELECT completed_lessons.lesson_id FROM completed_lessons
+            JOIN lessons ON completed_lessons.lesson_id = lessons.id
+            WHERE completed_lessons.user_id = ? AND lessons.course_id = ?
+        ''', (user['id'], course_id))}
+        for item in items:
+            item['completed'] = item['id'] in completed
+    return jsonify({'course_id': course_id, 'items': items})
+
+
+@bp.route('/lessons/<int:lesson_id>')
+def get_lesson(lesson_id):
+    fields = _fields(LESSON_BODY_FIELDS)
+    row = get_db_connection().execute(f'SELECT {", ".join(fields)} FROM lessons WHERE id = ?',
+                                      (lesson_id,)).fetchone()
+    if row is None:
+        raise ApiError(404, 'Lesson not found.')
+    lesson = _as_dict(row, fields)
+    if 'content' in lesson:
+        lesson['content'] = lesson_bodies.unpack(lesson['content'])
+    return jsonify(lesson)
+
+
+# --- Enrollment and progress ---
+
+@bp.route('/courses/<int:course_id>/enrollment', methods=['POST'])
+@token_required()
+def enroll(course_id):
+    conn = get_db_connection()
+    if conn.execute('SELECT id FROM courses WHERE id = ?', (course_id,)).fetchone() is None:
+        raise ApiError(404, 'Course not found.')
+    user_id = g.api_user['id']
+    cursor = conn.execute('INSERT OR IGNORE INTO enrollments (user_id, course_id, created_at) VALUES (?, ?, ?)',
+                          (user_id, course_id, time.time()))
+    progress.start_course(conn, user_id, course_id)
+    conn.commit()
+    created = cursor.rowcount == 1
+    completed_count, total_lessons = progress.get_progress(conn, user_id, course_id)
+    return jsonify({'enrolled': True, 'created': created,
+                    'progress': _progress_dict(course_id, completed_count, total_lessons)}), 201 if created else 200
+
+
+@bp.route('/progress')
+@token_required()
+def list_progress():
+    rows = get_db_connection().execute('''
+        SELECT enrollments.course_id, IFNULL(course_progress.completed_count, 0) AS completed_count,
+               IFNULL(course_progress.total_lessons, 0) AS total_lessons
+        FROM enrollments
+        LEFT JOIN course_progress ON course_progress.user_id = enrollments.user_id
+                                 AND course_progress.course_id = enrollments.course_id
+        WHERE enrollments.user_id = ?
+        ORDER BY enrollments.course_id
+    ''', (g.api_user['id'],)).fetchall()
+    return jsonify({'items': [_progress_dict(*row) for row in rows]})
+
+
+@bp.route('/courses/<int:course_id>/progress')
+@token_required()
+def course_progress(course_id):
+    completed_count, total_lessons = progress.get_progress(get_db_connection(), g.api_user['id'], course_id)
+    return jsonify(_progress_dict(course_id, completed_count, total_lessons))
+
+
+def _completions(items):
+    """{lesson id: completed_at} from the posted list, using now for a missing or future time."""
+    now = time.time()
+    completions = {}
+    for item in items:
+        if isinstance(item, dict):
+            lesson_id, completed_at = item.get('id'), item.get('completed_at', now)
+        else:
+            lesson_id, completed_at = item, now
+        if isinstance(lesson_id, bool) or not isinstance(lesson_id, int):
+            raise ApiError(400, 'Each lesson must be an id or {"id": <id>, "completed_at": <unix time>}.')
+        if isinstance(completed_at, bool) or not isinstance(completed_at, (int, float)):
+            raise ApiError(400, 'completed_at must be a unix time in seconds.')
+        # A phone with its clock set ahead can't complete lessons in the future
+        completed_at = min(completed_at, now)
+        # Sent twice? The earlier time wins
+        completions[lesson_id] = min(completed_at, completions.get(lesson_id, completed_at))
+    return completions
+
+
+@bp.route('/completions', methods=['POST'])
+@token_required('student')
+def sync_completions():
+    data = request.get_json(silent=True)
+    items = data.get('lessons') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ApiError(400, 'Send {"lessons": [<lesson id> or {"id": ..., "completed_at": ...}, ...]} as JSON.')
+    if len(items) > current_app.config['API_MAX_SYNC_LESSONS']:
+        raise ApiError(400, f"At most {current_app.config['API_MAX_SYNC_LESSONS']} lessons per request.")
+    completions = _completions(items)
+
+    conn = get_db_connection()
+    user_id = g.api_user['id']
+    result = progress.complete_lessons(conn, user_id, completions)
+    # Finishing a course in a batch earns the certificate just like the last click would
+    issued = [certificates.issue_if_complete(conn, user_id, course_id) for course_id in sorted(result.updated_course_ids)]
+    conn.commit()
+
+    rows = conn.execute('''
+        SELECT course_id, completed_count, total_lessons FROM course_progress
+        WHERE user_id = ? AND course_id IN (SELECT value FROM json_each(?))
+        ORDER BY course_id
+    ''', (user_id, json.dumps(sorted(result.course_ids)))).fetchall()
+    return jsonify({
+        'completed': result.completed,
+        'already_completed': result.already_completed,
+        'rejected': result.rejected,
+        'progress': [_progress_dict(*row) for row in rows],
+        'certificates': [{'course_id': cert['course_id'], 'code': cert['code']} for cert in issued if cert],
+    })
+
+
+# --- Quizzes ---
+
+@bp.route('/lessons/<int:lesson_id>/quiz')
+@token_required('student')
+def get_quiz(lesson_id):
+    conn = get_db_connection()
+    lesson = _lesson_or_404(conn, lesson_id)
+    questions = quizzes.load_questions(conn, lesson_id)
+    if not questions:
+        raise ApiError(404, 'This lesson has no quiz yet.')
+    best = quizzes.best_attempt(conn, g.api_user['id'], lesson_id)
+    return jsonify({
+        'lesson_id': lesson_id,
+        'pass_percent': lesson['quiz_pass_percent'],
+        # The correct options stay on the server
+        'questions': [{'id': row['id'], 'question': row['question'],
+                       'options': {'A': row['option_a'], 'B': row['option_b'],
+                                   'C': row['option_c'], 'D': row['option_d']}} for row in questions],
+        'best_attempt': {'score': best['score'], 'total': best['total'], 'passed': bool(best['passed']),
+                         'attempts': best['attempts']} if best else None,
+    })
+
+
+@bp.route('/lessons/<int:lesson_id>/quiz', methods=['POST'])
+@token_required('student')
+def submit_quiz(lesson_id):
+    data = request.get_json(silent=True)
+    answers = data.get('answers') if isinstance(data, dict) else None
+    if not isinstance(answers, dict):
+        raise ApiError(400, 'Send {"answers": {"<question id>": "A", ...}} as JSON.')
+
+    conn = get_db_connection()
+    lesson = _lesson_or_404(conn, lesson_id)
+    questions = quizzes.load_questions(conn, lesson_id)
+    if not questions:
+        raise ApiError(404, 'This lesson has no quiz yet.')
+
+    # Same grading as the HTML form, which names its fields answer_<id>
+    form = {quizzes.field_name(quiz_id): answer for quiz_id, answer in answers.items()}
+    result = quizzes.grade(questions, form, lesson['quiz_pass_percent'])
+    user_id = g.api_user['id']
+    attempt_id = quizzes.record_attempt(conn, user_id, lesson, result)
+    conn.commit()
+
+    certificate = certificates.get_for_student(conn, user_id, lesson['course_id']) if result.passed else None
+    return jsonify({
+        'attempt_id': attempt_id,
+        'score': result.score,
+        'total': result.total,
+        'percent': result.percent,
+        'pass_percent': result.pass_percent,
+        'passed': result.passed,
+        'answers': [{'question_id': quiz_id, 'answer': answer, 'correct': is_correct}
+                    for quiz_id, answer, is_correct in result.answers],
+        'certificate_code': certificate['code'] if certificate else None,
+    }), 201
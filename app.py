@@ -1,32 +1,177 @@
 import sqlite3
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-
-app = Flask(__name__)
-app.secret_key = 'super_secret_key'
-
-# Configuration for Image Uploads
-UPLOAD_FOLDER = 'static/uploads'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-# Ensure the upload folder exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# Database Connection Helper
-def get_db_connection():
-    conn = sqlite3.connect('database.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+import time
+import click
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, session, send_from_directory, make_response, jsonify
+import analytics
+import backups
+import api
+import certificates
+import compression
+import content_io
+import db
+import fragment_cache
+import lesson_bodies
+import metrics
+import migrations
+import pagination
+import passwords
+import ordering
+import progress
+import purge
+import query_plans
+import quizzes
+import rate_limit
+import search
+import settings
+import static_assets
+import uploads
+import versions
+from db import get_db_connection
+
+# All the pages live on the "main" blueprint; create_app() builds an app around it.
+# Nothing here touches the database or the disk until the first request needs it.
+main = Blueprint('main', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    """Build the Flask app. Settings come from the environment, then from config (a dict)."""
+    app = Flask(__name__)
+    app.config.update(settings.from_env())
+    if config:
+        app.config.update(config)
+
+    # Request / SQL / template timing, served at /metrics (see metrics.py)
+    metrics.init_app(app)
+
+    # Per-IP and per-account limits on logins, signups, enrolling and quizzes (see rate_limit.py)
+    rate_limit.init_app(app)
+
+    # gzip for text responses over COMPRESS_MIN_BYTES (see compression.py)
+    compression.init_app(app)
+
+    # url_for('static', ...) links to content-hashed names cached for a year (see static_assets.py)
+    static_assets.init_app(app)
+
+    # Signs the session cookie; set SECRET_KEY in production (serve.py insists on it)
+    # (Flask pre-fills SECRET_KEY and MAX_CONTENT_LENGTH with None, so setdefault won't do for those two)
+    if not app.config['SECRET_KEY']:
+        app.config['SECRET_KEY'] = settings.DEVELOPMENT_SECRET_KEY
+
+    # How many course cards to show per page on the catalogue and dashboard
+    app.config.setdefault('PAGE_SIZE', pagination.DEFAULT_PAGE_SIZE)
+
+    # Database path, pool size and pragmas (see db.py)
+    db.init_app(app)
+
+    # Online snapshots, and the read-only reporting replica made from them (see backups.py)
+    backups.init_app(app)
+
+    # Batch size for deleting big courses and lessons without blocking writers (see purge.py)
+    purge.init_app(app)
+
+    # Rendered-fragment cache: 'memory' (per process), 'sqlite' (shared by workers) or 'none'
+    fragment_cache.init_app(app)
+
+    # Password hashing cost and the size of the hashing pool (see passwords.py)
+    passwords.init_app(app)
+
+    # Image uploads. The folder is created by the first upload, not here.
+    app.config.setdefault('UPLOAD_FOLDER', os.path.join(app.root_path, 'static', 'uploads'))
+    app.config.setdefault('MAX_UPLOAD_BYTES', uploads.DEFAULT_MAX_UPLOAD_BYTES)
+    # Reject oversized requests before they are read (leave room for the other form fields)
+    if app.config['MAX_CONTENT_LENGTH'] is None:
+        app.config['MAX_CONTENT_LENGTH'] = app.config['MAX_UPLOAD_BYTES'] + 1024 * 1024
+
+    app.register_blueprint(main)
+
+    # JSON API for the mobile app, under /api/v1 (see api.py)
+    api.init_app(app)
+    return app
+
+# --- Cached HTML fragments ---
+def viewer_variant(instructor_id):
+    # The ways a course card / lesson list can look, depending on who is looking
+    if session.get('role') == 'student':
+        return 'student'
+    if session.get('user_id') == instructor_id:
+        return 'owner'
+    return 'other'
+
+def render_course_cards(conn, courses):
+    course_versions = versions.get_course_versions(conn, [course['id'] for course in courses])
+    cards = []
+    for course in courses:
+        version = course_versions.get(course['id'])
+        key = None
+        if version is not None:
+            key = f"card:{course['id']}:v{version}:{viewer_variant(course['instructor_id'])}"
+        cards.append(fragment_cache.render_cached(key, course['id'], '_course_card.html', course=course))
+    return cards
 
 # --- ROUTES ---
 
-@app.route('/')
+# --- Uploaded images ---
+# Content-hashed files never change, so browsers and the CDN may cache them forever
+@main.route('/uploads/<path:filename>')
+def uploaded_file(filename):
+    if uploads.is_content_addressed(filename):
+        response = send_from_directory(current_app.config['UPLOAD_FOLDER'], filename, max_age=31536000, etag=False)
+        response.set_etag(filename.split('.')[0])
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
+    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
+
+# --- Fragment cache counters, for sizing FRAGMENT_CACHE_BYTES ---
+@main.route('/cache/stats')
+def cache_stats():
+    return jsonify(fragment_cache.get_cache().info())
+
+# --- Request, SQL and template timings for Prometheus ---
+@main.route('/metrics')
+def prometheus_metrics():
+    registry = metrics.get_registry()
+    if registry is None:
+        return 'Metrics are turned off (METRICS=off).', 404
+    return registry.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+# --- Health checks for the load balancer / process manager ---
+@main.route('/healthz')
+def healthz():
+    # Alive: the process is answering requests
+    return jsonify({'status': 'ok'})
+
+@main.route('/readyz')
+def readyz():
+    # Ready: not shutting down, and the database answers with the latest schema
+    if current_app.extensions.get('draining'):
+        return jsonify({'status': 'draining'}), 503
+    try:
+        version = migrations.get_version(get_db_connection())
+    except Exception as e:
+        return jsonify({'status': 'database unavailable', 'error': str(e)}), 503
+    if version < migrations.LATEST_VERSION:
+        return jsonify({'status': 'migrations pending', 'schema': version}), 503
+    return jsonify({'status': 'ready', 'schema': version})
+
+@main.app_errorhandler(passwords.HashingBusy)
+def hashing_busy(error):
+    # Shed load instead of letting every login wait behind the queue
+    response = make_response('The server is busy, please try again in a moment.', 503)
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@main.app_errorhandler(413)
+def upload_too_large(error):
+    flash(f"That file is too large (max {current_app.config['MAX_UPLOAD_BYTES'] // (1024 * 1024)} MB).", 'danger')
+    return redirect(request.referrer or url_for('main.dashboard'))
+
+@main.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/signup', methods=['GET', 'POST'])
+@main.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
         name = request.form['name']
@@ -37,27 +182,26 @@ def signup():
 
         if password != confirm_password:
             flash('Passwords do not match!', 'danger')
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = passwords.hash_password(password)
 
         conn = get_db_connection()
         try:
             conn.execute('INSERT INTO users (name, email, password, role) VALUES (?, ?, ?, ?)',
                          (name, email, hashed_password, role))
             conn.commit()
-            conn.close()
             flash('Account created! Please sign in.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         except sqlite3.IntegrityError:
             flash('Email already registered!', 'danger')
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
         except Exception as e:
             return f"Error: {e}"
 
     return render_template('signup.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email']
@@ -65,120 +209,151 @@ def login():
 
         conn = get_db_connection()
         user = conn.execute('SELECT * FROM users WHERE email = ?', (email,)).fetchone()
-        conn.close()
 
-        if user and check_password_hash(user['password'], password):
+        if user and passwords.verify_password(user['password'], password):
+            # Upgrade hashes made with older (cheaper) settings while we know the password
+            if passwords.needs_rehash(user['password']):
+                conn.execute('UPDATE users SET password = ? WHERE id = ?',
+                             (passwords.hash_password(password), user['id']))
+                conn.commit()
+
             session['user_id'] = user['id']
             session['user_name'] = user['name']
             session['role'] = user['role']
             flash('Login successful!', 'success')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             flash('Invalid email or password', 'danger')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
     return render_template('login.html')
 
-@app.route('/dashboard')
+@main.route('/dashboard')
 def dashboard():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     conn = get_db_connection()
-    courses = []
+    courses = pagination.Page([])
+    cursor = request.args.get('cursor')
+    page_size = current_app.config['PAGE_SIZE']
 
-    # If Instructor: Show courses they created
+    # If Instructor: Show courses they created (one page at a time)
     if session['role'] == 'instructor':
-        courses = conn.execute('SELECT * FROM courses WHERE instructor_id = ?', (session['user_id'],)).fetchall()
+        courses = pagination.paginate(conn, 'SELECT * FROM courses WHERE instructor_id = ?',
+                                      (session['user_id'],), ('id',), cursor=cursor, page_size=page_size)
     
     # If Student: Show courses they are enrolled in
     elif session['role'] == 'student':
-        # This SQL joins the courses table with the enrollments table
-        courses = conn.execute('''
-            SELECT courses.* FROM courses 
-            JOIN enrollments ON courses.id = enrollments.course_id 
+        # This SQL joins the courses table with the enrollments table.
+        # Paging by enrollments.course_id lets SQLite walk the (user_id, course_id) index in order.
+        courses = pagination.paginate(conn, '''
+            SELECT courses.*, enrollments.course_id AS course_key FROM enrollments
+            JOIN courses ON courses.id = enrollments.course_id 
             WHERE enrollments.user_id = ?
-        ''', (session['user_id'],)).fetchall()
+        ''', (session['user_id'],), ('course_key',), cursor=cursor, page_size=page_size)
+        # Progress, next lesson and last activity for every card on the page, in one query
+        summaries = progress.course_summaries(conn, session['user_id'], [course['id'] for course in courses])
+        for summary in summaries.values():
+            if summary['last_activity']:
+                summary['last_activity'] = time.strftime('%B %d, %Y', time.localtime(summary['last_activity']))
+        return render_template('dashboard.html', courses=courses, summaries=summaries)
 
-    conn.close()
-    return render_template('dashboard.html', courses=courses)
+    return render_template('dashboard.html', courses=courses, summaries={})
 
-@app.route('/logout')
+@main.route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 # --- NEW ROUTE: Create Course ---
 # --- NEW ROUTE: Create Course (FIXED) ---
-@app.route('/create_course', methods=['GET', 'POST'])
+@main.route('/create_course', methods=['GET', 'POST'])
 def create_course():
     # Security Check: Only instructors can create courses
     if 'user_id' not in session or session['role'] != 'instructor':
         flash('Access denied. Instructors only.', 'danger')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     if request.method == 'POST':
         title = request.form['title']
         description = request.form['description']
         file = request.files['thumbnail'] # Get the image file
 
-        # Handle Image Upload
+        # Handle Image Upload (stored under its content hash)
+        conn = get_db_connection()
         filename = None
         if file and file.filename != '':
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            try:
+                filename = uploads.save_upload(conn, file)
+            except uploads.UploadError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('main.create_course'))
 
         # Save to Database (NOW INCLUDES THUMBNAIL)
-        conn = get_db_connection()
-        conn.execute('INSERT INTO courses (title, description, instructor_id, thumbnail) VALUES (?, ?, ?, ?)',
-                     (title, description, session['user_id'], filename))
+        cursor = conn.execute('INSERT INTO courses (title, description, instructor_id, thumbnail) VALUES (?, ?, ?, ?)',
+                              (title, description, session['user_id'], filename))
+        search.index_course(conn, cursor.lastrowid)
+        versions.bump(conn, cursor.lastrowid)
         conn.commit()
-        conn.close()
 
         flash('Course created successfully!', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     return render_template('create_course.html')
 
-@app.route('/courses')
+@main.route('/courses')
 def courses():
     conn = get_db_connection()
     
-    # 1. Grab the search term from the URL (if there is one)
+    # 1. Grab the search term (and which page we are on) from the URL
     search_query = request.args.get('search', '')
+    cursor = request.args.get('cursor')
+    page_size = current_app.config['PAGE_SIZE']
+
+    # Conditional GET: if the catalogue hasn't changed since the browser's copy, answer 304
+    etag = None
+    stamp = versions.get_stamp(conn, versions.CATALOGUE)
+    if stamp and versions.can_validate():
+        version, last_modified = stamp
+        etag = versions.make_etag('courses', version, *versions.viewer(), search_query, cursor, page_size)
+        cached = versions.not_modified(etag, last_modified)
+        if cached:
+            return cached
     
-    # 2. If the user searched for something, filter the database
+    # 2. If the user searched for something, ask the full-text index (ranked by relevance)
     if search_query:
-        # We use % around the search term as wildcards (e.g., %Python% matches "Advanced Python")
-        sql_query = 'SELECT * FROM courses WHERE title LIKE ? OR description LIKE ?'
-        wildcard_search = f"%{search_query}%"
-        all_courses = conn.execute(sql_query, (wildcard_search, wildcard_search)).fetchall()
+        all_courses = search.search_courses(conn, search_query, cursor=cursor, page_size=page_size)
     
-    # 3. If there is no search, just show everything
+    # 3. If there is no search, list every course, one page at a time
     else:
-        all_courses = conn.execute('SELECT * FROM courses').fetchall()
-        
-    conn.close()
+        all_courses = pagination.paginate(conn, 'SELECT * FROM courses', (), ('id',),
+                                          cursor=cursor, page_size=page_size)
+
     
     # We pass the search_query back to the template so the search bar doesn't clear itself
-    return render_template('courses.html', courses=all_courses, search_query=search_query)
+    course_cards = render_course_cards(conn, all_courses)
+    response = make_response(render_template('courses.html', courses=all_courses, course_cards=course_cards,
+                                             search_query=search_query))
+    if etag:
+        versions.add_validators(response, etag, last_modified)
+    return response
 
 # --- NEW ROUTE: Add Lesson ---
-@app.route('/course/<int:course_id>/add_lesson', methods=['GET', 'POST'])
+@main.route('/course/<int:course_id>/add_lesson', methods=['GET', 'POST'])
 def add_lesson(course_id):
     # Security: Ensure user is logged in
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     # 1. Check if the course actually belongs to this instructor
     conn = get_db_connection()
     course = conn.execute('SELECT * FROM courses WHERE id = ?', (course_id,)).fetchone()
     
     if not course or course['instructor_id'] != session['user_id']:
-        conn.close()
         flash('You do not have permission to modify this course.', 'danger')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     # 2. Handle Form Submission
     if request.method == 'POST':
@@ -186,173 +361,284 @@ def add_lesson(course_id):
         content = request.form['content']
         video_url = request.form['video_url']
 
-        # Save to lessons table
-        conn.execute('INSERT INTO lessons (course_id, title, content, video_url) VALUES (?, ?, ?, ?)',
-                     (course_id, title, content, video_url))
+        # Save to lessons table (long lessons are stored compressed, see lesson_bodies.py)
+        # New lessons go to the end of the course (see ordering.py)
+        conn.execute('INSERT INTO lessons (course_id, title, content, video_url, lesson_order) VALUES (?, ?, ?, ?, ?)',
+                     (course_id, title, lesson_bodies.pack(content), video_url, ordering.next_position(conn, course_id)))
+        progress.lesson_added(conn, course_id)
+        search.index_course(conn, course_id)
+        versions.bump(conn, course_id)
         conn.commit()
-        conn.close()
+        fragment_cache.invalidate_course(course_id)
         
         flash('Lesson added successfully!', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
-    conn.close()
     return render_template('add_lesson.html')
 
 # --- NEW ROUTE: View Course Details ---
-@app.route('/course/<int:course_id>')
+@main.route('/course/<int:course_id>')
 def course_details(course_id):
     conn = get_db_connection()
+    is_student = 'user_id' in session and session.get('role') == 'student'
+
+    # Conditional GET, checked BEFORE the lesson queries. The page is personal, so the
+    # ETag covers the course version, who is looking and (for students) their progress.
+    etag = None
+    progress_row = None
+    stamp = versions.get_stamp(conn, versions.course_scope(course_id))
+    if is_student:
+        progress_row = progress.get_progress_row(conn, session['user_id'], course_id)
+    if stamp and versions.can_validate():
+        version, last_modified = stamp
+        personal = None
+        if progress_row:
+            personal = (progress_row['completed_count'], progress_row['total_lessons'])
+            last_modified = max(last_modified, progress_row['updated_at'] or 0)
+        etag = versions.make_etag('course', course_id, version, *versions.viewer(), personal)
+        cached = versions.not_modified(etag, last_modified)
+        if cached:
+            return cached
+
     course = conn.execute('SELECT * FROM courses WHERE id = ?', (course_id,)).fetchone()
-    lessons = conn.execute('SELECT * FROM lessons WHERE course_id = ?', (course_id,)).fetchall()
+    if course is None:
+        flash('Course not found!', 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    # Only what the outline shows: the lesson bodies are loaded one at a time, when opened
+    lessons = conn.execute('SELECT id, title, video_url FROM lessons WHERE course_id = ? ORDER BY lesson_order IS NULL, lesson_order, id',
+                           (course_id,)).fetchall()
     
     completed_lesson_ids = []
-    if 'user_id' in session and session.get('role') == 'student':
+    completed_count, total_lessons = 0, len(lessons)
+    if is_student:
+        # Which lessons get a ✅ (the UNIQUE constraint means no duplicates to remove)
         completed = conn.execute('''
             SELECT completed_lessons.lesson_id 
             FROM completed_lessons 
             JOIN lessons ON completed_lessons.lesson_id = lessons.id
             WHERE completed_lessons.user_id = ? AND lessons.course_id = ?
         ''', (session['user_id'], course_id)).fetchall()
-        
-        # THE FIX: We wrap the list in set() to instantly destroy any duplicate clicks!
-        completed_lesson_ids = list(set([row['lesson_id'] for row in completed]))
-
-    conn.close()
-
-    if course is None:
-        flash('Course not found!', 'danger')
-        return redirect(url_for('dashboard'))
-
-    return render_template('course_details.html', course=course, lessons=lessons, completed_lesson_ids=completed_lesson_ids)
+        completed_lesson_ids = [row['lesson_id'] for row in completed]
+
+        # The progress bar comes straight from the stored counters
+        if progress_row:
+            completed_count, total_lessons = progress_row['completed_count'], progress_row['total_lessons']
+
+    # The lesson list is the expensive part of the page, so it comes from the fragment cache
+    key = None
+    if stamp:
+        variant = viewer_variant(course['instructor_id'])
+        if variant == 'student':
+            variant += ':' + versions.make_etag(*sorted(completed_lesson_ids))
+        key = f"lessons:{course_id}:v{stamp[0]}:{variant}"
+    lesson_list = fragment_cache.render_cached(key, course_id, '_lesson_list.html', course=course, lessons=lessons,
+                                               completed_lesson_ids=completed_lesson_ids)
+
+    response = make_response(render_template('course_details.html', course=course, lessons=lessons,
+                                             lesson_list=lesson_list,
+                                             completed_count=completed_count, total_lessons=total_lessons))
+    if etag:
+        versions.add_validators(response, etag, last_modified)
+    return response
+
+# --- NEW ROUTE: One Lesson's Body ---
+# The course page only lists the lessons; each body is fetched from here when its
+# section is opened. The same for everyone, so any cache may keep it as long as
+# it checks back (the ETag changes whenever the course does).
+@main.route('/lesson/<int:lesson_id>/body')
+def lesson_body(lesson_id):
+    conn = get_db_connection()
+    lesson = lesson_bodies.load_body(conn, lesson_id)
+    if lesson is None:
+        return 'Lesson not found.', 404
+    course_id, body = lesson
+
+    stamp = versions.get_stamp(conn, versions.course_scope(course_id))
+    etag = versions.make_etag('lesson-body', lesson_id, stamp[0] if stamp else None)
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template('_lesson_body.html', body=body))
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
 
 # --- NEW ROUTE: Edit Course ---
-@app.route('/course/<int:course_id>/edit', methods=['GET', 'POST'])
+@main.route('/course/<int:course_id>/edit', methods=['GET', 'POST'])
 def edit_course(course_id):
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     conn = get_db_connection()
     course = conn.execute('SELECT * FROM courses WHERE id = ?', (course_id,)).fetchone()
 
     # Security: Ensure only the creator can edit
     if not course or course['instructor_id'] != session['user_id']:
-        conn.close()
         flash('Permission denied.', 'danger')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     if request.method == 'POST':
         title = request.form['title']
         description = request.form['description']
         file = request.files['thumbnail']
 
-        # If a new image is uploaded, update it. Otherwise keep the old one.
+        # If a new image is uploaded, update it (and let go of the old one). Otherwise keep the old one.
         if file and file.filename != '':
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            try:
+                filename = uploads.save_upload(conn, file)
+            except uploads.UploadError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('main.edit_course', course_id=course_id))
+            uploads.release(conn, course['thumbnail'])
             conn.execute('UPDATE courses SET title = ?, description = ?, thumbnail = ? WHERE id = ?',
                          (title, description, filename, course_id))
         else:
             conn.execute('UPDATE courses SET title = ?, description = ? WHERE id = ?',
                          (title, description, course_id))
-        
+
+        search.index_course(conn, course_id)
+        versions.bump(conn, course_id)
         conn.commit()
-        conn.close()
+        fragment_cache.invalidate_course(course_id)
+        uploads.purge_orphans(conn)
         flash('Course updated successfully!', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
-    conn.close()
     return render_template('edit_course.html', course=course)
 # --- NEW ROUTE: Delete Course ---
-@app.route('/course/<int:course_id>/delete', methods=['POST'])
+@main.route('/course/<int:course_id>/delete', methods=['POST'])
 def delete_course(course_id):
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     conn = get_db_connection()
     course = conn.execute('SELECT * FROM courses WHERE id = ?', (course_id,)).fetchone()
 
     # Security: Ensure only the creator can delete
     if not course or course['instructor_id'] != session['user_id']:
-        conn.close()
         flash('Permission denied.', 'danger')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
-    # Delete the course (and its lessons)
-    conn.execute('DELETE FROM lessons WHERE course_id = ?', (course_id,)) # Delete lessons first
+    # Clear out the completions, attempts and enrollments in small batches first,
+    # so a big course never holds the write lock for long (see purge.py)
+    purge.purge_course(conn, course_id)
+    analytics.course_deleted(conn, course_id)
+    # The lessons, their quizzes and anything added meanwhile cascade with the course
     conn.execute('DELETE FROM courses WHERE id = ?', (course_id,))
+    search.remove_course(conn, course_id)
+    versions.forget(conn, course_id)
+    versions.bump(conn)
+    uploads.release(conn, course['thumbnail'])
     conn.commit()
-    conn.close()
+    fragment_cache.invalidate_course(course_id)
+    uploads.purge_orphans(conn)
     
     flash('Course deleted successfully.', 'info')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
 # --- NEW ROUTE: Delete Lesson ---
-@app.route('/lesson/<int:lesson_id>/delete', methods=['POST'])
+@main.route('/lesson/<int:lesson_id>/delete', methods=['POST'])
 def delete_lesson(lesson_id):
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     conn = get_db_connection()
     # Find the lesson and join with course to check instructor permission
     lesson = conn.execute('SELECT lessons.id, courses.instructor_id, lessons.course_id FROM lessons JOIN courses ON lessons.course_id = courses.id WHERE lessons.id = ?', (lesson_id,)).fetchone()
 
     if not lesson or lesson['instructor_id'] != session['user_id']:
-        conn.close()
         flash('Permission denied.', 'danger')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     course_id = lesson['course_id'] # Save this to redirect back correctly
-    conn.execute('DELETE FROM lessons WHERE id = ?', (lesson_id,))
+    purge.purge_lesson(conn, course_id, lesson_id) # Completions and attempts, in small batches
+    progress.lesson_deleted(conn, course_id, lesson_id) # Before any last completions cascade
+    conn.execute('DELETE FROM lessons WHERE id = ?', (lesson_id,)) # Quizzes cascade
+    analytics.lesson_deleted(conn, lesson_id)
+    # Students who had done every other lesson have now finished the course
+    certificates.issue_qualified(conn, course_id)
+    search.index_course(conn, course_id)
+    versions.bump(conn, course_id)
     conn.commit()
-    conn.close()
+    fragment_cache.invalidate_course(course_id)
 
     flash('Lesson deleted.', 'info')
-    return redirect(url_for('course_details', course_id=course_id))
+    return redirect(url_for('main.course_details', course_id=course_id))
+
+# --- NEW ROUTE: Move a Lesson (drag and drop on the course page) ---
+@main.route('/lesson/<int:lesson_id>/move', methods=['POST'])
+def move_lesson(lesson_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Please log in.'}), 401
+
+    conn = get_db_connection()
+    lesson = conn.execute('SELECT lessons.id, lessons.course_id, courses.instructor_id FROM lessons JOIN courses ON lessons.course_id = courses.id WHERE lessons.id = ?', (lesson_id,)).fetchone()
+    if not lesson or lesson['instructor_id'] != session['user_id']:
+        return jsonify({'error': 'Permission denied.'}), 403
+
+    # after_id: the lesson it now comes straight after (left out = move to the top)
+    data = request.get_json(silent=True) or request.form
+    after_id = data.get('after_id') or None
+    try:
+        after_id = int(after_id) if after_id is not None else None
+        key, renumbered = ordering.move_lesson(conn, lesson['course_id'], lesson_id, after_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    versions.bump(conn, lesson['course_id'])
+    conn.commit()
+    fragment_cache.invalidate_course(lesson['course_id'])
+    return jsonify({'lesson_id': lesson_id, 'lesson_order': key, 'renumbered': renumbered})
 
 # --- NEW ROUTE: Enroll in a Course ---
-@app.route('/enroll/<int:course_id>', methods=['POST'])
+@main.route('/enroll/<int:course_id>', methods=['POST'])
 def enroll(course_id):
     # 1. Make sure the user is logged in
     if 'user_id' not in session:
         flash('Please log in to enroll in courses.', 'warning')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     user_id = session['user_id']
     conn = get_db_connection()
+
+    course = conn.execute('SELECT id FROM courses WHERE id = ?', (course_id,)).fetchone()
+    if not course:
+        flash('Course not found!', 'danger')
+        return redirect(url_for('main.courses'))
     
-    # 2. Check if they are already enrolled (no duplicates!)
-    existing = conn.execute('SELECT * FROM enrollments WHERE user_id = ? AND course_id = ?', 
-                            (user_id, course_id)).fetchone()
-    
-    if existing:
+    # 2. Save the enrollment. The UNIQUE (user_id, course_id) index stops duplicates,
+    #    so OR IGNORE does the "already enrolled?" check in the same statement.
+    cursor = conn.execute('INSERT OR IGNORE INTO enrollments (user_id, course_id, created_at) VALUES (?, ?, ?)',
+                          (user_id, course_id, time.time()))
+    progress.start_course(conn, user_id, course_id)
+    conn.commit()
+
+    if cursor.rowcount == 0:
         flash('You are already enrolled in this course!', 'info')
     else:
-        # 3. Save the enrollment to the database
-        conn.execute('INSERT INTO enrollments (user_id, course_id) VALUES (?, ?)', 
-                     (user_id, course_id))
-        conn.commit()
         flash('Successfully enrolled! The course has been added to your dashboard.', 'success')
         
-    conn.close()
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
 # --- NEW ROUTE: Add a Quiz to a Lesson ---
-@app.route('/add_quiz/<int:lesson_id>', methods=['GET', 'POST'])
+@main.route('/add_quiz/<int:lesson_id>', methods=['GET', 'POST'])
 def add_quiz(lesson_id):
     # Only allow instructors to access this page
     if 'user_id' not in session or session.get('role') != 'instructor':
         flash('Only instructors can add quizzes.', 'danger')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     conn = get_db_connection()
     
     # Verify the lesson exists and get the course_id so we know where to redirect later
-    lesson = conn.execute('SELECT * FROM lessons WHERE id = ?', (lesson_id,)).fetchone()
+    lesson = conn.execute('SELECT id, course_id, title, quiz_pass_percent FROM lessons WHERE id = ?',
+                          (lesson_id,)).fetchone()
     
     if not lesson:
         flash('Lesson not found!', 'danger')
-        conn.close()
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     # If the instructor submits the form
     if request.method == 'POST':
@@ -363,28 +649,38 @@ def add_quiz(lesson_id):
         option_d = request.form['option_d']
         correct_option = request.form['correct_option']
 
-        # Save the new quiz to the database
+        # Optional passing score (blank = practice quiz that never completes the lesson)
+        pass_percent = request.form.get('pass_percent', '').strip()
+        if pass_percent and not (pass_percent.isdigit() and 1 <= int(pass_percent) <= 100):
+            flash('The passing score must be a whole number between 1 and 100.', 'danger')
+            return redirect(url_for('main.add_quiz', lesson_id=lesson_id))
+
+        # Each submit adds one more question to the lesson's quiz
         conn.execute('''
             INSERT INTO quizzes (lesson_id, question, option_a, option_b, option_c, option_d, correct_option)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         ''', (lesson_id, question, option_a, option_b, option_c, option_d, correct_option))
-        
+        conn.execute('UPDATE lessons SET quiz_pass_percent = ? WHERE id = ?',
+                     (int(pass_percent) if pass_percent else None, lesson_id))
+        versions.bump(conn, lesson['course_id'], catalogue=False)
         conn.commit()
-        conn.close()
+        fragment_cache.invalidate_course(lesson['course_id'])
         
-        flash('Quiz added successfully!', 'success')
-        return redirect(url_for('course_details', course_id=lesson['course_id']))
+        flash('Question added successfully!', 'success')
+        if request.form.get('next') == 'another':
+            return redirect(url_for('main.add_quiz', lesson_id=lesson_id))
+        return redirect(url_for('main.course_details', course_id=lesson['course_id']))
 
-    conn.close()
-    return render_template('add_quiz.html', lesson=lesson)
+    question_count = conn.execute('SELECT COUNT(*) FROM quizzes WHERE lesson_id = ?', (lesson_id,)).fetchone()[0]
+    return render_template('add_quiz.html', lesson=lesson, question_count=question_count)
 
 # --- NEW ROUTE: User Profile ---
-@app.route('/profile', methods=['GET', 'POST'])
+@main.route('/profile', methods=['GET', 'POST'])
 def profile():
     # Make sure the user is logged in
     if 'user_id' not in session:
         flash('Please log in to view your profile.', 'warning')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
         
     conn = get_db_connection()
     user_id = session['user_id']
@@ -396,8 +692,14 @@ def profile():
         
         # If they uploaded a new image
         if file and file.filename != '':
-            filename = secure_filename(file.filename)
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            try:
+                filename = uploads.save_upload(conn, file)
+            except uploads.UploadError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('main.profile'))
+
+            old = conn.execute('SELECT profile_pic FROM users WHERE id = ?', (user_id,)).fetchone()
+            uploads.release(conn, old['profile_pic'])
             
             # Update database with new name AND new picture
             conn.execute('UPDATE users SET name = ?, profile_pic = ? WHERE id = ?', 
@@ -407,21 +709,21 @@ def profile():
             conn.execute('UPDATE users SET name = ? WHERE id = ?', (name, user_id))
             
         conn.commit()
+        uploads.purge_orphans(conn)
         session['user_name'] = name  # Update the session so the welcome message changes
         flash('Profile updated successfully!', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
         
     # Fetch current user data to display on the page
     user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-    conn.close()
     
     return render_template('profile.html', user=user)
 
 # --- NEW ROUTE: Mark Lesson as Complete ---
-@app.route('/complete_lesson/<int:lesson_id>', methods=['POST'])
+@main.route('/complete_lesson/<int:lesson_id>', methods=['POST'])
 def complete_lesson(lesson_id):
     if 'user_id' not in session or session.get('role') != 'student':
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     user_id = session['user_id']
     conn = get_db_connection()
@@ -429,90 +731,348 @@ def complete_lesson(lesson_id):
     # Find out which course this lesson belongs to so we can redirect the user back
     lesson = conn.execute('SELECT course_id FROM lessons WHERE id = ?', (lesson_id,)).fetchone()
     
-    if lesson:
-        try:
-            # Try to save the completed lesson
-            conn.execute('INSERT INTO completed_lessons (user_id, lesson_id) VALUES (?, ?)', 
-                         (user_id, lesson_id))
-            conn.commit()
-            flash('Lesson marked as complete! Great job!', 'success')
-        except sqlite3.IntegrityError:
-            # If we get an IntegrityError, it means the UNIQUE constraint caught a duplicate
-            # meaning they already completed it. We just ignore it!
-            pass
-            
-    conn.close()
-    return redirect(url_for('course_details', course_id=lesson['course_id']))
+    if not lesson:
+        flash('Lesson not found!', 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    # The UNIQUE constraint ignores a duplicate click, so only a NEW completion
+    # bumps the progress counter (both in the same transaction)
+    cursor = conn.execute('INSERT OR IGNORE INTO completed_lessons (user_id, lesson_id, created_at) VALUES (?, ?, ?)',
+                          (user_id, lesson_id, time.time()))
+    if cursor.rowcount == 1:
+        progress.lesson_completed(conn, user_id, lesson['course_id'])
+        # The last lesson? Then the certificate is issued now, dated today, once
+        issued = certificates.issue_if_complete(conn, user_id, lesson['course_id'])
+        conn.commit()
+        flash('Lesson marked as complete! Great job!', 'success')
+        if issued:
+            flash('🎉 You finished the course! Your certificate is ready.', 'success')
+
+    return redirect(url_for('main.course_details', course_id=lesson['course_id']))
 
 # --- NEW ROUTE: Student Takes a Quiz ---
-@app.route('/take_quiz/<int:lesson_id>', methods=['GET', 'POST'])
+@main.route('/take_quiz/<int:lesson_id>', methods=['GET', 'POST'])
 def take_quiz(lesson_id):
     # Only allow logged-in students
     if 'user_id' not in session or session.get('role') != 'student':
         flash('Only students can take quizzes.', 'danger')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     conn = get_db_connection()
-    lesson = conn.execute('SELECT * FROM lessons WHERE id = ?', (lesson_id,)).fetchone()
+    lesson = conn.execute('SELECT id, course_id, title, quiz_pass_percent FROM lessons WHERE id = ?',
+                          (lesson_id,)).fetchone()
+    if not lesson:
+        flash('Lesson not found!', 'danger')
+        return redirect(url_for('main.dashboard'))
     
-    # Fetch the quiz for this specific lesson
-    quiz = conn.execute('SELECT * FROM quizzes WHERE lesson_id = ?', (lesson_id,)).fetchone()
+    # Every question of this lesson's quiz, in one query
+    questions = quizzes.load_questions(conn, lesson_id)
 
     # If the instructor hasn't added a quiz yet, send the student back
-    if not quiz:
+    if not questions:
         flash('No quiz available for this lesson yet!', 'info')
-        conn.close()
-        return redirect(url_for('course_details', course_id=lesson['course_id']))
+        return redirect(url_for('main.course_details', course_id=lesson['course_id']))
 
-    # When the student clicks "Submit Answer"
+    # When the student clicks "Submit Answers", grade them all at once
     if request.method == 'POST':
-        selected_option = request.form.get('answer')
-        
-        if selected_option == quiz['correct_option']:
-            flash('🎉 Correct! Great job!', 'success')
+        result = quizzes.grade(questions, request.form, lesson['quiz_pass_percent'])
+        quizzes.record_attempt(conn, session['user_id'], lesson, result)
+        conn.commit()
+
+        message = f'You scored {result.score} out of {result.total} ({result.percent}%).'
+        if result.pass_percent is None:
+            flash(message, 'success' if result.score == result.total else 'info')
+        elif result.passed:
+            flash(f'🎉 {message} You passed, so this lesson is now complete!', 'success')
         else:
-            flash(f'❌ Incorrect. The correct answer was Option {quiz["correct_option"]}. Keep learning!', 'danger')
+            flash(f'❌ {message} You need {result.pass_percent}% to pass. Keep learning!', 'danger')
         
-        conn.close()
-        return redirect(url_for('course_details', course_id=lesson['course_id']))
+        return redirect(url_for('main.course_details', course_id=lesson['course_id']))
 
-    conn.close()
-    return render_template('take_quiz.html', lesson=lesson, quiz=quiz)
+    best = quizzes.best_attempt(conn, session['user_id'], lesson_id)
+    return render_template('take_quiz.html', lesson=lesson, questions=questions, best=best,
+                           field_name=quizzes.field_name)
 
 # --- NEW ROUTE: Generate Certificate ---
-@app.route('/certificate/<int:course_id>')
+@main.route('/certificate/<int:course_id>')
 def certificate(course_id):
     if 'user_id' not in session or session.get('role') != 'student':
         flash('Please log in as a student to view certificates.', 'danger')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
+
+    conn = get_db_connection()
+    # Issued certificates are one indexed lookup; progress is only checked
+    # when there isn't one yet (e.g. finished before certificates were stored)
+    certificate = certificates.get_for_student(conn, session['user_id'], course_id)
+    if certificate is None:
+        certificate = certificates.issue_if_complete(conn, session['user_id'], course_id)
+        conn.commit()
 
+    if certificate is None:
+        flash('You must complete all lessons to earn your certificate!', 'warning')
+        return redirect(url_for('main.course_details', course_id=course_id))
+
+    issued_on = time.strftime('%B %d, %Y', time.localtime(certificate['issued_at']))
+    verify_url = url_for('main.verify_certificate', code=certificate['code'], _external=True)
+    return render_template('certificate.html', certificate=certificate, date=issued_on, verify_url=verify_url)
+
+# --- NEW ROUTE: Public Certificate Verification ---
+# Anyone (e.g. an employer) can check a certificate by its code without logging in.
+# Certificates never change once issued, so the answer can be cached for a day.
+@main.route('/verify/<code>')
+def verify_certificate(code):
+    certificate = certificates.get_by_code(get_db_connection(), code)
+    if certificate is None:
+        response = make_response(render_template('verify_certificate.html', certificate=None, code=code), 404)
+        response.cache_control.public = True
+        response.cache_control.max_age = 300
+        return response
+
+    issued_on = time.strftime('%B %d, %Y', time.localtime(certificate['issued_at']))
+    response = make_response(render_template('verify_certificate.html', certificate=certificate, date=issued_on))
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    response.set_etag(certificate['code'])
+    return response.make_conditional(request)
+
+# --- NEW ROUTE: Instructor Analytics ---
+def _owned_course(course_id):
+    # The course, if the logged-in instructor created it
+    if 'user_id' not in session or session.get('role') != 'instructor':
+        return None
     conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
     course = conn.execute('SELECT * FROM courses WHERE id = ?', (course_id,)).fetchone()
-    
-    # Calculate progress to verify they are actually at 100%
-    lessons = conn.execute('SELECT id FROM lessons WHERE course_id = ?', (course_id,)).fetchall()
-    total_lessons = len(lessons)
-    
-    completed = conn.execute('''
-        SELECT completed_lessons.lesson_id 
-        FROM completed_lessons 
-        JOIN lessons ON completed_lessons.lesson_id = lessons.id
-        WHERE completed_lessons.user_id = ? AND lessons.course_id = ?
-    ''', (session['user_id'], course_id)).fetchall()
-    
-    completed_count = len(set([row['lesson_id'] for row in completed]))
+    if not course or course['instructor_id'] != session['user_id']:
+        return None
+    return course
+
+@main.route('/course/<int:course_id>/analytics')
+def course_analytics(course_id):
+    course = _owned_course(course_id)
+    if course is None:
+        flash('Permission denied.', 'danger')
+        return redirect(url_for('main.dashboard'))
+
+    # Read from the rollup tables only (refreshed by `flask refresh-analytics`),
+    # on the reporting replica if one is set up
+    stats = analytics.get_course_analytics(backups.get_reporting_connection(), course_id)
+    refreshed = None
+    if stats['refreshed_at']:
+        refreshed = time.strftime('%B %d, %Y at %H:%M', time.localtime(stats['refreshed_at']))
+    return render_template('analytics.html', course=course, stats=stats, refreshed=refreshed)
+
+@main.route('/course/<int:course_id>/analytics.json')
+def course_analytics_json(course_id):
+    if _owned_course(course_id) is None:
+        return jsonify({'error': 'permission denied'}), 403
+    return jsonify(analytics.get_course_analytics(backups.get_reporting_connection(), course_id))
+
+
+# --- CLI: How many password hashes per second each setting costs ---
+@main.cli.command('bench-passwords')
+@click.argument('methods', nargs=-1)
+@click.option('--seconds', default=2.0, help='How long to hash with each method.')
+def bench_passwords_command(methods, seconds):
+    methods = methods or ['pbkdf2:sha256:600000', 'pbkdf2:sha256:1000000',
+                          'scrypt:16384:8:1', 'scrypt:32768:8:1', 'scrypt:65536:8:1']
+    print(f"{'method':<28} {'hashes/s':>10} {'ms/hash':>9}")
+    for method, per_second in passwords.benchmark(methods, seconds):
+        print(f"{method:<28} {per_second:>10.1f} {1000 / per_second:>9.1f}")
+
+# --- CLI: Refresh the analytics rollups (run from cron, or keep it running with --every) ---
+@main.cli.command('refresh-analytics')
+@click.option('--every', type=float, default=None, help='Keep running, refreshing every N seconds.')
+def refresh_analytics_command(every):
+    while True:
+        stats = analytics.refresh(get_db_connection())
+        counts = ', '.join(f'{count:,} {source}' for source, count in stats.new_rows.items())
+        print(f'✅ Analytics refreshed in {stats.elapsed:.2f}s: {counts}; {stats.courses} course(s) redistributed')
+        if every is None:
+            break
+        time.sleep(every)
+
+# --- CLI: What a rollup refresh costs on a large synthetic dataset ---
+@main.cli.command('bench-analytics')
+@click.option('--completions', default=1_000_000, help='How many lesson completions to generate.')
+@click.option('--extra', default=10_000, help='New completions to add before the incremental refresh.')
+@click.option('--seed', default=42, help='Random seed, so runs are repeatable.')
+def bench_analytics_command(completions, extra, seed):
+    print(f"{'step':<30} {'seconds':>9}  detail")
+    for step, seconds, detail in analytics.benchmark(completions, extra, seed):
+        print(f"{step:<30} {seconds:>9.3f}  {detail}")
+
+# --- CLI: Bulk import / export of courses, lessons and quizzes ---
+@main.cli.group('content')
+def content_cli():
+    """Bulk import/export of courses, lessons and quizzes (JSONL or CSV)."""
+
+def _guess_format(file_format, stream):
+    if file_format:
+        return file_format
+    return 'csv' if getattr(stream, 'name', '').endswith('.csv') else 'jsonl'
+
+@content_cli.command('import')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'file_format', type=click.Choice(['jsonl', 'csv']), help='Defaults to the file extension.')
+@click.option('--batch-size', default=content_io.DEFAULT_BATCH_SIZE, show_default=True, help='Records per transaction.')
+def content_import_command(source, file_format, batch_size):
+    conn = get_db_connection()
+    file_format = _guess_format(file_format, source)
+
+    def report(stats):
+        print(f"  {stats.rows} records, {stats.rows_per_second:,.0f} rows/s", end='\r')
+
+    stats = content_io.import_records(conn, content_io.read_records(source, file_format), batch_size, report)
+    print()  # Finish the progress line
+
+    # Bring the derived data up to date once, instead of once per row
+    search.rebuild_search_index(conn)
+    progress.rebuild_progress(conn)
+    versions.bump_all(conn)
+    conn.commit()
+
+    for error in stats.errors:
+        print(f"  skipped {error}")
+    written = stats.written
+    print(f"✅ Imported {written['course']} courses, {written['lesson']} lessons, {written['quiz']} quizzes "
+          f"({stats.skipped} skipped) from {stats.rows} records in {stats.elapsed:.1f}s "
+          f"- {stats.rows_per_second:,.0f} rows/s")
+
+@content_cli.command('export')
+@click.argument('target', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'file_format', type=click.Choice(['jsonl', 'csv']), help='Defaults to the file extension.')
+def content_export_command(target, file_format):
+    # Stable ids are written on the primary (the replica is read-only)...
+    content_io.assign_external_ids(get_db_connection())
+    # ...then the full read of every course uses the reporting replica if there is one
+    conn = backups.get_reporting_connection()
+    started = time.perf_counter()
+    count = content_io.write_records(target, content_io.export_records(conn), _guess_format(file_format, target))
+    elapsed = time.perf_counter() - started
+    click.echo(f"✅ Exported {count} records in {elapsed:.1f}s - {count / elapsed if elapsed else 0:,.0f} rows/s",
+               err=True)
+
+# --- CLI: Snapshot the live database (run from cron, or keep it running with --every) ---
+@main.cli.command('backup')
+@click.option('--every', type=float, default=None, help='Keep running, making a snapshot every N seconds.')
+def backup_command(every):
+    config = current_app.config
+
+    def report(remaining, total):
+        print(f"  {total - remaining:,} / {total:,} pages copied", end='\r')
+
+    while True:
+        started = time.perf_counter()
+        path = backups.snapshot(config['DATABASE'], config['BACKUP_DIR'], config['BACKUP_PAGES_PER_STEP'],
+                                config['BACKUP_SLEEP_MS'], config['BACKUP_MAX_RESTARTS'], report)
+        removed = backups.rotate(config['BACKUP_DIR'], config['BACKUP_KEEP'])
+        print()  # Finish the progress line
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"✅ SUCCESS: {path} ({size_mb:.1f} MB) written and verified in {time.perf_counter() - started:.1f}s;"
+              f" {len(removed)} old snapshot(s) removed")
+        if every is None:
+            break
+        time.sleep(every)
+
+# --- CLI: Check a snapshot (or the live database) for corruption ---
+@main.cli.command('verify-backup')
+@click.argument('path', required=False)
+def verify_backup_command(path):
+    snapshots = backups.list_snapshots(current_app.config['BACKUP_DIR'])
+    path = path or (snapshots[-1] if snapshots else None)
+    if path is None:
+        raise click.ClickException('No snapshots yet. Run `flask backup` first.')
+    conn = backups.open_replica(path)
+    problems = backups.integrity_check(conn)
     conn.close()
+    for problem in problems[:20]:
+        print(f"  {problem}")
+    if problems:
+        print(f"❌ {path}: {len(problems)} problem(s) found")
+        raise SystemExit(1)
+    print(f"✅ SUCCESS: {path} passed the integrity check!")
+
+# --- CLI: Issue certificates to students who finished before they were stored ---
+@main.cli.command('issue-certificates')
+def issue_certificates_command():
+    """Back-fill certificates for students who already finished a course."""
+    conn = get_db_connection()
+    issued = certificates.issue_qualified(conn)
+    conn.commit()
+    print(f'✅ SUCCESS: issued {issued} certificate(s).')
+
+# --- CLI: Delete rows left behind by deletions from before foreign keys cascaded ---
+@main.cli.command('sweep-orphans')
+def sweep_orphans_command():
+    conn = get_db_connection()
+
+    def report(table, deleted):
+        print(f"  {table}: {deleted} deleted".ljust(60), end='\r')
+
+    swept = purge.sweep_orphans(conn, report)
+    print(' ' * 60, end='\r')
+    for table, deleted in swept.items():
+        if deleted:
+            print(f"  {table}: {deleted} orphaned row(s) deleted")
+    print(f"✅ SUCCESS: swept {sum(swept.values())} orphaned row(s)!")
+
+# --- CLI: Fingerprint the static files (run during a deploy) ---
+@main.cli.command('build-static-manifest')
+def build_static_manifest_command():
+    manifest = static_assets.write_manifest(current_app.static_folder, current_app.config['STATIC_MANIFEST'])
+    for path, hashed in sorted(manifest.items()):
+        print(f'  {path} -> {hashed}')
+    print(f"✅ SUCCESS: wrote {len(manifest)} file(s) to {current_app.config['STATIC_MANIFEST']}")
+
+# --- CLI: Rebuild the search index (run once on an existing database) ---
+@main.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    # The course_search table comes from the migrations (run by get_db_connection)
+    conn = get_db_connection()
+    count = search.rebuild_search_index(conn)
+    conn.commit()
+    print(f"✅ SUCCESS: search index rebuilt for {count} courses!")
+
+# --- CLI: Check (and optionally repair) the stored progress counters ---
+@main.cli.command('verify-progress')
+@click.option('--rebuild', is_flag=True, help='Recompute every counter from scratch afterwards.')
+def verify_progress_command(rebuild):
+    conn = get_db_connection()
+    mismatches = progress.verify_progress(conn)
+    for user_id, course_id, stored, actual in mismatches[:20]:
+        print(f"  user {user_id}, course {course_id}: stored {stored}, actual {actual}")
+    print(f"{len(mismatches)} progress rows out of date")
+
+    if rebuild:
+        count = progress.rebuild_progress(conn)
+        conn.commit()
+        print(f"✅ SUCCESS: rebuilt {count} progress rows!")
+    elif mismatches:
+        raise SystemExit(1)
+
+# --- CLI: Apply pending schema migrations ---
+@main.cli.command('migrate')
+def migrate_command():
+    # A direct connection, so the pool's automatic migration doesn't run first
+    conn = db.connect(current_app.config['DATABASE'])
+    before = migrations.get_version(conn)
+    applied = migrations.migrate(conn)
+    conn.close()
+    for version, name in applied:
+        print(f"  applied {version:03d}: {name}")
+    print(f"✅ SUCCESS: schema at version {migrations.LATEST_VERSION} (was {before})")
+
+# --- CLI: Fail if any query in the app needs a full table scan ---
+@main.cli.command('check-query-plans')
+def check_query_plans_command():
+    problems = query_plans.check_query_plans()
+    for path, line, sql, scans in problems:
+        print(f"❌ {path}:{line}: {', '.join(scans)}\n    {sql}")
+    if problems:
+        raise SystemExit(1)
+    print("✅ SUCCESS: every query uses an index!")
 
-    # Only show certificate if progress is 100%
-    if total_lessons > 0 and completed_count == total_lessons:
-        from datetime import date
-        today = date.today().strftime("%B %d, %Y")
-        return render_template('certificate.html', user=user, course=course, date=today)
-    else:
-        flash('You must complete all lessons to earn your certificate!', 'warning')
-        return redirect(url_for('course_details', course_id=course_id))
-    
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # The debug server, for development only (see serve.py for production)
+    create_app().run(debug=True)
\ No newline at end of file
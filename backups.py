@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import time
+
+from flask import current_app, g
+
+import db
+
+# Online database snapshots, made with SQLite's backup API while the app runs.
+# Copying database.db with cp is not safe while anything writes to it (the
+# copy can catch a half-written page, and misses whatever is still in the WAL).
+#
+# snapshot() copies BACKUP_PAGES_PER_STEP pages at a time and sleeps
+# BACKUP_SLEEP_MS between steps, so the copy never hogs the disk or the
+# database. The finished copy is checked with PRAGMA integrity_check before it
+# is given its final name, so a file in BACKUP_DIR is always a good snapshot.
+# rotate() keeps the newest BACKUP_KEEP of them.
+# `flask backup` makes one; `flask backup --every 3600` keeps making them.
+#
+# If another connection writes while a step-by-step copy is running, SQLite
+# starts the copy again from the first page. A busy site could keep that up
+# forever, so after BACKUP_MAX_RESTARTS the rest is copied in one step. In WAL
+# mode (see db.py) that step only holds a read snapshot, which never blocks writers.
+#
+# Reporting replica: with REPORTING_REPLICA = 'latest' (the newest snapshot)
+# or a path to a snapshot, get_reporting_connection() opens it read-only, so
+# heavy read-only queries (analytics pages, exports) stay off the primary.
+# Without it they use the primary as before.
+
+DEFAULT_PAGES_PER_STEP = 256   # 1 MB per step with SQLite's default 4 KB pages
+DEFAULT_SLEEP_MS = 50
+DEFAULT_KEEP = 7
+DEFAULT_MAX_RESTARTS = 3
+SUFFIX = '.db'
+PARTIAL = '.partial'
+
+
+class BackupError(Exception):
+    pass
+
+
+class _Restarted(Exception):
+    pass
+
+
+def init_app(app):
+    # After db.init_app, so DATABASE is known
+    folder = os.path.dirname(os.path.abspath(app.config['DATABASE']))
+    app.config.setdefault('BACKUP_DIR', os.path.join(folder, 'backups'))
+    app.config.setdefault('BACKUP_PAGES_PER_STEP', DEFAULT_PAGES_PER_STEP)
+    app.config.setdefault('BACKUP_SLEEP_MS', DEFAULT_SLEEP_MS)
+    app.config.setdefault('BACKUP_KEEP', DEFAULT_KEEP)
+    app.config.setdefault('BACKUP_MAX_RESTARTS', DEFAULT_MAX_RESTARTS)
+    app.config.setdefault('REPORTING_REPLICA', '')
+    app.teardown_appcontext(close_reporting_connection)
+
+
+def list_snapshots(backup_dir):
+    """Paths of the finished snapshots in backup_dir, oldest first."""
+    if not os.path.isdir(backup_dir):
+        return []
+    # The names start with a timestamp, so they sort by age
+    names = sorted(name for name in os.listdir(backup_dir) if name.endswith(SUFFIX))
+    return [os.path.join(backup_dir, name) for name in names]
+
+
+def _snapshot_path(database, backup_dir):
+    stem = os.path.splitext(os.path.basename(database))[0]
+    path = os.path.join(backup_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{stem}{SUFFIX}")
+    count = 1
+    while os.path.exists(path) or os.path.exists(path + PARTIAL):
+        count += 1
+        path = os.path.join(backup_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{stem}-{count}{SUFFIX}")
+    return path
+
+
+def integrity_check(conn):
+    """The problems PRAGMA integrity_check finds, or [] if the database is fine."""
+    rows = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    return [] if rows == ['ok'] else rows
+
+
+def snapshot(database, backup_dir, pages_per_step=DEFAULT_PAGES_PER_STEP, sleep_ms=DEFAULT_SLEEP_MS,
+             max_restarts=DEFAULT_MAX_RESTARTS, report=None):
+    """Copy the live database into a new, verified snapshot in backup_dir. Returns its path.
+
+    report(remaining, total) is called after each step.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    path = _snapshot_path(database, backup_dir)
+    partial = path + PARTIAL
+    source = db.connect(database)
+    target = sqlite3.connect(partial)
+    try:
+        restarts = 0
+        while True:
+            last = [None]
+
+            def progress(status, remaining, total):
+                if report:
+                    report(remaining, total)
+                # A step went through but no fewer pages are left: a writer made SQLite start over
+                if status == sqlite3.SQLITE_OK and last[0] is not None and remaining >= last[0]:
+                    raise _Restarted()
+                last[0] = remaining
+                # backup()'s own sleep argument only applies when the database is
+                # locked, so the pause between steps happens here
+                if remaining:
+                    time.sleep(sleep_ms / 1000)
+
+            # -1 copies everything in one step
+            pages = pages_per_step if restarts < max_restarts else -1
+            try:
+                source.backup(target, pages=pages, progress=progress)
+                break
+            except _Restarted:
+                restarts += 1
+
+        # A self-contained file (no -wal / -shm), so it can be opened read-only anywhere
+        target.execute('PRAGMA journal_mode = DELETE')
+        problems = integrity_check(target)
+    except BaseException:
+        target.close()
+        os.remove(partial)
+        raise
+    finally:
+        source.close()
+    target.close()
+
+    if problems:
+        os.remove(partial)
+        raise BackupError(f'The copy failed its integrity check: {problems[:5]}')
+    os.replace(partial, path)
+    return path
+
+
+def rotate(backup_dir, keep=DEFAULT_KEEP):
+    """Delete all but the newest keep snapshots. Returns the deleted paths."""
+    snapshots = list_snapshots(backup_dir)
+    old = snapshots[:-keep] if keep > 0 else snapshots
+    for path in old:
+        os.remove(path)
+    return old
+
+
+def open_replica(path):
+    """A read-only connection to a snapshot."""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+def replica_path():
+    """The snapshot REPORTING_REPLICA points at, or None to use the primary."""
+    setting = current_app.config['REPORTING_REPLICA']
+    if setting == 'latest':
+        snapshots = list_snapshots(current_app.config['BACKUP_DIR'])
+        return snapshots[-1] if snapshots else None
+    return setting or None
+
+
+def get_reporting_connection():
+    """This request's connection for heavy read-only queries: the replica if there is one."""
+    if 'reporting_db' not in g:
+        path = replica_path()
+        g.reporting_db = open_replica(path) if path else None
+    return g.reporting_db or db.get_db_connection()
+
+
+def close_reporting_connection(exception=None):
+    conn = g.pop('reporting_db', None)
+    if conn is not None:
+        conn.close()
@@ -0,0 +1,9 @@
+# Load-testing tools for EduLearn Pro (not imported by the app itself).
+#
+#   python -m benchmark generate --students 100000 --completions 1000000 --db bench.db
+#   python -m benchmark run --db bench.db --clients 16 --requests 20000 --out before.json
+#   python -m benchmark compare before.json after.json
+#
+# datagen.py fills a scratch database with deterministic synthetic data and
+# driver.py replays a mix of student traffic against it, reporting per-route
+# throughput and p50/p95/p99 latency as JSON. See `python -m benchmark --help`.
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark import datagen, driver
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _copy_database(path):
+    # The run writes (completions, quiz attempts), so work on a copy and keep the original pristine
+    fd, copy = tempfile.mkstemp(suffix='.db', prefix='bench-run-')
+    os.close(fd)
+    source, target = sqlite3.connect(path), sqlite3.connect(copy)
+    source.backup(target)
+    source.close()
+    target.close()
+    return copy
+
+
+def generate_command(args):
+    scale = datagen.Scale(students=args.students, instructors=args.instructors, courses=args.courses,
+                          lessons_per_course=args.lessons, enrollments_per_student=args.enrollments,
+                          completions=args.completions, quiz_every=args.quiz_every,
+                          questions_per_quiz=args.questions)
+    print(f'Generating {args.db} (seed {args.seed})...')
+    counts = datagen.generate(args.db, scale, args.seed, args.password_method)
+    print(json.dumps(counts))
+
+
+def run_command(args):
+    # A server uses its own database; --db is then only read, to pick students
+    in_place = args.in_place or bool(args.url)
+    database = args.db if in_place else _copy_database(args.db)
+    try:
+        if args.url:
+            transport = driver.HTTPTransport(args.url)
+            target = args.url
+        else:
+            from app import create_app
+            # Every simulated student comes from the same address, so no rate limits here
+            app = create_app({'DATABASE': database, 'RATE_LIMIT': 'none'})
+            transport = driver.TestClientTransport(app)
+            target = 'test-client'
+
+        students = driver.load_students(database, args.clients, args.seed)
+        report = driver.run(transport, students, clients=args.clients, requests=args.requests,
+                            duration=args.duration, warmup=args.warmup, seed=args.seed)
+    finally:
+        if not in_place:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(database + suffix):
+                    os.remove(database + suffix)
+
+    report = dict({
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': _git_commit(),
+        'target': target,
+        'database': args.db,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+    }, **report)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+        total = report['total']
+        print(f"{total['requests']:,} requests in {report['seconds']}s: {total['throughput_rps']} req/s, "
+              f"p95 {total['p95_ms']} ms, {total['errors']} errors -> {args.out}")
+    else:
+        print(text)
+    if report['total']['errors'] and args.fail_on_errors:
+        sys.exit(1)
+
+
+def compare_command(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    regressions = 0
+    print(f"{'route':<18} {'metric':<15} {'before':>10} {'after':>10} {'change':>8}")
+    for route, metric, before, after, change, regressed in driver.compare(baseline, current, args.tolerance):
+        regressions += regressed
+        flag = '  <-- regression' if regressed else ''
+        print(f'{route:<18} {metric:<15} {before:>10} {after:>10} {change:>+8.1%}{flag}')
+    if regressions:
+        print(f'❌ {regressions} regression(s) beyond {args.tolerance:.0%}')
+        sys.exit(1)
+    print(f'✅ No regressions beyond {args.tolerance:.0%}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description='Load-test EduLearn Pro.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='fill a scratch database with synthetic data')
+    generate.add_argument('--db', default='bench.db')
+    generate.add_argument('--seed', type=int, default=1)
+    generate.add_argument('--students', type=int, default=1_000)
+    generate.add_argument('--instructors', type=int, default=20)
+    generate.add_argument('--courses', type=int, default=100)
+    generate.add_argument('--lessons', type=int, default=20, help='lessons per course')
+    generate.add_argument('--enrollments', type=int, default=4, help='courses per student')
+    generate.add_argument('--completions', type=int, default=10_000)
+    generate.add_argument('--quiz-every', type=int, default=4, help='every Nth lesson has a quiz (0 = none)')
+    generate.add_argument('--questions', type=int, default=5, help='questions per quiz')
+    generate.add_argument('--password-method', default=None,
+                          help='hash method for the shared password (default: the app default)')
+    generate.set_defaults(handler=generate_command)
+
+    run = commands.add_parser('run', help='replay the route mix and report latency as JSON')
+    run.add_argument('--db', default='bench.db', help='a database made by `generate`')
+    run.add_argument('--url', default=None, help='benchmark a running server instead of the test client')
+    run.add_argument('--clients', type=int, default=8, help='concurrent simulated students')
+    run.add_argument('--requests', type=int, default=2_000, help='measured requests (ignored with --duration)')
+    run.add_argument('--duration', type=float, default=None, help='run for this many seconds instead')
+    run.add_argument('--warmup', type=int, default=50, help='unmeasured requests first')
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--in-place', action='store_true',
+                     help='write to --db itself instead of a throwaway copy')
+    run.add_argument('--out', default=None, help='write the JSON report here instead of stdout')
+    run.add_argument('--fail-on-errors', action='store_true', help='exit 1 if any request failed')
+    run.set_defaults(handler=run_command)
+
+    compare = commands.add_parser('compare', help='compare two reports and flag regressions')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--tolerance', type=float, default=0.10, help='allowed change, e.g. 0.10 = 10%%')
+    compare.set_defaults(handler=compare_command)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
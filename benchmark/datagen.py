@@ -0,0 +1,191 @@
+import os
+import random
+import time
+
+from werkzeug.security import generate_password_hash
+
+import db
+import lesson_bodies
+import migrations
+import passwords
+import progress
+import search
+import versions
+
+# Deterministic synthetic data for load tests.
+# The same Scale and seed always produce the same database, row for row, so
+# two benchmark runs only differ in the code being measured.
+#
+# Every student is student<N>@bench.test and every instructor is
+# instructor<N>@bench.test, all with the password PASSWORD. Course titles are
+# built from TOPICS, so the driver can search for words that really match.
+
+PASSWORD = 'bench-password'
+BASE_TIME = 1704067200   # 2024-01-01, so timestamps don't depend on when you run it
+BATCH_SIZE = 10_000
+
+TOPICS = ['Python', 'SQL', 'JavaScript', 'Flask', 'Statistics', 'Algebra', 'Design', 'Marketing',
+          'Networking', 'Security', 'Databases', 'Excel', 'Writing', 'Photography', 'Music', 'Chemistry',
+          'Biology', 'History', 'Economics', 'Spanish', 'French', 'Drawing', 'Physics', 'Linux']
+LEVELS = ['for Beginners', 'Fundamentals', 'in Practice', 'Masterclass', 'Crash Course', 'Advanced']
+
+
+class Scale:
+    """How big the generated database is. The defaults are a small smoke-test size."""
+
+    def __init__(self, students=1_000, instructors=20, courses=100, lessons_per_course=20,
+                 enrollments_per_student=4, completions=10_000, quiz_every=4, questions_per_quiz=5,
+                 pass_percent=60, days=90):
+        self.students = students
+        self.instructors = instructors
+        self.courses = courses
+        self.lessons_per_course = lessons_per_course
+        self.enrollments_per_student = min(enrollments_per_student, courses)
+        self.completions = completions
+        self.quiz_every = quiz_every                 # every Nth lesson has a quiz (0 = none)
+        self.questions_per_quiz = questions_per_quiz
+        self.pass_percent = pass_percent
+        self.days = days                             # enrollments are spread over this many days
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def student_email(n):
+    return f'student{n}@bench.test'
+
+
+def instructor_email(n):
+    return f'instructor{n}@bench.test'
+
+
+def _batched(rows, size=BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(conn, sql, rows):
+    count = 0
+    for batch in _batched(rows):
+        conn.executemany(sql, batch)
+        conn.commit()
+        count += len(batch)
+    return count
+
+
+def _lessons_finished(rng, enrollments, scale):
+    """How many lessons (from the first one on) each enrollment finished, adding up to scale.completions."""
+    capacity = len(enrollments) * scale.lessons_per_course
+    target = min(scale.completions, capacity)
+    mean = target / len(enrollments) if enrollments else 0
+    # Most students stop early and a few finish: an exponential drop-off
+    finished = [min(int(rng.expovariate(1 / mean)), scale.lessons_per_course) if mean else 0
+                for _ in enrollments]
+
+    # Nudge the counts until they add up exactly
+    difference = target - sum(finished)
+    index = 0
+    while difference:
+        step = 1 if difference > 0 else -1
+        if 0 <= finished[index] + step <= scale.lessons_per_course:
+            finished[index] += step
+            difference -= step
+        index = (index + 1) % len(finished)
+    return finished
+
+
+def generate(path, scale=None, seed=1, password_method=None, log=print):
+    """Create (or replace) a database at path filled with synthetic data. Returns row counts."""
+    scale = scale or Scale()
+    rng = random.Random(seed)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    conn = db.connect(path)
+    conn.execute('PRAGMA synchronous = OFF')   # A scratch database: speed over durability
+    migrations.migrate(conn)
+    started = time.perf_counter()
+
+    # One real hash shared by everyone: hashing 100k passwords would take hours,
+    # but every login still pays the real verification cost
+    password_hash = generate_password_hash(PASSWORD, password_method or passwords.DEFAULT_METHOD)
+
+    first_student = scale.instructors + 1
+    _insert(conn, 'INSERT INTO users (id, name, email, password, role) VALUES (?, ?, ?, ?, ?)',
+            ((n, f'Instructor {n}', instructor_email(n), password_hash, 'instructor')
+             for n in range(1, scale.instructors + 1)))
+    _insert(conn, 'INSERT INTO users (id, name, email, password, role) VALUES (?, ?, ?, ?, ?)',
+            ((first_student + n - 1, f'Student {n}', student_email(n), password_hash, 'student')
+             for n in range(1, scale.students + 1)))
+    log(f'  users: {scale.instructors:,} instructors, {scale.students:,} students')
+
+    _insert(conn, 'INSERT INTO courses (id, title, description, instructor_id) VALUES (?, ?, ?, ?)',
+            ((c, f'{rng.choice(TOPICS)} {rng.choice(LEVELS)}',
+              f'Learn {rng.choice(TOPICS).lower()} and {rng.choice(TOPICS).lower()} step by step.',
+              1 + (c - 1) % scale.instructors)
+             for c in range(1, scale.courses + 1)))
+
+    def lesson_id(course_id, order):
+        return (course_id - 1) * scale.lessons_per_course + order + 1
+
+    _insert(conn, '''
+        INSERT INTO lessons (id, course_id, title, content, video_url, lesson_order, quiz_pass_percent)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', ((lesson_id(c, order), c, f'Lesson {order + 1}: {rng.choice(TOPICS)}',
+           lesson_bodies.pack(' '.join(rng.choice(TOPICS).lower() for _ in range(60))),
+           'https://www.youtube.com/watch?v=dQw4w9WgXcQ', order + 1,
+           scale.pass_percent if scale.quiz_every and order % scale.quiz_every == 0 else None)
+          for c in range(1, scale.courses + 1) for order in range(scale.lessons_per_course)))
+
+    quiz_rows = 0
+    if scale.quiz_every:
+        quiz_rows = _insert(conn, '''
+            INSERT INTO quizzes (lesson_id, question, option_a, option_b, option_c, option_d, correct_option)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', ((lesson_id(c, order), f'Question {q + 1} about {rng.choice(TOPICS)}?',
+               'Option one', 'Option two', 'Option three', 'Option four', rng.choice('ABCD'))
+              for c in range(1, scale.courses + 1)
+              for order in range(0, scale.lessons_per_course, scale.quiz_every)
+              for q in range(scale.questions_per_quiz)))
+    log(f'  content: {scale.courses:,} courses, {scale.courses * scale.lessons_per_course:,} lessons, '
+        f'{quiz_rows:,} quiz questions')
+
+    # Popular courses get more students (roughly Zipf-shaped)
+    weights = [1 / rank for rank in range(1, scale.courses + 1)]
+    course_ids = list(range(1, scale.courses + 1))
+    rng.shuffle(course_ids)
+    enrollments = []
+    for n in range(scale.students):
+        chosen = set()
+        while len(chosen) < scale.enrollments_per_student:
+            chosen.update(rng.choices(course_ids, weights, k=scale.enrollments_per_student - len(chosen)))
+        enrolled_at = BASE_TIME + rng.random() * scale.days * 86400
+        enrollments.extend((first_student + n, c, enrolled_at) for c in sorted(chosen))
+    _insert(conn, 'INSERT INTO enrollments (user_id, course_id, created_at) VALUES (?, ?, ?)', enrollments)
+
+    finished = _lessons_finished(rng, enrollments, scale)
+    completions = _insert(conn, 'INSERT INTO completed_lessons (user_id, lesson_id, created_at) VALUES (?, ?, ?)',
+                          ((user_id, lesson_id(c, order), enrolled_at + (order + 1) * 3600)
+                           for (user_id, c, enrolled_at), count in zip(enrollments, finished)
+                           for order in range(count)))
+    log(f'  activity: {len(enrollments):,} enrollments, {completions:,} completions')
+
+    # The derived tables the app keeps in step with every write
+    progress.rebuild_progress(conn)
+    search.rebuild_search_index(conn)
+    versions.bump_all(conn)
+    conn.commit()
+    conn.execute('PRAGMA optimize')
+    conn.close()
+    log(f'  done in {time.perf_counter() - started:.1f}s')
+
+    return {'users': scale.instructors + scale.students, 'courses': scale.courses,
+            'lessons': scale.courses * scale.lessons_per_course, 'quizzes': quiz_rows,
+            'enrollments': len(enrollments), 'completions': completions}
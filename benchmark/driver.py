@@ -0,0 +1,264 @@
+import http.cookiejar
+import random
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmark import datagen
+
+# Load driver: replays a realistic mix of student traffic with concurrent clients.
+# Each client logs in as one generated student and then picks routes at
+# random from MIX, using that student's own enrollments, lessons and quizzes.
+# Requests go either through Flask's test client (no network, measures the app
+# itself) or over HTTP to a running server (e.g. serve.py).
+#
+# The report is plain JSON: throughput plus p50/p95/p99 latency per route,
+# so runs can be saved and compared with `python -m benchmark compare`.
+
+# route -> relative weight
+MIX = {
+    'dashboard': 20,
+    'courses_search': 15,
+    'course_details': 30,
+    'complete_lesson': 10,
+    'take_quiz': 8,
+    'submit_quiz': 5,
+    'certificate': 4,
+    'login': 2,
+}
+
+_ANSWER_FIELD = re.compile(r'name="(answer_\d+)"')
+
+
+# --- Two ways of sending a request ---
+
+class TestClientTransport:
+    """Calls the app in-process through Flask's test client."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def send(method, path, data=None):
+            response = client.open(path, method=method, data=data)
+            return response.status_code, response.get_data(as_text=True)
+        return send
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time the redirect itself, like the test client does, instead of following it
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPTransport:
+    """Sends real HTTP requests to base_url, one cookie jar per client."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def session(self):
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                                             _NoRedirect())
+
+        def send(method, path, data=None):
+            body = urllib.parse.urlencode(data).encode() if data is not None else None
+            request = urllib.request.Request(self.base_url + path, data=body, method=method)
+            try:
+                with opener.open(request, timeout=self.timeout) as response:
+                    return response.status, response.read().decode('utf-8', 'replace')
+            except urllib.error.HTTPError as e:   # 3xx (not followed), 4xx and 5xx
+                return e.code, e.read().decode('utf-8', 'replace')
+        return send
+
+
+# --- Measurements ---
+
+class RouteStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    def add(self, seconds, status):
+        self.latencies.append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == 0 or status >= 500:
+            self.errors += 1
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def _summary(stats, elapsed):
+    values = sorted(stats.latencies)
+    return {
+        'requests': len(values),
+        'errors': stats.errors,
+        'statuses': {str(status): count for status, count in sorted(stats.statuses.items())},
+        'throughput_rps': round(len(values) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': _ms(sum(values) / len(values)) if values else None,
+        'p50_ms': _ms(percentile(values, 0.50)),
+        'p95_ms': _ms(percentile(values, 0.95)),
+        'p99_ms': _ms(percentile(values, 0.99)),
+        'max_ms': _ms(values[-1]) if values else None,
+    }
+
+
+# --- One simulated student ---
+
+class Student:
+    def __init__(self, user_number, courses, lessons, quiz_lessons):
+        self.email = datagen.student_email(user_number)
+        self.courses = courses            # enrolled course ids
+        self.lessons = lessons            # [(lesson_id, course_id)]
+        self.quiz_lessons = quiz_lessons  # lesson ids with a quiz
+
+
+def load_students(db_path, count, seed):
+    """Pick count generated students (deterministically) and look up what each is enrolled in."""
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    first, last = conn.execute("SELECT MIN(id), MAX(id) FROM users WHERE email LIKE 'student%@bench.test'").fetchone()
+    if first is None:
+        raise SystemExit(f'{db_path} has no generated students; run `python -m benchmark generate` first.')
+    rng = random.Random(seed)
+    students = []
+    while len(students) < count:
+        user_id = rng.randint(first, last)
+        courses = [row[0] for row in conn.execute('SELECT course_id FROM enrollments WHERE user_id = ?', (user_id,))]
+        if not courses:
+            continue
+        marks = ', '.join('?' * len(courses))
+        lessons = conn.execute(f'SELECT id, course_id FROM lessons WHERE course_id IN ({marks})', courses).fetchall()
+        quiz_lessons = [row[0] for row in conn.execute(
+            f'SELECT DISTINCT lesson_id FROM quizzes WHERE lesson_id IN '
+            f'(SELECT id FROM lessons WHERE course_id IN ({marks}))', courses)]
+        students.append(Student(user_id - first + 1, courses, lessons, quiz_lessons))
+    conn.close()
+    return students
+
+
+def _requests_for(route, student, rng, send):
+    """Yield (method, path, data) for one visit to route."""
+    if route == 'login':
+        yield 'GET', '/logout', None
+        yield 'POST', '/login', {'email': student.email, 'password': datagen.PASSWORD}
+    elif route == 'dashboard':
+        yield 'GET', '/dashboard', None
+    elif route == 'courses_search':
+        yield 'GET', '/courses?' + urllib.parse.urlencode({'search': rng.choice(datagen.TOPICS)}), None
+    elif route == 'course_details':
+        yield 'GET', f'/course/{rng.choice(student.courses)}', None
+    elif route == 'complete_lesson':
+        yield 'POST', f'/complete_lesson/{rng.choice(student.lessons)[0]}', {}
+    elif route == 'certificate':
+        yield 'GET', f'/certificate/{rng.choice(student.courses)}', None
+    elif route in ('take_quiz', 'submit_quiz') and student.quiz_lessons:
+        lesson_id = rng.choice(student.quiz_lessons)
+        if route == 'take_quiz':
+            yield 'GET', f'/take_quiz/{lesson_id}', None
+        else:
+            # The answer fields come from the quiz page, which is fetched outside the timing
+            status, page = send('GET', f'/take_quiz/{lesson_id}')
+            answers = {field: rng.choice('ABCD') for field in _ANSWER_FIELD.findall(page)}
+            yield 'POST', f'/take_quiz/{lesson_id}', answers
+
+
+def run(transport, students, clients=8, requests=2000, duration=None, warmup=50, seed=1, mix=None):
+    """Replay the route mix with `clients` concurrent students. Returns the JSON-ready report."""
+    mix = mix or MIX
+    routes, weights = list(mix), list(mix.values())
+    stats = {route: RouteStats() for route in routes}
+    lock = threading.Lock()
+    budget = {'left': requests, 'warmup': warmup}
+    deadline = [None]
+
+    def take_ticket():
+        # Returns (go?, record?) - the first `warmup` requests are not measured
+        with lock:
+            if deadline[0] is not None and time.perf_counter() >= deadline[0]:
+                return False, False
+            if budget['warmup'] > 0:
+                budget['warmup'] -= 1
+                return True, False
+            if duration is None:
+                if budget['left'] <= 0:
+                    return False, False
+                budget['left'] -= 1
+            return True, True
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        student = students[index % len(students)]
+        send = transport.session()
+        send('POST', '/login', {'email': student.email, 'password': datagen.PASSWORD})
+        while True:
+            go, record = take_ticket()
+            if not go:
+                return
+            route = rng.choices(routes, weights)[0]
+            for method, path, data in _requests_for(route, student, rng, send):
+                started = time.perf_counter()
+                try:
+                    status, _ = send(method, path, data)
+                except Exception:
+                    status = 0
+                elapsed = time.perf_counter() - started
+                if record and not (route == 'login' and path == '/logout'):
+                    with lock:
+                        stats[route].add(elapsed, status)
+
+    threads = [threading.Thread(target=client, args=(index,), daemon=True) for index in range(clients)]
+    started = time.perf_counter()
+    if duration is not None:
+        deadline[0] = started + duration
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = RouteStats()
+    for route_stats in stats.values():
+        total.latencies.extend(route_stats.latencies)
+        for status, count in route_stats.statuses.items():
+            total.statuses[status] = total.statuses.get(status, 0) + count
+        total.errors += route_stats.errors
+    return {
+        'seconds': round(elapsed, 3),
+        'clients': clients,
+        'total': _summary(total, elapsed),
+        'routes': {route: _summary(route_stats, elapsed) for route, route_stats in stats.items()
+                   if route_stats.latencies},
+    }
+
+
+def compare(baseline, current, tolerance=0.10):
+    """Yield (route, metric, before, after, change, regressed) for p95 latency and throughput."""
+    for route in sorted(set(baseline['routes']) | set(current['routes'])):
+        before, after = baseline['routes'].get(route), current['routes'].get(route)
+        if not before or not after:
+            continue
+        for metric, higher_is_better in (('p95_ms', False), ('throughput_rps', True)):
+            old, new = before[metric], after[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            yield route, metric, old, new, change, regressed
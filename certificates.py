@@ -0,0 +1,112 @@
+import secrets
+import time
+
+# Issued certificates.
+# A certificate is written ONCE, the first time a student's course_progress
+# reaches 100%, with a random verification code. After that, the certificate
+# page and the public /verify/<code> page read that one row and never recount
+# progress, and the date on it never changes.
+#
+#   complete_lesson / a passed quiz  -> issue_if_complete()   (after progress.lesson_completed())
+#   delete_lesson                    -> issue_qualified(conn, course_id)
+#   `flask issue-certificates`       -> issue_qualified(conn)  (back-fill everyone)
+#
+# The code looks like K7QX-M2PD-9HFT: 60 random bits, without the letters
+# that are easy to misread (0/O, 1/I/L).
+
+CODE_ALPHABET = '23456789ABCDEFGHJKMNPQRSTUVWXYZ'
+CODE_GROUPS = 3
+CODE_GROUP_LENGTH = 4
+
+_INSERT_SQL = '''
+    INSERT INTO certificates (code, user_id, course_id, recipient_name, course_title, instructor_name, issued_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, course_id) DO NOTHING
+'''
+
+
+def new_code():
+    groups = (''.join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_GROUP_LENGTH)) for _ in range(CODE_GROUPS))
+    return '-'.join(groups)
+
+
+def normalize_code(code):
+    # Accept what people type: any case, spaces instead of dashes
+    return '-'.join(code.upper().replace('-', ' ').split())
+
+
+def get_for_student(conn, user_id, course_id):
+    """The student's certificate for a course, or None - one lookup on the (user_id, course_id) index."""
+    return conn.execute('SELECT * FROM certificates WHERE user_id = ? AND course_id = ?',
+                        (user_id, course_id)).fetchone()
+
+
+def get_by_code(conn, code):
+    return conn.execute('SELECT * FROM certificates WHERE code = ?', (normalize_code(code),)).fetchone()
+
+
+def issue_if_complete(conn, user_id, course_id):
+    """Issue the certificate if the student has just finished the course. Returns it, or None.
+
+    Call it after progress.lesson_completed(), in the same transaction.
+    """
+    row = conn.execute('''
+        SELECT course_progress.user_id, course_progress.course_id, users.name AS recipient_name,
+               courses.title AS course_title, instructors.name AS instructor_name
+        FROM course_progress
+        JOIN users ON users.id = course_progress.user_id
+        JOIN courses ON courses.id = course_progress.course_id
+        LEFT JOIN users AS instructors ON instructors.id = courses.instructor_id
+        WHERE course_progress.user_id = ? AND course_progress.course_id = ?
+          AND course_progress.total_lessons > 0
+          AND course_progress.completed_count >= course_progress.total_lessons
+    ''', (user_id, course_id)).fetchone()
+    if row is None:
+        return None
+    conn.execute(_INSERT_SQL, _certificate_values(row, time.time()))
+    return get_for_student(conn, user_id, course_id)
+
+
+def issue_qualified(conn, course_id=None):
+    """Issue certificates to every student at 100% who has none yet (optionally in one course).
+
+    Returns how many were issued. The caller commits.
+    """
+    if course_id is None:
+        rows = conn.execute('''
+            SELECT course_progress.user_id, course_progress.course_id, users.name AS recipient_name,
+                   courses.title AS course_title, instructors.name AS instructor_name
+            FROM course_progress -- full scan: back-filling every finished student
+            JOIN users ON users.id = course_progress.user_id
+            JOIN courses ON courses.id = course_progress.course_id
+            LEFT JOIN users AS instructors ON instructors.id = courses.instructor_id
+            WHERE course_progress.total_lessons > 0
+              AND course_progress.completed_count >= course_progress.total_lessons
+              AND NOT EXISTS (SELECT 1 FROM certificates WHERE certificates.user_id = course_progress.user_id
+                                                           AND certificates.course_id = course_progress.course_id)
+        ''')
+    else:
+        rows = conn.execute('''
+            SELECT course_progress.user_id, course_progress.course_id, users.name AS recipient_name,
+                   courses.title AS course_title, instructors.name AS instructor_name
+            FROM course_progress
+            JOIN users ON users.id = course_progress.user_id
+            JOIN courses ON courses.id = course_progress.course_id
+            LEFT JOIN users AS instructors ON instructors.id = courses.instructor_id
+            WHERE course_progress.course_id = ?
+              AND course_progress.total_lessons > 0
+              AND course_progress.completed_count >= course_progress.total_lessons
+              AND NOT EXISTS (SELECT 1 FROM certificates WHERE certificates.user_id = course_progress.user_id
+                                                           AND certificates.course_id = course_progress.course_id)
+        ''', (course_id,))
+
+    # Read everything first: inserting while the SELECT is still stepping could feed it its own rows
+    now = time.time()
+    values = [_certificate_values(row, now) for row in rows.fetchall()]
+    conn.executemany(_INSERT_SQL, values)
+    return len(values)
+
+
+def _certificate_values(row, issued_at):
+    return (new_code(), row['user_id'], row['course_id'], row['recipient_name'], row['course_title'],
+            row['instructor_name'], issued_at)
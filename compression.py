@@ -0,0 +1,67 @@
+import gzip
+
+from flask import current_app, request
+
+# gzip for responses, on every route (HTML pages, the JSON API, CSS/JS, ...).
+# A response is compressed only when the client said it accepts gzip, its type
+# is text-like (COMPRESSIBLE_TYPES; images and uploads are compressed already)
+# and the body is at least COMPRESS_MIN_BYTES long: below ~1 KB the gzip
+# header and the CPU cost outweigh the bytes saved.
+#
+# Files sent straight from disk (direct_passthrough) are left alone here;
+# fingerprinted static files keep their own compressed copy (see static_assets.py).
+
+DEFAULT_MIN_BYTES = 1024
+DEFAULT_LEVEL = 6   # zlib's default: most of the size win for a fraction of level 9's CPU
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS', True)
+    app.config.setdefault('COMPRESS_MIN_BYTES', DEFAULT_MIN_BYTES)
+    app.config.setdefault('COMPRESS_LEVEL', DEFAULT_LEVEL)
+    if app.config['COMPRESS']:
+        app.after_request(_compress)
+
+
+def _compress(response):
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    config = current_app.config
+    return gzip_response(response, config['COMPRESS_MIN_BYTES'], config['COMPRESS_LEVEL'])
+
+
+def accepts_gzip():
+    return bool(request.accept_encodings['gzip'])
+
+
+def gzip_response(response, min_bytes=DEFAULT_MIN_BYTES, level=DEFAULT_LEVEL):
+    """Compress response in place if it is worth it. Returns the response."""
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    # The answer depends on Accept-Encoding, so caches must keep the two versions apart
+    response.vary.add('Accept-Encoding')
+    if not accepts_gzip():
+        return response
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+
+    response.set_data(gzip.compress(data, level))
+    response.headers['Content-Encoding'] = 'gzip'
+    weaken_etag(response)
+    return response
+
+
+def weaken_etag(response):
+    # The bytes are no longer the ones the ETag was made for, but the content is
+    # the same: a weak ETag says exactly that, and If-None-Match still matches it
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
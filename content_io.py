@@ -0,0 +1,243 @@
+import csv
+import json
+import time
+
+import lesson_bodies
+import ordering
+
+# Streaming bulk import / export of courses, lessons and quizzes
+# (used by `flask content import` and `flask content export`).
+#
+# One record per JSONL line or CSV row, with a "type" of course, lesson or quiz.
+# Every record carries an external_id; importing the same file twice updates
+# the rows in place instead of duplicating them. Children point at their parent
+# by external_id ("course" on a lesson, "lesson" on a quiz), so parents must
+# appear earlier in the file or in the same batch.
+#
+# Records are read one at a time and written in batches with executemany, one
+# transaction per batch, so memory use does not grow with the file size.
+
+FIELDS = ['type', 'external_id', 'course', 'lesson', 'title', 'description', 'instructor_email',
+          'content', 'video_url', 'lesson_order', 'quiz_pass_percent',
+          'question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option']
+
+REQUIRED = {
+    'course': ['external_id', 'title'],
+    'lesson': ['external_id', 'course', 'title'],
+    'quiz': ['external_id', 'lesson', 'question', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_option'],
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ImportStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.written = {'course': 0, 'lesson': 0, 'quiz': 0}
+        self.skipped = 0
+        self.errors = []   # only the first few, for the report
+
+    def skip(self, line, reason):
+        self.skipped += 1
+        if len(self.errors) < 20:
+            self.errors.append(f'record {line}: {reason}')
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+def read_records(stream, file_format):
+    """Yield one dict per record, reading the stream lazily."""
+    if file_format == 'csv':
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if value not in (None, '')}
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _as_int(value):
+    if value in (None, ''):
+        return None
+    return int(value)
+
+
+def _flush(conn, batches, stats):
+    courses, lessons, quizzes = batches['course'], batches['lesson'], batches['quiz']
+    if not (courses or lessons or quizzes):
+        return
+
+    # Parents first, so children in the same batch can find them
+    before = conn.total_changes
+    conn.executemany('''
+        INSERT INTO courses (external_id, title, description, instructor_id)
+        VALUES (?, ?, ?, (SELECT id FROM users WHERE email = ?))
+        ON CONFLICT (external_id) DO UPDATE SET
+            title = excluded.title,
+            description = excluded.description,
+            instructor_id = COALESCE(excluded.instructor_id, courses.instructor_id)
+    ''', courses)
+    stats.written['course'] += conn.total_changes - before
+
+    # INSERT ... SELECT finds the parent by external_id; a missing parent inserts nothing
+    before = conn.total_changes
+    conn.executemany('''
+        INSERT INTO lessons (external_id, course_id, title, content, video_url, lesson_order, quiz_pass_percent)
+        SELECT ?, courses.id, ?, ?, ?,
+               -- No lesson_order in the file: a new lesson goes to the end (see ordering.py)
+               COALESCE(?, (SELECT IFNULL(MAX(lessons.lesson_order), 0) + ? FROM lessons
+                            WHERE lessons.course_id = courses.id)),
+               ? FROM courses WHERE courses.external_id = ?
+        ON CONFLICT (external_id) DO UPDATE SET
+            course_id = excluded.course_id,
+            title = excluded.title,
+            content = excluded.content,
+            video_url = excluded.video_url,
+            -- ... and an existing one stays where it is
+            lesson_order = COALESCE(?, lessons.lesson_order),
+            quiz_pass_percent = excluded.quiz_pass_percent
+    ''', lessons)
+    written = conn.total_changes - before
+    stats.written['lesson'] += written
+    stats.skipped += len(lessons) - written
+
+    before = conn.total_changes
+    conn.executemany('''
+        INSERT INTO quizzes (external_id, lesson_id, question, option_a, option_b, option_c, option_d, correct_option)
+        SELECT ?, lessons.id, ?, ?, ?, ?, ?, ? FROM lessons WHERE lessons.external_id = ?
+        ON CONFLICT (external_id) DO UPDATE SET
+            lesson_id = excluded.lesson_id,
+            question = excluded.question,
+            option_a = excluded.option_a,
+            option_b = excluded.option_b,
+            option_c = excluded.option_c,
+            option_d = excluded.option_d,
+            correct_option = excluded.correct_option
+    ''', quizzes)
+    written = conn.total_changes - before
+    stats.written['quiz'] += written
+    stats.skipped += len(quizzes) - written
+
+    conn.commit()
+    for batch in batches.values():
+        batch.clear()
+
+
+def import_records(conn, records, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Upsert records in batches. Returns an ImportStats.
+
+    progress, if given, is called with the stats after every batch.
+    """
+    stats = ImportStats()
+    batches = {'course': [], 'lesson': [], 'quiz': []}
+    pending = 0
+
+    for line, record in enumerate(records, start=1):
+        stats.rows += 1
+        kind = record.get('type')
+        if kind not in REQUIRED:
+            stats.skip(line, f'unknown type {kind!r}')
+            continue
+        missing = [field for field in REQUIRED[kind] if record.get(field) in (None, '')]
+        if missing:
+            stats.skip(line, f'{kind} is missing {", ".join(missing)}')
+            continue
+
+        try:
+            if kind == 'course':
+                batches['course'].append((record['external_id'], record['title'], record.get('description'),
+                                          record.get('instructor_email')))
+            elif kind == 'lesson':
+                lesson_order = _as_int(record.get('lesson_order'))
+                batches['lesson'].append((record['external_id'], record['title'], lesson_bodies.pack(record.get('content')),
+                                          record.get('video_url'), lesson_order, ordering.GAP,
+                                          _as_int(record.get('quiz_pass_percent')), record['course'], lesson_order))
+            else:
+                batches['quiz'].append((record['external_id'], record['question'], record['option_a'],
+                                        record['option_b'], record['option_c'], record['option_d'],
+                                        record['correct_option'], record['lesson']))
+        except ValueError as e:
+            stats.skip(line, str(e))
+            continue
+
+        pending += 1
+        if pending >= batch_size:
+            _flush(conn, batches, stats)
+            pending = 0
+            if progress:
+                progress(stats)
+
+    _flush(conn, batches, stats)
+    return stats
+
+
+def assign_external_ids(conn):
+    """Give rows created through the web forms a stable external id, so exports re-import cleanly."""
+    conn.execute("UPDATE courses SET external_id = 'course-' || id WHERE external_id IS NULL")
+    conn.execute("UPDATE lessons SET external_id = 'lesson-' || id WHERE external_id IS NULL")
+    conn.execute("UPDATE quizzes SET external_id = 'quiz-' || id WHERE external_id IS NULL")
+    conn.commit()
+
+
+def export_records(conn):
+    """Yield every course, lesson and quiz as a record, parents before children.
+
+    Rows are pulled from the cursor one at a time (no fetchall), so the
+    export runs in constant memory whatever the catalogue size.
+    Only reads, so conn may be the read-only reporting replica: call
+    assign_external_ids() on the primary first. A replica made before that
+    still has NULLs there, so they are filled in with the same 'course-<id>'
+    ids assign_external_ids() writes.
+    """
+    for row in conn.execute('''
+        SELECT COALESCE(courses.external_id, 'course-' || courses.id), courses.title, courses.description, users.email AS instructor_email
+        FROM courses LEFT JOIN users ON users.id = courses.instructor_id -- full scan: exporting everything
+        ORDER BY courses.id
+    '''):
+        yield {'type': 'course', 'external_id': row[0], 'title': row[1], 'description': row[2],
+               'instructor_email': row[3]}
+
+    for row in conn.execute('''
+        SELECT COALESCE(lessons.external_id, 'lesson-' || lessons.id),
+               COALESCE(courses.external_id, 'course-' || courses.id), lessons.title, lessons.content,
+               lessons.video_url, lessons.lesson_order, lessons.quiz_pass_percent
+        FROM lessons JOIN courses ON courses.id = lessons.course_id -- full scan: exporting everything
+        ORDER BY lessons.id
+    '''):
+        yield {'type': 'lesson', 'external_id': row[0], 'course': row[1], 'title': row[2],
+               'content': lesson_bodies.unpack(row[3]),
+               'video_url': row[4], 'lesson_order': row[5], 'quiz_pass_percent': row[6]}
+
+    for row in conn.execute('''
+        SELECT COALESCE(quizzes.external_id, 'quiz-' || quizzes.id),
+               COALESCE(lessons.external_id, 'lesson-' || lessons.id), quizzes.question, quizzes.option_a, quizzes.option_b,
+               quizzes.option_c, quizzes.option_d, quizzes.correct_option
+        FROM quizzes JOIN lessons ON lessons.id = quizzes.lesson_id -- full scan: exporting everything
+        ORDER BY quizzes.id
+    '''):
+        yield {'type': 'quiz', 'external_id': row[0], 'lesson': row[1], 'question': row[2], 'option_a': row[3],
+               'option_b': row[4], 'option_c': row[5], 'option_d': row[6], 'correct_option': row[7]}
+
+
+def write_records(stream, records, file_format):
+    """Write records to stream as JSONL or CSV. Returns how many were written."""
+    count = 0
+    if file_format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    else:
+        for record in records:
+            stream.write(json.dumps({key: value for key, value in record.items() if value is not None}) + '\n')
+            count += 1
+    return count
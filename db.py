@@ -0,0 +1,132 @@
+import queue
+import sqlite3
+import threading
+
+from flask import current_app, g
+
+import metrics
+import migrations
+
+# Managed SQLite connection layer.
+# Each request borrows ONE connection (stored on flask.g) the first time it
+# calls get_db_connection(), and hands it back to a small pool when the request
+# ends. Connections are tuned once, when they are opened, instead of every time.
+# The first time the pool is created, any pending schema migrations are applied
+# (see migrations.py), unless AUTO_MIGRATE is turned off.
+
+DEFAULT_DATABASE = 'database.db'
+DEFAULT_POOL_SIZE = 8            # max connections open at the same time
+DEFAULT_POOL_TIMEOUT = 10        # seconds to wait for a free connection
+DEFAULT_BUSY_TIMEOUT_MS = 5000   # how long SQLite waits on a locked database
+DEFAULT_CACHE_SIZE_KB = 16000    # page cache per connection (~16 MB)
+
+_pool_lock = threading.Lock()
+
+
+def connect(path, busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS, cache_size_kb=DEFAULT_CACHE_SIZE_KB,
+            factory=sqlite3.Connection):
+    """Open a tuned connection to the database at path."""
+    conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, check_same_thread=False, factory=factory)
+    conn.row_factory = sqlite3.Row
+
+    # WAL lets readers keep going while someone writes, and NORMAL is safe in WAL mode
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA busy_timeout = {int(busy_timeout_ms)}')
+    conn.execute('PRAGMA foreign_keys = ON')
+    # A negative cache_size is measured in KiB instead of pages
+    conn.execute(f'PRAGMA cache_size = -{int(cache_size_kb)}')
+    return conn
+
+
+class ConnectionPool:
+    """A bounded pool of SQLite connections shared by the server's threads."""
+
+    def __init__(self, path, max_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_POOL_TIMEOUT, **connect_options):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.connect_options = connect_options
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self):
+        # Block (up to timeout) when every connection is already checked out
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RuntimeError(f'No free database connection after {self.timeout}s '
+                               f'(pool size {self.max_size})')
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return connect(self.path, **self.connect_options)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        try:
+            # Never hand a half-finished transaction to the next request
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def init_app(app):
+    """Register the database settings and the end-of-request cleanup on app."""
+    app.config.setdefault('DATABASE', DEFAULT_DATABASE)
+    app.config.setdefault('DB_POOL_SIZE', DEFAULT_POOL_SIZE)
+    app.config.setdefault('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT)
+    app.config.setdefault('DB_BUSY_TIMEOUT_MS', DEFAULT_BUSY_TIMEOUT_MS)
+    app.config.setdefault('DB_CACHE_SIZE_KB', DEFAULT_CACHE_SIZE_KB)
+    app.config.setdefault('AUTO_MIGRATE', True)
+    app.teardown_appcontext(close_db_connection)
+
+
+def get_pool():
+    pool = current_app.extensions.get('db_pool')
+    if pool is None:
+        with _pool_lock:
+            pool = current_app.extensions.get('db_pool')
+            if pool is None:
+                config = current_app.config
+                pool = ConnectionPool(config['DATABASE'],
+                                      max_size=config['DB_POOL_SIZE'],
+                                      timeout=config['DB_POOL_TIMEOUT'],
+                                      busy_timeout_ms=config['DB_BUSY_TIMEOUT_MS'],
+                                      cache_size_kb=config['DB_CACHE_SIZE_KB'],
+                                      # Timed while a request is being traced (see metrics.py)
+                                      factory=metrics.TimedConnection)
+                if config['AUTO_MIGRATE']:
+                    conn = pool.acquire()
+                    try:
+                        migrations.migrate(conn)
+                    finally:
+                        pool.release(conn)
+                current_app.extensions['db_pool'] = pool
+    return pool
+
+
+def get_db_connection():
+    """Return this request's connection, borrowing one from the pool if needed."""
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def close_db_connection(exception=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
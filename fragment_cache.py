@@ -0,0 +1,281 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, render_template
+from markupsafe import Markup
+
+# Cache for rendered HTML fragments (course cards, a course's lesson list).
+# Keys always contain the course's version stamp (see versions.py), so a
+# stale fragment can never be served. Each entry is also tagged with its course
+# id, and the routes that change a course call invalidate_course() after they
+# commit, so the old fragments are dropped right away instead of ageing out.
+#
+# Two backends, chosen with the FRAGMENT_CACHE setting:
+#   'memory'  - an LRU dict inside this process, bounded by FRAGMENT_CACHE_BYTES
+#   'sqlite'  - a small SQLite file (FRAGMENT_CACHE_PATH) shared by every worker
+#   'none'    - always render
+# Hit / miss / eviction counters are served as JSON at /cache/stats.
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def add(self, name, amount=1):
+        # For backends that don't already hold a lock of their own ("+=" is not atomic across threads)
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        with self._lock:
+            return self._as_dict()
+
+    def _as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class MemoryLRUCache:
+    """In-process LRU cache with a budget in bytes (of UTF-8 encoded HTML)."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._entries = OrderedDict()   # key -> (value, size, tag)
+        self._tags = {}                 # tag -> set of keys
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tag=None):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, tag)
+            self._bytes += size
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            # Evict the least recently used entries until we fit the budget again
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats.evictions += 1
+
+    def invalidate(self, tag):
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+            self.stats.invalidations += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        _, size, tag = entry
+        self._bytes -= size
+        if tag is not None:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats.as_dict(), backend='memory', entries=len(self._entries),
+                        bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+class SQLiteCache:
+    """Cache stored in its own SQLite file, so every worker process shares it."""
+
+    # Only record a hit's "last used" time when it is older than this, so reads stay reads
+    TOUCH_INTERVAL = 30
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS fragments (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                tag TEXT,
+                last_used REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_fragments_tag ON fragments (tag)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_fragments_last_used ON fragments (last_used)')
+        # The total size is kept in a one-row table by triggers, so checking the
+        # budget after a write is one lookup instead of a SUM over every fragment
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fragment_bytes (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total INTEGER NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS fragments_bytes_insert AFTER INSERT ON fragments
+                BEGIN UPDATE fragment_bytes SET total = total + NEW.size WHERE id = 1; END
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS fragments_bytes_update AFTER UPDATE OF size ON fragments
+                BEGIN UPDATE fragment_bytes SET total = total + NEW.size - OLD.size WHERE id = 1; END
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS fragments_bytes_delete AFTER DELETE ON fragments
+                BEGIN UPDATE fragment_bytes SET total = total - OLD.size WHERE id = 1; END
+            ''')
+            # A cache file from before the running total: count it up once
+            conn.execute('INSERT OR IGNORE INTO fragment_bytes (id, total) SELECT 1, COALESCE(SUM(size), 0) FROM fragments')
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: every statement is its own tiny transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')  # It's only a cache
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute('SELECT value, last_used FROM fragments WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.stats.add('misses')
+            return None
+        self.stats.add('hits')
+        now = time.time()
+        if now - row[1] > self.TOUCH_INTERVAL:
+            conn.execute('UPDATE fragments SET last_used = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def set(self, key, value, tag=None):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        conn = self._conn()
+        # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete doesn't fire the delete trigger
+        conn.execute('''
+            INSERT INTO fragments (key, value, size, tag, last_used) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size,
+                                            tag = excluded.tag, last_used = excluded.last_used
+        ''', (key, value, size, None if tag is None else str(tag), time.time()))
+        total = conn.execute('SELECT total FROM fragment_bytes WHERE id = 1').fetchone()[0]
+        while total > self.max_bytes:
+            oldest = conn.execute('SELECT key, size FROM fragments ORDER BY last_used LIMIT 1').fetchone()
+            if oldest is None:
+                break
+            conn.execute('DELETE FROM fragments WHERE key = ?', (oldest[0],))
+            total -= oldest[1]
+            self.stats.add('evictions')
+
+    def invalidate(self, tag):
+        self._conn().execute('DELETE FROM fragments WHERE tag = ?', (str(tag),))
+        self.stats.add('invalidations')
+
+    def info(self):
+        conn = self._conn()
+        entries = conn.execute('SELECT COUNT(*) FROM fragments').fetchone()[0]
+        size = conn.execute('SELECT total FROM fragment_bytes WHERE id = 1').fetchone()[0]
+        # hits/misses/evictions are counted per worker process
+        return dict(self.stats.as_dict(), backend='sqlite', entries=entries, bytes=size, max_bytes=self.max_bytes)
+
+
+class NullCache:
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key):
+        self.stats.add('misses')
+        return None
+
+    def set(self, key, value, tag=None):
+        pass
+
+    def invalidate(self, tag):
+        pass
+
+    def info(self):
+        return dict(self.stats.as_dict(), backend='none')
+
+
+_cache_lock = threading.Lock()
+
+
+def init_app(app):
+    app.config.setdefault('FRAGMENT_CACHE', 'memory')
+    app.config.setdefault('FRAGMENT_CACHE_BYTES', DEFAULT_MAX_BYTES)
+    app.config.setdefault('FRAGMENT_CACHE_PATH', 'fragment_cache.db')
+
+
+def get_cache():
+    cache = current_app.extensions.get('fragment_cache')
+    if cache is None:
+        with _cache_lock:
+            cache = current_app.extensions.get('fragment_cache')
+            if cache is None:
+                config = current_app.config
+                backend = config['FRAGMENT_CACHE']
+                if backend == 'memory':
+                    cache = MemoryLRUCache(config['FRAGMENT_CACHE_BYTES'])
+                elif backend == 'sqlite':
+                    cache = SQLiteCache(config['FRAGMENT_CACHE_PATH'], config['FRAGMENT_CACHE_BYTES'])
+                elif backend == 'none':
+                    cache = NullCache()
+                else:
+                    raise ValueError(f'Unknown FRAGMENT_CACHE backend: {backend!r}')
+                current_app.extensions['fragment_cache'] = cache
+    return cache
+
+
+def render_cached(key, tag, template_name, **context):
+    """Render template_name, or reuse the HTML cached under key (None = don't cache)."""
+    if key is None:
+        return Markup(render_template(template_name, **context))
+    cache = get_cache()
+    html = cache.get(key)
+    if html is None:
+        html = render_template(template_name, **context)
+        cache.set(key, html, tag)
+    return Markup(html)
+
+
+def invalidate_course(course_id):
+    """Drop every fragment of one course. Call after the change is committed."""
+    get_cache().invalidate(course_id)
@@ -1,59 +1,18 @@
+import os
 import sqlite3
 
-# Connect to the database (it will create 'database.db' if it doesn't exist)
-connection = sqlite3.connect('database.db')
+import migrations
 
-# Create a cursor object to execute SQL commands
-cursor = connection.cursor()
+# Create (or upgrade) the database by applying every pending migration.
+# This replaces the old setup_*/fix_*/update_* scripts. Inside the app the same
+# migrations run automatically on first use, or with:  flask --app app migrate
+db_path = os.environ.get('DATABASE', 'database.db')
 
-# 1. Create Users Table (Students and Instructors)
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    email TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL,
-    role TEXT DEFAULT 'student'
-)
-''')
-
-# 2. Create Courses Table
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS courses (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    title TEXT NOT NULL,
-    description TEXT,
-    instructor_id INTEGER,
-    FOREIGN KEY (instructor_id) REFERENCES users (id)
-)
-''')
-
-# 3. Create Lessons Table
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS lessons (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    course_id INTEGER,
-    title TEXT NOT NULL,
-    content TEXT,
-    video_url TEXT,
-    lesson_order INTEGER,
-    FOREIGN KEY (course_id) REFERENCES courses (id)
-)
-''')
-
-# 4. Create Enrollments Table (Links Students to Courses)
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS enrollments (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    course_id INTEGER,
-    FOREIGN KEY (user_id) REFERENCES users (id),
-    FOREIGN KEY (course_id) REFERENCES courses (id)
-)
-''')
-
-# Commit the changes and close
-connection.commit()
+connection = sqlite3.connect(db_path)
+before = migrations.get_version(connection)
+applied = migrations.migrate(connection)
 connection.close()
 
-print("Database initialized and tables created successfully!")
\ No newline at end of file
+for version, name in applied:
+    print(f"  applied {version:03d}: {name}")
+print(f"Database ready at schema version {migrations.LATEST_VERSION} (was {before})!")
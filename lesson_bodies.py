@@ -0,0 +1,60 @@
+import zlib
+
+# Lesson bodies, stored compressed when they are large.
+# lessons.content holds either plain TEXT (short lessons) or, for bodies of
+# COMPRESS_THRESHOLD bytes or more, a zlib-compressed BLOB of the UTF-8 text.
+# SQLite keeps the storage class per value, so the type of the value says which
+# one it is, and no extra column is needed.
+#
+# Always write bodies through pack() and read them through unpack(). The course
+# outline never selects content at all: a body is only loaded (and
+# decompressed) when one lesson is opened (see /lesson/<id>/body in app.py).
+
+COMPRESS_THRESHOLD = 4096   # bytes of UTF-8; smaller bodies are stored as they are
+COMPRESS_LEVEL = 6
+BATCH_SIZE = 500            # lessons compressed per round by compress_existing()
+
+
+def pack(text):
+    """The value to store in lessons.content for the body text."""
+    if text is None:
+        return None
+    raw = text.encode('utf-8')
+    if len(raw) < COMPRESS_THRESHOLD:
+        return text
+    compressed = zlib.compress(raw, COMPRESS_LEVEL)
+    # Already-compressed looking text (e.g. base64) may not shrink; keep it readable then
+    return compressed if len(compressed) < len(raw) else text
+
+
+def unpack(value):
+    """The body text for a value read from lessons.content."""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+def load_body(conn, lesson_id):
+    """(course_id, body text) for one lesson, or None if it doesn't exist."""
+    row = conn.execute('SELECT course_id, content FROM lessons WHERE id = ?', (lesson_id,)).fetchone()
+    if row is None:
+        return None
+    return row[0], unpack(row[1])
+
+
+def compress_existing(conn):
+    """Compress every stored plain-text body over the threshold. Returns how many. The caller commits."""
+    # A few hundred lessons at a time, walking the id order, so memory stays flat
+    last_id, count = 0, 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, content FROM lessons
+            WHERE id > ? AND typeof(content) = 'text' AND length(CAST(content AS BLOB)) >= ?
+            ORDER BY id LIMIT ?
+        ''', (last_id, COMPRESS_THRESHOLD, BATCH_SIZE)).fetchall()
+        if not rows:
+            return count
+        conn.executemany('UPDATE lessons SET content = ? WHERE id = ?',
+                         [(pack(content), lesson_id) for lesson_id, content in rows])
+        last_id = rows[-1][0]
+        count += len(rows)
@@ -0,0 +1,328 @@
+import bisect
+import random
+import re
+import sqlite3
+import threading
+import time
+
+from flask import before_render_template, current_app, g, request, template_rendered
+
+# Per-request instrumentation, served in Prometheus' text format at /metrics.
+#
+# Every request is timed by endpoint. A sample of them (METRICS_SAMPLE_RATE,
+# 0.0 - 1.0) is also traced in detail:
+#   - every SQL statement on the pooled connections is counted and timed
+#     (TimedConnection / TimedCursor below; time to the first row). These
+#     subclass sqlite3's classes instead of using set_trace_callback() or
+#     set_progress_handler(): the trace callback reports the text but not how
+#     long a statement took, and the progress handler fires every N VM steps
+#     without saying which statement it is in. executescript() is timed as a
+#     single statement, however many the script holds.
+#   - Jinja rendering is timed per template (Flask's render signals)
+#   - password hashing is timed (passwords.py calls observe_hashing())
+# With the sample rate turned down, an unsampled request costs one clock
+# read at each end and one thread-local lookup per SQL statement.
+#
+# While tracing, statements slower than METRICS_SLOW_QUERY_MS and the same
+# statement running METRICS_N_PLUS_ONE times or more in one request (the usual
+# sign of a query inside a loop) are logged as warnings. Set either to 0 to
+# turn that check off. METRICS = off removes the hooks and /metrics altogether.
+#
+# The numbers are per process: with serve.py's workers, each worker keeps its
+# own and /metrics shows the one that answered.
+
+DEFAULT_SAMPLE_RATE = 0.1   # trace 1 request in 10
+DEFAULT_SLOW_QUERY_MS = 100
+DEFAULT_N_PLUS_ONE = 10
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PREFIX = 'edulearn_'
+
+# Histogram bucket bounds: seconds for durations, plain numbers for counts
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNTS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = threading.local()   # .trace: the RequestTrace of the request on this thread, if sampled
+_whitespace = re.compile(r'\s+')
+
+
+# --- Aggregated numbers ---
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Registry:
+    """Counters and histograms, each keyed by its label values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}   # name -> (kind, help, label names, buckets, {label values: Histogram or number})
+
+    def counter(self, name, help, labels=()):
+        self._metrics[name] = ('counter', help, labels, None, {})
+
+    def histogram(self, name, help, labels=(), buckets=SECONDS):
+        self._metrics[name] = ('histogram', help, labels, buckets, {})
+
+    def inc(self, name, *label_values, amount=1):
+        series = self._metrics[name][4]
+        with self._lock:
+            series[label_values] = series.get(label_values, 0) + amount
+
+    def observe(self, name, value, *label_values):
+        kind, help, labels, buckets, series = self._metrics[name]
+        with self._lock:
+            histogram = series.get(label_values)
+            if histogram is None:
+                histogram = series[label_values] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self):
+        """The Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (kind, help, labels, buckets, series) in self._metrics.items():
+                full_name = PREFIX + name
+                lines.append(f'# HELP {full_name} {help}')
+                lines.append(f'# TYPE {full_name} {kind}')
+                for label_values, value in sorted(series.items()):
+                    pairs = list(zip(labels, label_values))
+                    if kind == 'counter':
+                        lines.append(f'{full_name}{_labels(pairs)} {value}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), value.counts):
+                        cumulative += count
+                        lines.append(f'{full_name}_bucket{_labels(pairs + [("le", bound)])} {cumulative}')
+                    lines.append(f'{full_name}_sum{_labels(pairs)} {value.sum:.6f}')
+                    lines.append(f'{full_name}_count{_labels(pairs)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def new_registry():
+    registry = Registry()
+    registry.counter('requests_total', 'Requests handled, by endpoint and status code.', ('endpoint', 'status'))
+    registry.histogram('request_duration_seconds', 'Time to handle a request.', ('endpoint',))
+    registry.counter('requests_traced_total', 'Requests traced in detail (see METRICS_SAMPLE_RATE).', ('endpoint',))
+    registry.histogram('sql_queries_per_request', 'SQL statements run by one traced request.', ('endpoint',),
+                       buckets=QUERY_COUNTS)
+    registry.histogram('sql_duration_seconds', 'Total SQL time of one traced request.', ('endpoint',))
+    registry.histogram('template_duration_seconds', 'Total Jinja rendering time of one traced request.',
+                       ('endpoint',))
+    registry.histogram('template_render_seconds', 'Time to render one template (traced requests).', ('template',))
+    registry.histogram('password_hash_seconds', 'Password hashing, including the wait for the hashing pool.',
+                       ('operation',))
+    registry.counter('slow_queries_total', 'Traced statements slower than METRICS_SLOW_QUERY_MS.', ('endpoint',))
+    registry.counter('n_plus_one_total', 'Traced requests that repeated one statement METRICS_N_PLUS_ONE times.',
+                     ('endpoint',))
+    registry.counter('rate_limited_total', 'Requests turned away with 429, by endpoint and limit scope.',
+                     ('endpoint', 'scope'))
+    return registry
+
+
+# --- One traced request ---
+
+class RequestTrace:
+    def __init__(self, slow_threshold):
+        self.slow_threshold = slow_threshold   # seconds (0 = don't log slow statements)
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.statements = {}     # normalized SQL -> times run
+        self.slow = []           # (seconds, sql)
+        self.renders = []        # (template name, seconds)
+        self._rendering = []     # start times of the templates being rendered (they can nest)
+
+
+def _record_statement(sql, seconds):
+    trace = getattr(_current, 'trace', None)
+    if trace is None:
+        return
+    trace.queries += 1
+    trace.sql_seconds += seconds
+    key = _whitespace.sub(' ', sql).strip()
+    trace.statements[key] = trace.statements.get(key, 0) + 1
+    if trace.slow_threshold and seconds >= trace.slow_threshold:
+        trace.slow.append((seconds, key))
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        if getattr(_current, 'trace', None) is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_statement(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        if getattr(_current, 'trace', None) is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_statement(sql, time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        if getattr(_current, 'trace', None) is None:
+            return super().executescript(sql_script)
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _record_statement(sql_script, time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    """A connection whose statements are timed while a traced request is running on this thread."""
+
+    # conn.execute() goes straight to C code, so it is wrapped here as well as on the cursor
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        if getattr(_current, 'trace', None) is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_statement(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        if getattr(_current, 'trace', None) is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_statement(sql, time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        if getattr(_current, 'trace', None) is None:
+            return super().executescript(sql_script)
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _record_statement(sql_script, time.perf_counter() - started)
+
+
+# --- Hooks ---
+
+def init_app(app):
+    app.config.setdefault('METRICS', True)
+    app.config.setdefault('METRICS_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+    app.config.setdefault('METRICS_SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)
+    app.config.setdefault('METRICS_N_PLUS_ONE', DEFAULT_N_PLUS_ONE)
+    if not app.config['METRICS']:
+        return
+    app.extensions['metrics'] = new_registry()
+    app.before_request(_start_request)
+    app.after_request(_remember_status)
+    app.teardown_request(_finish_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+
+def get_registry():
+    """This process's Registry, or None when METRICS is off."""
+    return current_app.extensions.get('metrics')
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    rate = current_app.config['METRICS_SAMPLE_RATE']
+    if rate >= 1 or (rate > 0 and random.random() < rate):
+        _current.trace = RequestTrace(current_app.config['METRICS_SLOW_QUERY_MS'] / 1000)
+
+
+def _remember_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exception=None):
+    trace = getattr(_current, 'trace', None)
+    _current.trace = None
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    registry = current_app.extensions['metrics']
+    endpoint = request.endpoint or '<unmatched>'
+    status = g.pop('metrics_status', 500)
+
+    registry.inc('requests_total', endpoint, str(status))
+    registry.observe('request_duration_seconds', elapsed, endpoint)
+    if trace is None:
+        return
+
+    registry.inc('requests_traced_total', endpoint)
+    registry.observe('sql_queries_per_request', trace.queries, endpoint)
+    registry.observe('sql_duration_seconds', trace.sql_seconds, endpoint)
+    registry.observe('template_duration_seconds', trace.template_seconds, endpoint)
+    for name, seconds in trace.renders:
+        registry.observe('template_render_seconds', seconds, name)
+
+    logger = current_app.logger
+    for seconds, sql in trace.slow:
+        registry.inc('slow_queries_total', endpoint)
+        logger.warning('Slow query (%.1f ms) in %s: %s', seconds * 1000, endpoint, sql[:300])
+    repeat_limit = current_app.config['METRICS_N_PLUS_ONE']
+    if repeat_limit:
+        repeated = [(count, sql) for sql, count in trace.statements.items() if count >= repeat_limit]
+        if repeated:
+            registry.inc('n_plus_one_total', endpoint)
+            for count, sql in repeated:
+                logger.warning('Possible N+1 in %s: ran %d times: %s', endpoint, count, sql[:300])
+
+
+def _template_started(sender, template, context, **extra):
+    trace = getattr(_current, 'trace', None)
+    if trace is not None:
+        trace._rendering.append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    trace = getattr(_current, 'trace', None)
+    if trace is None or not trace._rendering:
+        return
+    seconds = time.perf_counter() - trace._rendering.pop()
+    trace.renders.append((template.name or '<string>', seconds))
+    # Count nested renders (e.g. a cached fragment) only once in the request's total
+    if not trace._rendering:
+        trace.template_seconds += seconds
+
+
+def observe_hashing(operation, seconds):
+    """Called by passwords.py for every hash / verification."""
+    registry = current_app.extensions.get('metrics')
+    if registry is not None:
+        registry.observe('password_hash_seconds', seconds, operation)
+
+
+def count_rate_limited(endpoint, scope):
+    """Called by rate_limit.py for every rejected request."""
+    registry = current_app.extensions.get('metrics')
+    if registry is not None:
+        registry.inc('rate_limited_total', endpoint, scope)
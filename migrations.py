@@ -0,0 +1,462 @@
+import time
+
+import lesson_bodies
+import ordering
+import progress
+import search
+
+# Versioned schema migrations.
+# The schema version lives in SQLite's own header (PRAGMA user_version), so
+# there is no extra bookkeeping table. Each migration is a numbered function in
+# MIGRATIONS; migrate() runs every one newer than the database in a single
+# transaction, so a database is never left half-upgraded.
+#
+# To change the schema, ADD a new migration at the end of the list.
+# Never edit one that has already shipped.
+
+
+def _add_column(conn, table, column, declaration):
+    # SQLite has no "ADD COLUMN IF NOT EXISTS", so look before adding
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+
+def _rebuild_table(conn, table, create_sql):
+    """Swap table for a new definition (create_sql, naming the table {table}), keeping its rows and indexes.
+
+    SQLite can't change a table's constraints in place, so this is the
+    create-copy-drop-rename recipe from its ALTER TABLE docs. Foreign keys must
+    be off (migrate() does that), or dropping the old table would cascade.
+    """
+    indexes = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))]
+    old_columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+    sequence = conn.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+
+    conn.execute(create_sql.format(table=f'{table}_new'))
+    columns = ', '.join(row[1] for row in conn.execute(f'PRAGMA table_info({table}_new)') if row[1] in old_columns)
+    conn.execute(f'INSERT INTO {table}_new ({columns}) SELECT {columns} FROM {table}')
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    for sql in indexes:
+        conn.execute(sql)
+    # Keep AUTOINCREMENT from handing out the ids of rows deleted before the rebuild
+    if sequence:
+        conn.execute('UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (sequence[0], table))
+
+
+def _001_base_schema(conn):
+    # Everything the old init_db/setup_*/fix_*/update_* scripts created.
+    # IF NOT EXISTS lets this run safely on databases built by those scripts.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT DEFAULT 'student',
+            profile_pic TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS courses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            instructor_id INTEGER,
+            thumbnail TEXT,
+            FOREIGN KEY (instructor_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS lessons (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            course_id INTEGER,
+            title TEXT NOT NULL,
+            content TEXT,
+            video_url TEXT,
+            lesson_order INTEGER,
+            FOREIGN KEY (course_id) REFERENCES courses (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS enrollments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            course_id INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (course_id) REFERENCES courses (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS completed_lessons (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            lesson_id INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (lesson_id) REFERENCES lessons (id),
+            UNIQUE(user_id, lesson_id)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quizzes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lesson_id INTEGER NOT NULL,
+            question TEXT NOT NULL,
+            option_a TEXT NOT NULL,
+            option_b TEXT NOT NULL,
+            option_c TEXT NOT NULL,
+            option_d TEXT NOT NULL,
+            correct_option TEXT NOT NULL,
+            FOREIGN KEY (lesson_id) REFERENCES lessons (id) ON DELETE CASCADE
+        )
+    ''')
+    # Columns that were bolted on later by fix_db.py / update_users_db.py
+    _add_column(conn, 'courses', 'thumbnail', 'TEXT')
+    _add_column(conn, 'users', 'profile_pic', 'TEXT')
+
+
+def _002_indexes(conn):
+    # One enrollment per student per course. Old databases may hold duplicate
+    # clicks, so keep the first row of each pair before adding the constraint.
+    conn.execute('''
+        DELETE FROM enrollments WHERE id NOT IN (
+            SELECT MIN(id) FROM enrollments GROUP BY user_id, course_id
+        )
+    ''')
+    # (user_id, course_id) covers both the dashboard join and the enroll check
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_enrollments_user_course ON enrollments (user_id, course_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_course ON enrollments (course_id)')
+    # Lesson lists for course_details / certificate (id is implied, so it covers "SELECT id")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_lessons_course ON lessons (course_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quizzes_lesson ON quizzes (lesson_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_courses_instructor ON courses (instructor_id)')
+    # UNIQUE(user_id, lesson_id) already covers lookups by student; this one covers deletes by lesson
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_completed_lessons_lesson ON completed_lessons (lesson_id)')
+
+
+def _003_course_search(conn):
+    # FTS5 index used by search.py (see search.search_courses)
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS course_search USING fts5(
+            title,
+            description,
+            lessons,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    ''')
+    search.rebuild_search_index(conn)
+
+
+def _004_course_progress(conn):
+    # Materialized progress counters maintained by progress.py
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS course_progress (
+            user_id INTEGER NOT NULL,
+            course_id INTEGER NOT NULL,
+            completed_count INTEGER NOT NULL DEFAULT 0,
+            total_lessons INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, course_id)
+        ) WITHOUT ROWID
+    ''')
+    # add_lesson / delete_lesson update every student of one course
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_course_progress_course ON course_progress (course_id)')
+    progress.rebuild_progress(conn)
+
+
+def _005_uploads(conn):
+    # Reference counts for the files in the upload folder (see uploads.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS uploads (
+            filename TEXT PRIMARY KEY,
+            size INTEGER,
+            refcount INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_uploads_refcount ON uploads (refcount)')
+    # Count the references to files uploaded before this table existed
+    conn.execute('''
+        INSERT OR IGNORE INTO uploads (filename, refcount)
+        SELECT name, COUNT(*) FROM (
+            SELECT thumbnail AS name FROM courses WHERE thumbnail IS NOT NULL
+            UNION ALL
+            SELECT profile_pic FROM users WHERE profile_pic IS NOT NULL
+        ) GROUP BY name
+    ''')
+
+
+def _006_content_versions(conn):
+    # Version stamps for conditional GET (see versions.py)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS content_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    now = time.time()
+    conn.execute("INSERT OR IGNORE INTO content_versions (scope, version, updated_at) VALUES ('catalogue', 1, ?)", (now,))
+    conn.execute('''
+        INSERT OR IGNORE INTO content_versions (scope, version, updated_at)
+        SELECT 'course:' || id, 1, ? FROM courses
+    ''', (now,))
+    # When a student's progress last changed, for their Last-Modified header
+    _add_column(conn, 'course_progress', 'updated_at', 'REAL')
+    conn.execute('UPDATE course_progress SET updated_at = ? WHERE updated_at IS NULL', (now,))
+
+
+def _007_external_ids(conn):
+    # Stable ids from outside systems, so bulk imports can upsert (see content_io.py).
+    # NULLs never collide in a UNIQUE index, so rows made in the web forms are fine.
+    for table in ('courses', 'lessons', 'quizzes'):
+        _add_column(conn, table, 'external_id', 'TEXT')
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_external_id ON {table} (external_id)')
+
+
+def _008_quiz_attempts(conn):
+    # A lesson's quiz is all of its quizzes rows (one row per question).
+    # quiz_pass_percent is the optional score that marks the lesson complete.
+    _add_column(conn, 'lessons', 'quiz_pass_percent', 'INTEGER')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            lesson_id INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            passed INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (lesson_id) REFERENCES lessons (id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quiz_attempts_user_lesson ON quiz_attempts (user_id, lesson_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quiz_attempts_lesson ON quiz_attempts (lesson_id)')
+    # One row per question answered in an attempt
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quiz_attempt_answers (
+            attempt_id INTEGER NOT NULL,
+            quiz_id INTEGER NOT NULL,
+            answer TEXT,
+            is_correct INTEGER NOT NULL,
+            PRIMARY KEY (attempt_id, quiz_id),
+            FOREIGN KEY (attempt_id) REFERENCES quiz_attempts (id) ON DELETE CASCADE,
+            FOREIGN KEY (quiz_id) REFERENCES quizzes (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_quiz_attempt_answers_quiz ON quiz_attempt_answers (quiz_id)')
+
+
+def _009_analytics_rollups(conn):
+    # When each enrollment / completion happened. Rows from before this
+    # migration get the migration time, since the real time was never stored.
+    now = time.time()
+    for table in ('enrollments', 'completed_lessons'):
+        _add_column(conn, table, 'created_at', 'REAL')
+        conn.execute(f'UPDATE {table} SET created_at = ? WHERE created_at IS NULL', (now,))
+
+    # Rollups for the instructor analytics page (see analytics.py). Each source
+    # table is read only past its watermark, the highest id already counted.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_watermarks (
+            source TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            refreshed_at REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_enrollments_daily (
+            course_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            enrollments INTEGER NOT NULL,
+            PRIMARY KEY (course_id, day)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_lesson_stats (
+            lesson_id INTEGER PRIMARY KEY,
+            course_id INTEGER NOT NULL,
+            completions INTEGER NOT NULL DEFAULT 0,
+            quiz_attempts INTEGER NOT NULL DEFAULT 0,
+            quiz_passes INTEGER NOT NULL DEFAULT 0,
+            quiz_score INTEGER NOT NULL DEFAULT 0,
+            quiz_questions INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_analytics_lesson_stats_course ON analytics_lesson_stats (course_id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_completion_buckets (
+            course_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            students INTEGER NOT NULL,
+            PRIMARY KEY (course_id, bucket)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _010_certificates(conn):
+    # One certificate per student per course, written once when they first
+    # reach 100%. The name and title are copied in, so the certificate (and its
+    # public verification page) stays the same if the course changes later.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS certificates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT NOT NULL UNIQUE,
+            user_id INTEGER NOT NULL,
+            course_id INTEGER NOT NULL,
+            recipient_name TEXT NOT NULL,
+            course_title TEXT NOT NULL,
+            instructor_name TEXT,
+            issued_at REAL NOT NULL,
+            UNIQUE (user_id, course_id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+
+def _011_compress_lesson_bodies(conn):
+    # Large lesson bodies become zlib BLOBs in the same column (see lesson_bodies.py)
+    lesson_bodies.compress_existing(conn)
+
+
+def _012_api_tokens(conn):
+    # Bearer tokens for the JSON API (see api.py). Only a SHA-256 of each token
+    # is stored, so a leaked database doesn't leak working tokens.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS api_tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            token_hash TEXT NOT NULL UNIQUE,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used_at REAL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_api_tokens_user ON api_tokens (user_id)')
+
+
+def _013_cascading_deletes(conn):
+    # Deleting a course now deletes its lessons, enrollments and progress rows,
+    # and deleting a lesson deletes its completions (quizzes and quiz attempts
+    # already cascaded). Rows orphaned before this are removed by
+    # `flask sweep-orphans` (see purge.py); they are copied over unchanged here.
+    _rebuild_table(conn, 'lessons', '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            course_id INTEGER,
+            title TEXT NOT NULL,
+            content TEXT,
+            video_url TEXT,
+            lesson_order INTEGER,
+            external_id TEXT,
+            quiz_pass_percent INTEGER,
+            FOREIGN KEY (course_id) REFERENCES courses (id) ON DELETE CASCADE
+        )
+    ''')
+    _rebuild_table(conn, 'enrollments', '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            course_id INTEGER NOT NULL,
+            created_at REAL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            FOREIGN KEY (course_id) REFERENCES courses (id) ON DELETE CASCADE
+        )
+    ''')
+    _rebuild_table(conn, 'completed_lessons', '''
+        CREATE TABLE {table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            lesson_id INTEGER NOT NULL,
+            created_at REAL,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            FOREIGN KEY (lesson_id) REFERENCES lessons (id) ON DELETE CASCADE,
+            UNIQUE(user_id, lesson_id)
+        )
+    ''')
+    _rebuild_table(conn, 'course_progress', '''
+        CREATE TABLE {table} (
+            user_id INTEGER NOT NULL,
+            course_id INTEGER NOT NULL,
+            completed_count INTEGER NOT NULL DEFAULT 0,
+            total_lessons INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL,
+            PRIMARY KEY (user_id, course_id),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+            FOREIGN KEY (course_id) REFERENCES courses (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    ''')
+
+
+def _014_lesson_order(conn):
+    # Lessons are read in lesson_order (see ordering.py). This index returns
+    # them sorted, and its course_id prefix does everything idx_lessons_course did.
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_lessons_course_order ON lessons (course_id, lesson_order)')
+    conn.execute('DROP INDEX IF EXISTS idx_lessons_course')
+    # Give every lesson a spaced-out key, keeping any order that was imported
+    # and putting lessons without one after those, oldest first
+    conn.execute('''
+        UPDATE lessons SET lesson_order = numbered.position * ?
+        FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY course_id
+                                            ORDER BY lesson_order IS NULL, lesson_order, id) AS position
+              FROM lessons) AS numbered
+        WHERE lessons.id = numbered.id
+    ''', (ordering.GAP,))
+
+
+MIGRATIONS = [
+    (1, 'base schema', _001_base_schema),
+    (2, 'indexes and unique enrollments', _002_indexes),
+    (3, 'course full-text search', _003_course_search),
+    (4, 'course progress counters', _004_course_progress),
+    (5, 'upload reference counts', _005_uploads),
+    (6, 'content version stamps', _006_content_versions),
+    (7, 'external ids for bulk import', _007_external_ids),
+    (8, 'multi-question quizzes and attempts', _008_quiz_attempts),
+    (9, 'instructor analytics rollups', _009_analytics_rollups),
+    (10, 'issued certificates', _010_certificates),
+    (11, 'compressed lesson bodies', _011_compress_lesson_bodies),
+    (12, 'api tokens', _012_api_tokens),
+    (13, 'cascading deletes', _013_cascading_deletes),
+    (14, 'spaced lesson order keys', _014_lesson_order),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to LATEST_VERSION. Returns the list of applied migrations."""
+    if get_version(conn) >= LATEST_VERSION:
+        return []
+
+    if conn.in_transaction:
+        conn.commit()
+    # Table rebuilds (see _rebuild_table) must not fire ON DELETE CASCADE.
+    # This pragma is ignored inside a transaction, so it is set before BEGIN.
+    foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+    conn.execute('PRAGMA foreign_keys = OFF')
+    # IMMEDIATE takes the write lock now, so two workers starting together
+    # cannot both run the same migration
+    conn.execute('BEGIN IMMEDIATE')
+    applied = []
+    try:
+        current = get_version(conn)
+        for version, name, upgrade in MIGRATIONS:
+            if version > current:
+                upgrade(conn)
+                applied.append((version, name))
+        conn.execute(f'PRAGMA user_version = {LATEST_VERSION}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute(f'PRAGMA foreign_keys = {foreign_keys}')
+    return applied
@@ -0,0 +1,81 @@
+# Lesson order within a course, kept in lessons.lesson_order.
+# The keys are spaced GAP apart (1024, 2048, 3072, ...) instead of 1, 2, 3, so
+# moving a lesson just gives it a key halfway between its new neighbours:
+# ONE row changes, however long the course is. Only when two neighbours are
+# already next to each other (about ten moves into the same spot) does the
+# course get renumbered back to even gaps, in the same transaction.
+#
+# Read lessons with ORDER BY lesson_order IS NULL, lesson_order, id - the
+# same order migration 014 numbered them in. A lesson without a key (one
+# inserted by hand) goes last, and stays last when the course is renumbered.
+
+GAP = 1024
+
+
+def next_position(conn, course_id):
+    """The key for a lesson added at the end of the course."""
+    last = conn.execute('SELECT MAX(lesson_order) FROM lessons WHERE course_id = ?', (course_id,)).fetchone()[0]
+    return (last or 0) + GAP
+
+
+def renumber(conn, course_id):
+    """Space one course's keys GAP apart again, keeping the order. The caller commits."""
+    conn.execute('''
+        UPDATE lessons SET lesson_order = numbered.position * ?
+        FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY lesson_order IS NULL, lesson_order, id) AS position
+              FROM lessons WHERE course_id = ?) AS numbered
+        WHERE lessons.id = numbered.id
+    ''', (GAP, course_id))
+
+
+def _neighbour_keys(conn, course_id, lesson_id, after_id):
+    """The keys of the lessons the moved lesson goes between (None at either end)."""
+    if after_id is None:
+        first = conn.execute('''
+            SELECT lesson_order FROM lessons WHERE course_id = ? AND id != ?
+            ORDER BY lesson_order IS NULL, lesson_order, id LIMIT 1
+        ''', (course_id, lesson_id)).fetchone()
+        return None, first[0] if first else None
+
+    after = conn.execute('SELECT lesson_order FROM lessons WHERE id = ? AND course_id = ?',
+                         (after_id, course_id)).fetchone()
+    if after is None or after_id == lesson_id:
+        raise ValueError('after_id must be another lesson of the same course.')
+    # No NULL keys by now (move_lesson() renumbers those first), so the row-value comparison is safe
+    following = conn.execute('''
+        SELECT lesson_order FROM lessons
+        WHERE course_id = ? AND id != ? AND (lesson_order, id) > (?, ?)
+        ORDER BY lesson_order IS NULL, lesson_order, id LIMIT 1
+    ''', (course_id, lesson_id, after[0], after_id)).fetchone()
+    return after[0], following[0] if following else None
+
+
+def move_lesson(conn, course_id, lesson_id, after_id=None):
+    """Put a lesson right after after_id (None = first). Returns (new key, whether the course was renumbered).
+
+    The caller commits.
+    """
+    renumbered = False
+    # Lessons from before the keys were kept (or imported without one) have none yet
+    if conn.execute('SELECT 1 FROM lessons WHERE course_id = ? AND lesson_order IS NULL LIMIT 1',
+                    (course_id,)).fetchone():
+        renumber(conn, course_id)
+        renumbered = True
+
+    low, high = _neighbour_keys(conn, course_id, lesson_id, after_id)
+    if low is not None and high is not None and high - low < 2:
+        # No whole number left in between
+        renumber(conn, course_id)
+        renumbered = True
+        low, high = _neighbour_keys(conn, course_id, lesson_id, after_id)
+
+    if low is None and high is None:
+        key = GAP
+    elif low is None:
+        key = high - GAP
+    elif high is None:
+        key = low + GAP
+    else:
+        key = (low + high) // 2
+    conn.execute('UPDATE lessons SET lesson_order = ? WHERE id = ?', (key, lesson_id))
+    return key, renumbered
@@ -0,0 +1,94 @@
+import base64
+import json
+
+# Keyset ("cursor") pagination.
+# Instead of OFFSET (which makes SQLite walk past every earlier row), each page
+# remembers the sort key of its first and last row. The next page asks for rows
+# AFTER the last key, the previous page for rows BEFORE the first key, so page
+# 500 costs exactly the same as page 1.
+#
+# Cursors are opaque to the browser: a URL-safe base64 token of the direction
+# and the key values, e.g. ?cursor=eyJhIjogWzEyXX0
+
+DEFAULT_PAGE_SIZE = 12
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(direction, key):
+    payload = json.dumps({direction: list(key)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (direction, key) for a cursor token, or (None, None) if it is missing or invalid."""
+    if not token:
+        return None, None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        (direction, key), = payload.items()
+    except (ValueError, TypeError, AttributeError):
+        return None, None
+    if direction not in ('a', 'b') or not isinstance(key, list):
+        return None, None
+    return direction, key
+
+
+def keyset_sql(sql, key_columns, direction=None):
+    """Wrap sql so it returns one page in key order, after/before a key.
+
+    The key columns must come out of sql under these exact names and must be
+    unique together (end with an id) so the order is stable.
+    """
+    keys = ', '.join(key_columns)
+    where = ''
+    if direction == 'a':
+        where = f'WHERE ({keys}) > ({", ".join("?" * len(key_columns))})'
+    elif direction == 'b':
+        where = f'WHERE ({keys}) < ({", ".join("?" * len(key_columns))})'
+    order = 'DESC' if direction == 'b' else 'ASC'
+    order_by = ', '.join(f'{column} {order}' for column in key_columns)
+    return f'SELECT * FROM ({sql}) {where} ORDER BY {order_by} LIMIT ?'
+
+
+def paginate(conn, sql, params, key_columns, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Run sql and return one Page of its rows, ordered by key_columns."""
+    direction, key = decode_cursor(cursor)
+    if key is not None and len(key) != len(key_columns):
+        direction, key = None, None
+
+    query = keyset_sql(sql, key_columns, direction)
+    args = list(params) + (key or []) + [page_size + 1]
+    rows = conn.execute(query, args).fetchall()
+
+    # We asked for one extra row just to find out whether there is more
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == 'b':
+        rows.reverse()
+    if not rows:
+        return Page([])
+
+    first_key = [rows[0][column] for column in key_columns]
+    last_key = [rows[-1][column] for column in key_columns]
+
+    if direction == 'b':
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, direction == 'a'
+
+    return Page(rows,
+                next_cursor=encode_cursor('a', last_key) if has_next else None,
+                prev_cursor=encode_cursor('b', first_key) if has_prev else None)
@@ -0,0 +1,128 @@
+import threading
+import time
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+import metrics
+
+# Password hashing with a configurable cost, run on a small bounded pool.
+# Hashing is deliberately slow (that is what makes stolen hashes hard to crack),
+# so a burst of logins must not be allowed to tie up every request thread.
+# At most PASSWORD_HASH_WORKERS hashes run at once and at most
+# PASSWORD_HASH_QUEUE more may wait; anything beyond that is refused right away
+# with HashingBusy (the app answers 503 + Retry-After) instead of queueing forever.
+#
+# PASSWORD_HASH_METHOD uses werkzeug's method strings, e.g.
+#   'scrypt:32768:8:1'        (werkzeug's default)
+#   'pbkdf2:sha256:600000'
+# Hashes made with other settings still verify, and are upgraded on the next
+# successful login (see needs_rehash()).
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE = 16
+DEFAULT_TIMEOUT = 10   # seconds a request will wait for its hash
+
+
+class HashingBusy(Exception):
+    """Too many password hashes are already running or waiting."""
+
+    retry_after = 2
+
+
+class HashingPool:
+    def __init__(self, workers=DEFAULT_WORKERS, queue_depth=DEFAULT_QUEUE, timeout=DEFAULT_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+
+    def run(self, function, *args):
+        # Non-blocking: if every slot is taken, shed the request instead of waiting
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self._executor.submit(function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        # Not the builtin TimeoutError: the two are only the same class from Python 3.11
+        except futures.TimeoutError:
+            raise HashingBusy() from None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_pool_lock = threading.Lock()
+
+
+def init_app(app):
+    app.config.setdefault('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+    app.config.setdefault('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS)
+    app.config.setdefault('PASSWORD_HASH_QUEUE', DEFAULT_QUEUE)
+    app.config.setdefault('PASSWORD_HASH_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def get_pool():
+    pool = current_app.extensions.get('hashing_pool')
+    if pool is None:
+        with _pool_lock:
+            pool = current_app.extensions.get('hashing_pool')
+            if pool is None:
+                config = current_app.config
+                pool = HashingPool(config['PASSWORD_HASH_WORKERS'], config['PASSWORD_HASH_QUEUE'],
+                                   config['PASSWORD_HASH_TIMEOUT'])
+                current_app.extensions['hashing_pool'] = pool
+    return pool
+
+
+def hash_password(password):
+    started = time.perf_counter()
+    try:
+        return get_pool().run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+    finally:
+        metrics.observe_hashing('hash', time.perf_counter() - started)
+
+
+def verify_password(stored_hash, password):
+    started = time.perf_counter()
+    try:
+        return get_pool().run(check_password_hash, stored_hash, password)
+    finally:
+        metrics.observe_hashing('verify', time.perf_counter() - started)
+
+
+def needs_rehash(stored_hash):
+    """True when stored_hash was made with different settings than PASSWORD_HASH_METHOD."""
+    method = stored_hash.split('$', 1)[0]
+    return _normalize(method) != _normalize(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def _normalize(method):
+    # Spell out werkzeug's defaults, so 'scrypt' and 'scrypt:32768:8:1' compare equal
+    parts = method.split(':')
+    if parts[0] == 'scrypt':
+        defaults = ['scrypt', '32768', '8', '1']
+    elif parts[0] == 'pbkdf2':
+        defaults = ['pbkdf2', 'sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join(parts + defaults[len(parts):])
+
+
+def benchmark(methods, seconds=2.0):
+    """Yield (method, hashes per second) for each method, hashing on this thread."""
+    for method in methods:
+        count = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            generate_password_hash('correct horse battery staple', method)
+            count += 1
+        yield method, count / (time.perf_counter() - started)
@@ -0,0 +1,228 @@
+import json
+import time
+
+# Materialized per-student course progress.
+# course_progress keeps one row per (student, course) with the number of
+# lessons they finished and the number of lessons in the course, so the
+# progress bar and the certificate check are a single primary-key lookup.
+#
+# Every write that changes progress updates the counters in the SAME
+# transaction (the caller commits), so they can never drift apart:
+#   enroll            -> start_course()
+#   complete_lesson   -> lesson_completed()
+#   a batch sync      -> complete_lessons()  (many lessons, one transaction)
+#   add_lesson        -> lesson_added()
+#   delete_lesson     -> lessons_uncompleted() for each batch purged (see purge.py),
+#                        then lesson_deleted()   (call BEFORE deleting the lesson)
+#   delete_course     -> nothing: the rows cascade with the course
+# verify_progress() / rebuild_progress() recompute everything from scratch.
+
+# The true counters, recomputed from the raw tables. A student has a row for
+# every course they are enrolled in, plus any course they completed lessons in.
+# Rows left behind by old deletions (see purge.sweep_orphans) are skipped, since
+# course_progress may only point at courses and users that exist.
+_TRUE_PROGRESS_SQL = '''
+    WITH pairs AS (
+        SELECT * FROM (
+            SELECT user_id, course_id FROM enrollments -- full scan: recomputing every student
+            UNION
+            SELECT completed_lessons.user_id, lessons.course_id
+            FROM completed_lessons JOIN lessons ON lessons.id = completed_lessons.lesson_id
+        ) AS candidates
+        WHERE EXISTS (SELECT 1 FROM courses WHERE courses.id = candidates.course_id)
+          AND EXISTS (SELECT 1 FROM users WHERE users.id = candidates.user_id)
+    )
+    SELECT pairs.user_id, pairs.course_id,
+           (SELECT COUNT(*) FROM completed_lessons
+            JOIN lessons ON lessons.id = completed_lessons.lesson_id
+            WHERE completed_lessons.user_id = pairs.user_id
+              AND lessons.course_id = pairs.course_id) AS completed_count,
+           (SELECT COUNT(*) FROM lessons WHERE lessons.course_id = pairs.course_id) AS total_lessons
+    FROM pairs
+'''
+
+
+def get_progress(conn, user_id, course_id):
+    """Return (completed_count, total_lessons) for one student in one course."""
+    row = get_progress_row(conn, user_id, course_id)
+    if row is None:
+        return 0, conn.execute('SELECT COUNT(*) FROM lessons WHERE course_id = ?', (course_id,)).fetchone()[0]
+    return row['completed_count'], row['total_lessons']
+
+
+def get_progress_row(conn, user_id, course_id):
+    """The stored course_progress row (or None) - one primary-key lookup."""
+    return conn.execute('SELECT completed_count, total_lessons, updated_at FROM course_progress WHERE user_id = ? AND course_id = ?',
+                        (user_id, course_id)).fetchone()
+
+
+def course_summaries(conn, user_id, course_ids):
+    """The dashboard cards' progress for several enrolled courses at once, in ONE query.
+
+    Returns {course_id: {'completed_count', 'total_lessons', 'percent',
+    'next_lesson_id', 'next_lesson_title', 'last_activity'}}. The next lesson is
+    the first unfinished one by lesson_order (None when all are done), and
+    last_activity is the latest of enrolling, finishing a lesson and trying a quiz.
+    """
+    page = json.dumps(list(course_ids))
+    rows = conn.execute('''
+        WITH course_lessons AS (
+            SELECT lessons.course_id, lessons.id, lessons.title,
+                   completed_lessons.id IS NOT NULL AS done, completed_lessons.created_at AS completed_at,
+                   -- Numbered separately among the finished and the unfinished lessons,
+                   -- so the unfinished lesson numbered 1 is the one to continue with
+                   ROW_NUMBER() OVER (PARTITION BY lessons.course_id, completed_lessons.id IS NULL
+                                      ORDER BY lessons.lesson_order IS NULL, lessons.lesson_order, lessons.id) AS position
+            FROM json_each(?) AS page
+            JOIN lessons ON lessons.course_id = page.value
+            LEFT JOIN completed_lessons ON completed_lessons.user_id = ? AND completed_lessons.lesson_id = lessons.id
+        ),
+        per_course AS (
+            SELECT course_id, COUNT(*) AS total_lessons, SUM(done) AS completed_count,
+                   MAX(completed_at) AS last_completed_at,
+                   MAX(CASE WHEN NOT done AND position = 1 THEN id END) AS next_lesson_id,
+                   MAX(CASE WHEN NOT done AND position = 1 THEN title END) AS next_lesson_title
+            FROM course_lessons
+            GROUP BY course_id
+        )
+        SELECT enrollments.course_id,
+               IFNULL(per_course.completed_count, 0) AS completed_count,
+               IFNULL(per_course.total_lessons, 0) AS total_lessons,
+               per_course.next_lesson_id, per_course.next_lesson_title,
+               MAX(IFNULL(enrollments.created_at, 0), IFNULL(per_course.last_completed_at, 0),
+                   IFNULL((SELECT MAX(quiz_attempts.created_at) FROM lessons
+                           JOIN quiz_attempts ON quiz_attempts.user_id = enrollments.user_id
+                                             AND quiz_attempts.lesson_id = lessons.id
+                           WHERE lessons.course_id = enrollments.course_id), 0)) AS last_activity
+        FROM enrollments
+        LEFT JOIN per_course ON per_course.course_id = enrollments.course_id
+        WHERE enrollments.user_id = ? AND enrollments.course_id IN (SELECT value FROM json_each(?))
+    ''', (page, user_id, user_id, page)).fetchall()
+
+    summaries = {}
+    for row in rows:
+        summary = dict(row)
+        total = summary['total_lessons']
+        summary['percent'] = round(100 * summary['completed_count'] / total) if total else 0
+        summary['last_activity'] = summary['last_activity'] or None
+        summaries[summary.pop('course_id')] = summary
+    return summaries
+
+
+def start_course(conn, user_id, course_id):
+    conn.execute('''
+        INSERT OR IGNORE INTO course_progress (user_id, course_id, completed_count, total_lessons, updated_at)
+        VALUES (?, ?, 0, (SELECT COUNT(*) FROM lessons WHERE course_id = ?), ?)
+    ''', (user_id, course_id, course_id, time.time()))
+
+
+def lesson_completed(conn, user_id, course_id, count=1):
+    # Only call this for completed_lessons rows the insert actually added
+    conn.execute('''
+        INSERT INTO course_progress (user_id, course_id, completed_count, total_lessons, updated_at)
+        VALUES (?, ?, ?, (SELECT COUNT(*) FROM lessons WHERE course_id = ?), ?)
+        ON CONFLICT (user_id, course_id) DO UPDATE SET completed_count = completed_count + excluded.completed_count,
+                                                       updated_at = excluded.updated_at
+    ''', (user_id, course_id, count, course_id, time.time()))
+
+
+class SyncResult:
+    """What complete_lessons() did with each lesson id it was given."""
+
+    def __init__(self):
+        self.completed = []           # newly marked complete
+        self.already_completed = []   # were complete before this batch
+        self.rejected = []            # no such lesson, or not in a course the student is enrolled in
+        self.course_ids = set()       # courses of the completed and already completed lessons
+        self.updated_course_ids = set()   # courses whose counter went up
+
+
+def complete_lessons(conn, user_id, completions):
+    """Mark many lessons complete at once. completions is {lesson_id: completed_at}.
+
+    The lessons are checked against the student's enrollments in one query and
+    inserted with one executemany, all in one transaction. Returns a SyncResult.
+    The caller commits.
+    """
+    result = SyncResult()
+    if not completions:
+        return result
+    if not conn.in_transaction:
+        # IMMEDIATE: a second sync for the same student must not count the same lessons
+        conn.execute('BEGIN IMMEDIATE')
+
+    # One query for the whole batch: the ids go in as a JSON array
+    rows = conn.execute('''
+        SELECT lessons.id, lessons.course_id, completed_lessons.id IS NOT NULL AS done
+        FROM json_each(?) AS wanted
+        JOIN lessons ON lessons.id = wanted.value
+        JOIN enrollments ON enrollments.user_id = ? AND enrollments.course_id = lessons.course_id
+        LEFT JOIN completed_lessons ON completed_lessons.user_id = ? AND completed_lessons.lesson_id = lessons.id
+    ''', (json.dumps(list(completions)), user_id, user_id)).fetchall()
+
+    new_per_course = {}
+    for lesson_id, course_id, done in rows:
+        result.course_ids.add(course_id)
+        if done:
+            result.already_completed.append(lesson_id)
+        else:
+            result.completed.append(lesson_id)
+            new_per_course[course_id] = new_per_course.get(course_id, 0) + 1
+    found = {row[0] for row in rows}
+    result.rejected = [lesson_id for lesson_id in completions if lesson_id not in found]
+
+    # The client's own timestamps, so offline work keeps the time it was really done
+    conn.executemany('INSERT OR IGNORE INTO completed_lessons (user_id, lesson_id, created_at) VALUES (?, ?, ?)',
+                     [(user_id, lesson_id, completions[lesson_id]) for lesson_id in result.completed])
+    for course_id, count in new_per_course.items():
+        lesson_completed(conn, user_id, course_id, count)
+    result.updated_course_ids = set(new_per_course)
+    return result
+
+
+def lesson_added(conn, course_id):
+    conn.execute('UPDATE course_progress SET total_lessons = total_lessons + 1 WHERE course_id = ?', (course_id,))
+
+
+def lesson_deleted(conn, course_id, lesson_id):
+    # Must run while the lesson's completed_lessons rows still exist
+    conn.execute('''
+        UPDATE course_progress SET completed_count = completed_count - 1
+        WHERE course_id = ? AND user_id IN (SELECT user_id FROM completed_lessons WHERE lesson_id = ?)
+    ''', (course_id, lesson_id))
+    conn.execute('UPDATE course_progress SET total_lessons = total_lessons - 1 WHERE course_id = ?', (course_id,))
+
+
+def lessons_uncompleted(conn, course_id, user_ids):
+    # One completion of a lesson in course_id is about to be deleted for each of user_ids
+    conn.execute('''
+        UPDATE course_progress SET completed_count = completed_count - 1
+        WHERE course_id = ? AND user_id IN (SELECT value FROM json_each(?))
+    ''', (course_id, json.dumps(user_ids)))
+
+
+def verify_progress(conn):
+    """Return the rows whose stored counters differ from the real ones.
+
+    Each item is (user_id, course_id, stored, actual) where stored/actual are
+    (completed_count, total_lessons) tuples, or None when the row is missing.
+    """
+    actual = {(row[0], row[1]): (row[2], row[3]) for row in conn.execute(_TRUE_PROGRESS_SQL)}
+    stored = {(row[0], row[1]): (row[2], row[3]) for row in conn.execute(
+        'SELECT user_id, course_id, completed_count, total_lessons FROM course_progress -- full scan: verifying every row')}
+
+    mismatches = []
+    for key in sorted(actual.keys() | stored.keys()):
+        if actual.get(key) != stored.get(key):
+            mismatches.append((key[0], key[1], stored.get(key), actual.get(key)))
+    return mismatches
+
+
+def rebuild_progress(conn):
+    """Recompute every counter from the raw tables. The caller commits."""
+    conn.execute('DELETE FROM course_progress')
+    conn.execute(f'''
+        INSERT INTO course_progress (user_id, course_id, completed_count, total_lessons)
+        {_TRUE_PROGRESS_SQL}
+    ''')
+    return conn.execute('SELECT COUNT(*) FROM course_progress -- full scan: counting the rebuilt rows').fetchone()[0]
@@ -0,0 +1,170 @@
+import json
+import time
+
+from flask import current_app
+
+import progress
+
+# Deleting big things without stalling everyone else.
+# Foreign keys cascade (see migration 13), so "DELETE FROM courses" alone would
+# remove a course and everything under it - but in ONE transaction, holding
+# SQLite's single write lock for as long as 100k completions take to delete.
+# Every other request that writes (enroll, complete a lesson, log in...) would
+# wait behind it.
+#
+# So the bulky child rows go first, PURGE_BATCH_SIZE rows per short
+# transaction with a PURGE_PAUSE_MS breather in between, and the final delete
+# of the course or lesson only has a little left to cascade:
+#   delete_course  -> purge_course()    then DELETE FROM courses
+#   delete_lesson  -> purge_lesson()    then progress.lesson_deleted() + DELETE FROM lessons
+#
+# `flask sweep-orphans` (sweep_orphans()) removes rows left behind by
+# deletions from before the foreign keys cascaded, in the same batched way.
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_PAUSE_MS = 5
+
+# (table, key column to walk in order, [(column, parent table), ...]),
+# parents before children, so a child whose parent was just swept goes too
+ORPHAN_CHECKS = [
+    ('lessons', 'id', [('course_id', 'courses')]),
+    ('quizzes', 'id', [('lesson_id', 'lessons')]),
+    ('enrollments', 'id', [('user_id', 'users'), ('course_id', 'courses')]),
+    ('completed_lessons', 'id', [('user_id', 'users'), ('lesson_id', 'lessons')]),
+    ('quiz_attempts', 'id', [('user_id', 'users'), ('lesson_id', 'lessons')]),
+    ('quiz_attempt_answers', 'attempt_id', [('attempt_id', 'quiz_attempts'), ('quiz_id', 'quizzes')]),
+    ('course_progress', 'user_id', [('user_id', 'users'), ('course_id', 'courses')]),
+    ('api_tokens', 'id', [('user_id', 'users')]),
+    ('analytics_lesson_stats', 'lesson_id', [('lesson_id', 'lessons')]),
+    ('analytics_enrollments_daily', 'course_id', [('course_id', 'courses')]),
+    ('analytics_completion_buckets', 'course_id', [('course_id', 'courses')]),
+    ('course_search', 'rowid', [('rowid', 'courses')]),
+]
+
+
+def init_app(app):
+    app.config.setdefault('PURGE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    app.config.setdefault('PURGE_PAUSE_MS', DEFAULT_PAUSE_MS)
+
+
+def _settings():
+    config = current_app.config
+    return config['PURGE_BATCH_SIZE'], config['PURGE_PAUSE_MS'] / 1000
+
+
+def _delete_in_batches(conn, sql, params, batch_size, pause):
+    """Run a DELETE ... LIMIT ? statement until it deletes nothing, one short transaction each time."""
+    total = 0
+    while True:
+        deleted = conn.execute(sql, params + (batch_size,)).rowcount
+        conn.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+        time.sleep(pause)
+
+
+def purge_course(conn, course_id):
+    """Delete the bulky rows under a course in batches. Returns how many.
+
+    The course itself is left for the caller to delete (which cascades the rest).
+    Commits as it goes.
+    """
+    batch_size, pause = _settings()
+    if conn.in_transaction:
+        conn.commit()
+    total = 0
+    total += _delete_in_batches(conn, '''
+        DELETE FROM completed_lessons WHERE id IN (
+            SELECT completed_lessons.id FROM lessons
+            JOIN completed_lessons ON completed_lessons.lesson_id = lessons.id
+            WHERE lessons.course_id = ? LIMIT ?)
+    ''', (course_id,), batch_size, pause)
+    # Each attempt's answers cascade with it
+    total += _delete_in_batches(conn, '''
+        DELETE FROM quiz_attempts WHERE id IN (
+            SELECT quiz_attempts.id FROM lessons
+            JOIN quiz_attempts ON quiz_attempts.lesson_id = lessons.id
+            WHERE lessons.course_id = ? LIMIT ?)
+    ''', (course_id,), batch_size, pause)
+    total += _delete_in_batches(conn, '''
+        DELETE FROM enrollments WHERE id IN (
+            SELECT id FROM enrollments WHERE course_id = ? LIMIT ?)
+    ''', (course_id,), batch_size, pause)
+    total += _delete_in_batches(conn, '''
+        DELETE FROM course_progress WHERE course_id = ? AND user_id IN (
+            SELECT user_id FROM course_progress WHERE course_id = ? LIMIT ?)
+    ''', (course_id, course_id), batch_size, pause)
+    return total
+
+
+def purge_lesson(conn, course_id, lesson_id):
+    """Delete a lesson's completions and quiz attempts in batches. Returns how many.
+
+    Each batch takes its completions off the students' progress counters in the
+    same transaction, so the counters are right between batches too. The
+    lesson itself is left for the caller. Commits as it goes.
+    """
+    batch_size, pause = _settings()
+    if conn.in_transaction:
+        conn.commit()
+    total = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        user_ids = [row[0] for row in conn.execute(
+            'SELECT user_id FROM completed_lessons WHERE lesson_id = ? LIMIT ?', (lesson_id, batch_size))]
+        if user_ids:
+            progress.lessons_uncompleted(conn, course_id, user_ids)
+            conn.execute('''
+                DELETE FROM completed_lessons
+                WHERE lesson_id = ? AND user_id IN (SELECT value FROM json_each(?))
+            ''', (lesson_id, json.dumps(user_ids)))
+        conn.commit()
+        total += len(user_ids)
+        if len(user_ids) < batch_size:
+            break
+        time.sleep(pause)
+
+    total += _delete_in_batches(conn, '''
+        DELETE FROM quiz_attempts WHERE id IN (
+            SELECT id FROM quiz_attempts WHERE lesson_id = ? LIMIT ?)
+    ''', (lesson_id,), batch_size, pause)
+    return total
+
+
+def sweep_orphans(conn, report=None):
+    """Delete rows whose parent row no longer exists, in batches. Returns {table: rows deleted}.
+
+    report(table, deleted) is called after each batch. Commits as it goes.
+    """
+    batch_size, pause = _settings()
+    if conn.in_transaction:
+        conn.commit()
+    swept = {}
+    for table, key, parents in ORPHAN_CHECKS:
+        orphaned = ' OR '.join(
+            f'({table}.{column} IS NOT NULL AND NOT EXISTS (SELECT 1 FROM {parent} WHERE {parent}.id = {table}.{column}))'
+            for column, parent in parents)
+        swept[table] = 0
+        # Walk the table a window of batch_size keys at a time, so each
+        # transaction reads and deletes a bounded number of rows
+        low = None
+        while True:
+            after = '' if low is None else f'WHERE {key} > ?'
+            params = () if low is None else (low,)
+            high = conn.execute(f'SELECT {key} FROM {table} {after} ORDER BY {key} LIMIT 1 OFFSET ?',
+                                params + (batch_size - 1,)).fetchone()
+            window = f'{key} > ?' if low is not None else '1'
+            if high is not None:
+                window += f' AND {key} <= ?'
+                params += (high[0],)
+            deleted = conn.execute(f'DELETE FROM {table} WHERE {window} AND ({orphaned})', params).rowcount
+            conn.commit()
+            swept[table] += deleted
+            if report:
+                report(table, swept[table])
+            if high is None:
+                break
+            low = high[0]
+            time.sleep(pause)
+    return swept
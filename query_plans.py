@@ -0,0 +1,90 @@
+import ast
+import os
+import re
+import sqlite3
+
+import migrations
+import pagination
+
+# EXPLAIN QUERY PLAN check for every SQL statement the app issues.
+# The statements are pulled straight out of the source files (every string
+# literal passed to .execute() / .executemany()), planned against a freshly
+# migrated empty database, and reported if SQLite would read a whole table.
+# Queries handed to pagination.paginate() are planned as a "next page" query,
+# since that is the form whose cost must not grow with the page number.
+#
+# A statement that genuinely has to touch every row (a rebuild, an export, ...)
+# can opt out by saying so in the SQL itself:  -- full scan: <reason>
+
+QUERY_SOURCES = ['analytics.py', 'api.py', 'app.py', 'certificates.py', 'content_io.py', 'lesson_bodies.py', 'ordering.py', 'pagination.py', 'progress.py', 'purge.py', 'quizzes.py', 'search.py', 'uploads.py', 'versions.py']
+
+# Relative paths are relative to the app's own folder, not to wherever flask was started from
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FULL_SCAN_MARKER = '-- full scan:'
+
+# "SCAN courses" or "SCAN courses USING INDEX ..." (a full index walk is still O(rows)).
+# Virtual tables (FTS) and constant rows are not real table scans.
+_SCAN_RE = re.compile(r'^SCAN (\w+)\b(?! VIRTUAL TABLE)')
+_DML_RE = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b', re.IGNORECASE)
+
+
+def _literal_sql(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str) and _DML_RE.match(node.value):
+        return node.value
+    return None
+
+
+def collect_queries(path):
+    """Yield (line number, sql) for each literal SQL string run by path."""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not node.args:
+            continue
+        name = node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, 'id', None)
+
+        if name in ('execute', 'executemany'):
+            sql = _literal_sql(node.args[0])
+            if sql:
+                yield node.lineno, sql
+
+        elif name == 'paginate' and len(node.args) >= 4:
+            # paginate(conn, sql, params, key_columns, ...)
+            sql = _literal_sql(node.args[1])
+            if sql:
+                key_columns = ast.literal_eval(node.args[3])
+                yield node.lineno, pagination.keyset_sql(sql, key_columns, 'a')
+
+
+def full_scans(conn, sql):
+    """Return the tables that sql would scan from start to finish."""
+    params = (None,) * sql.count('?')
+    plan = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    # A WITH clause's rows are already narrowed down, so scanning them is fine;
+    # only real tables count
+    real_tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    tables = []
+    for row in plan:
+        match = _SCAN_RE.match(row[3])
+        if match and match.group(1) in real_tables:
+            tables.append(row[3])
+    return tables
+
+
+def check_query_plans(paths=QUERY_SOURCES):
+    """Return a list of (path, line, sql, scans) for every unexpected full scan."""
+    conn = sqlite3.connect(':memory:')
+    migrations.migrate(conn)
+
+    problems = []
+    for path in paths:
+        for line, sql in collect_queries(os.path.join(SOURCE_DIR, path)):
+            if FULL_SCAN_MARKER in sql:
+                continue
+            scans = full_scans(conn, sql)
+            if scans:
+                problems.append((path, line, ' '.join(sql.split()), scans))
+    conn.close()
+    return problems
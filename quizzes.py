@@ -0,0 +1,93 @@
+import time
+
+import certificates
+import progress
+
+# Multi-question quizzes.
+# A lesson's quiz is every quizzes row for that lesson (one row per question).
+# The whole quiz is loaded with ONE query, shown on one page, and graded in one
+# POST against an answer key held in memory, so grading costs O(questions) and
+# never goes back to the database per question.
+#
+# Every attempt is stored (quiz_attempts + one quiz_attempt_answers row per
+# question) in a single transaction. If the lesson has a quiz_pass_percent, a
+# passing attempt also marks the lesson complete in that same transaction.
+
+OPTIONS = ('A', 'B', 'C', 'D')
+
+
+class QuizResult:
+    def __init__(self, answers, score, total, pass_percent):
+        self.answers = answers          # [(quiz_id, answer or None, is_correct)]
+        self.score = score
+        self.total = total
+        self.pass_percent = pass_percent
+
+    @property
+    def percent(self):
+        return round(100 * self.score / self.total) if self.total else 0
+
+    @property
+    def passed(self):
+        # No threshold means the quiz is practice only: it never fails, but never completes the lesson either
+        return self.pass_percent is not None and self.percent >= self.pass_percent
+
+
+def field_name(quiz_id):
+    """The form field that holds the answer to one question."""
+    return f'answer_{quiz_id}'
+
+
+def load_questions(conn, lesson_id):
+    """Every question of a lesson's quiz, in the order they were added (one query)."""
+    return conn.execute('''
+        SELECT id, question, option_a, option_b, option_c, option_d, correct_option
+        FROM quizzes WHERE lesson_id = ? ORDER BY id
+    ''', (lesson_id,)).fetchall()
+
+
+def grade(questions, form, pass_percent=None):
+    """Grade every answer in form against the questions' answer key. Returns a QuizResult."""
+    answer_key = {row['id']: row['correct_option'] for row in questions}
+    answers = []
+    score = 0
+    for quiz_id, correct_option in answer_key.items():
+        answer = form.get(field_name(quiz_id))
+        if answer not in OPTIONS:
+            answer = None   # Skipped (or tampered with) counts as wrong
+        is_correct = answer == correct_option
+        score += is_correct
+        answers.append((quiz_id, answer, is_correct))
+    return QuizResult(answers, score, len(answers), pass_percent)
+
+
+def record_attempt(conn, user_id, lesson, result):
+    """Store an attempt and, if it passed, complete the lesson. The caller commits.
+
+    lesson needs id and course_id. Returns the new attempt id.
+    """
+    cursor = conn.execute('''
+        INSERT INTO quiz_attempts (user_id, lesson_id, score, total, passed, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (user_id, lesson['id'], result.score, result.total, int(result.passed), time.time()))
+    attempt_id = cursor.lastrowid
+    conn.executemany('INSERT INTO quiz_attempt_answers (attempt_id, quiz_id, answer, is_correct) VALUES (?, ?, ?, ?)',
+                     [(attempt_id, quiz_id, answer, int(is_correct)) for quiz_id, answer, is_correct in result.answers])
+
+    if result.passed:
+        cursor = conn.execute('INSERT OR IGNORE INTO completed_lessons (user_id, lesson_id, created_at) VALUES (?, ?, ?)',
+                              (user_id, lesson['id'], time.time()))
+        if cursor.rowcount == 1:
+            progress.lesson_completed(conn, user_id, lesson['course_id'])
+            certificates.issue_if_complete(conn, user_id, lesson['course_id'])
+    return attempt_id
+
+
+def best_attempt(conn, user_id, lesson_id):
+    """The student's best score on a lesson's quiz (plus how many tries), or None if never taken."""
+    # With MAX(), SQLite takes the bare columns from the row holding the maximum
+    row = conn.execute('''
+        SELECT MAX(score) AS score, total, passed, COUNT(*) AS attempts
+        FROM quiz_attempts WHERE user_id = ? AND lesson_id = ?
+    ''', (user_id, lesson_id)).fetchone()
+    return row if row['attempts'] else None
@@ -0,0 +1,305 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, jsonify, make_response, request, session
+
+import metrics
+
+# Rate limits for the routes that are expensive or write to the database:
+# logging in and signing up (a deliberately slow password hash each time),
+# enrolling, completing lessons and submitting quizzes (each takes SQLite's
+# write lock), and their /api/v1 twins. One scripted client could otherwise
+# keep every CPU busy hashing or keep the write lock for itself.
+#
+# Each limit is a token bucket: "10/60" means a bucket of 10 requests that
+# refills at 10 per 60 seconds (one every 6 s), so short bursts are fine but
+# the long-run rate is capped. A bucket is two numbers (tokens left, when they
+# were counted) and is forgotten once it has filled up again, so memory only
+# grows with the keys that were active recently.
+#
+# RATE_LIMITS maps an endpoint to its limits per scope:
+#   'ip'       - the client's address (request.remote_addr; behind a proxy,
+#                that is whatever ProxyFix or the server put there)
+#   'account'  - the email being logged in to, the signed-in user, or the API
+#                bearer token. Anonymous requests skip this one.
+# Your RATE_LIMITS are merged over DEFAULT_LIMITS; {} for an endpoint turns its limits off.
+# Only requests that change something are counted (not GET / HEAD).
+#
+# The check runs in before_request, so a rejected request gets its
+# 429 + Retry-After before any form is hashed or any SQL is run.
+#
+# Backends, chosen with the RATE_LIMIT setting:
+#   'memory'  - a dict inside this process (limits are per worker process)
+#   'sqlite'  - a small SQLite file (RATE_LIMIT_PATH) shared by every worker
+#   'none'    - no limits (the benchmark uses this)
+
+DEFAULT_MAX_KEYS = 100_000
+SWEEP_EVERY = 60   # seconds between clean-ups of full buckets in the SQLite backend
+
+DEFAULT_LIMITS = {
+    'main.login':            {'ip': '30/60', 'account': '10/300'},
+    'main.signup':           {'ip': '10/600'},
+    'main.enroll':           {'ip': '120/60', 'account': '30/60'},
+    'main.complete_lesson':  {'ip': '300/60', 'account': '60/60'},
+    'main.take_quiz':        {'ip': '120/60', 'account': '10/60'},
+    'api.create_token':      {'ip': '30/60', 'account': '10/300'},
+    'api.enroll':            {'ip': '120/60', 'account': '30/60'},
+    'api.sync_completions':  {'ip': '120/60', 'account': '30/60'},
+    'api.submit_quiz':       {'ip': '120/60', 'account': '10/60'},
+}
+
+# Where the 'account' scope comes from the submitted email instead of a signed-in user
+EMAIL_ENDPOINTS = {'main.login', 'main.signup', 'api.create_token'}
+
+UNCOUNTED_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+class Limit(namedtuple('Limit', 'count period')):
+    """count requests per period seconds."""
+
+    @property
+    def rate(self):
+        return self.count / self.period   # tokens added back per second
+
+
+def parse_limit(spec):
+    """'10/60' or '10/minute' -> Limit(10, 60)."""
+    count, _, period = str(spec).partition('/')
+    try:
+        count = int(count)
+        period = PERIODS[period] if period in PERIODS else float(period)
+    except ValueError:
+        raise ValueError(f'Bad rate limit {spec!r}: use "<count>/<seconds>", e.g. "10/60"') from None
+    if count < 1 or period <= 0:
+        raise ValueError(f'Bad rate limit {spec!r}: count and period must be positive')
+    return Limit(count, period)
+
+
+def take(tokens, updated_at, now, limit):
+    """Refill a bucket up to now and try to take one token from it.
+
+    tokens=None is a new (full) bucket.
+    Returns (allowed, tokens, retry_after seconds, time the bucket is full again).
+    """
+    if tokens is None:
+        tokens = limit.count
+    else:
+        tokens = min(limit.count, tokens + (now - updated_at) * limit.rate)
+    if tokens >= 1:
+        tokens -= 1
+        return True, tokens, 0, now + (limit.count - tokens) / limit.rate
+    return False, tokens, (1 - tokens) / limit.rate, now + (limit.count - tokens) / limit.rate
+
+
+def take_all(buckets, limits, now):
+    """take() from several buckets, all or nothing.
+
+    buckets is a list of (tokens, updated_at) (None, None for a new one), one per limit.
+    Returns (the new (tokens, full_at) of each bucket, or None if the request
+    is refused; retry_after; position of the first limit that refused it).
+    """
+    results = [take(tokens, updated_at, now, limit) for (tokens, updated_at), limit in zip(buckets, limits)]
+    refused = [position for position, result in enumerate(results) if not result[0]]
+    if refused:
+        # Nothing is taken from the buckets that did have room
+        return None, max(results[position][2] for position in refused), refused[0]
+    return [(tokens, full_at) for _, tokens, _, full_at in results], 0, None
+
+
+class MemoryLimiter:
+    """Buckets in a dict inside this process, at most max_keys of them."""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at, full_at), least recently used first
+        self._lock = threading.Lock()
+
+    def hit(self, checks):
+        """checks: [(key, limit), ...]. Returns (allowed, retry_after, position of the refusing limit)."""
+        now = time.monotonic()
+        with self._lock:
+            buckets = [self._buckets.get(key) for key, _ in checks]
+            taken, retry_after, refused = take_all([bucket[:2] if bucket else (None, None) for bucket in buckets],
+                                                   [limit for _, limit in checks], now)
+            for (key, _), bucket, new in zip(checks, buckets, taken or [None] * len(checks)):
+                self._buckets.pop(key, None)
+                if new is not None:
+                    self._buckets[key] = (new[0], now, new[1])
+                elif bucket is not None:
+                    # Nothing was taken, so keep the old numbers (refilling them again later gives the same answer)
+                    self._buckets[key] = bucket
+            # Forget buckets that have filled up again, oldest first. Every
+            # hit removes at most what earlier hits added, so this stays cheap.
+            while self._buckets:
+                oldest = next(iter(self._buckets.values()))
+                if oldest[2] > now and len(self._buckets) <= self.max_keys:
+                    break
+                self._buckets.popitem(last=False)
+            return taken is not None, retry_after, refused
+
+
+class SQLiteLimiter:
+    """Buckets stored in their own SQLite file, so every worker process shares them."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._next_sweep = 0
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                full_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_buckets_full_at ON buckets (full_at)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit; hit() opens its own short transaction
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')  # Losing a few seconds of counts in a crash is fine
+            self._local.conn = conn
+        return conn
+
+    def hit(self, checks):
+        """checks: [(key, limit), ...]. Returns (allowed, retry_after, position of the refusing limit)."""
+        conn = self._conn()
+        for attempt in range(2):
+            try:
+                return self._hit(conn, checks)
+            except sqlite3.OperationalError as e:
+                # "database is locked": other workers held the file for longer than the timeout.
+                # Try once more, then let the request through rather than fail it with a 500.
+                if attempt:
+                    current_app.logger.warning('Rate limit check skipped: %s', e)
+        return True, 0, None
+
+    def _hit(self, conn, checks):
+        # Wall-clock time, because the buckets are shared between processes
+        now = time.time()
+        # IMMEDIATE: two workers can't both read the last token and both take it
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            buckets = []
+            for key, _ in checks:
+                row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)).fetchone()
+                buckets.append((None, None) if row is None else row)
+            taken, retry_after, refused = take_all(buckets, [limit for _, limit in checks], now)
+            if taken is not None:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)',
+                    [(key, tokens, now, full_at) for (key, _), (tokens, full_at) in zip(checks, taken)])
+            if now >= self._next_sweep:
+                conn.execute('DELETE FROM buckets WHERE full_at <= ?', (now,))
+                self._next_sweep = now + SWEEP_EVERY
+            conn.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        return taken is not None, retry_after, refused
+
+
+class NullLimiter:
+    def hit(self, checks):
+        return True, 0, None
+
+
+_limiter_lock = threading.Lock()
+
+
+def init_app(app):
+    app.config.setdefault('RATE_LIMIT', 'memory')
+    app.config.setdefault('RATE_LIMIT_PATH', 'rate_limit.db')
+    app.config.setdefault('RATE_LIMIT_MAX_KEYS', DEFAULT_MAX_KEYS)
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(app.config.get('RATE_LIMITS') or {})
+    app.config['RATE_LIMITS'] = limits
+    # Parsed once here, so a typo in a limit stops the app from starting
+    app.extensions['rate_limits'] = {
+        endpoint: [(scope, parse_limit(spec)) for scope, spec in scopes.items()]
+        for endpoint, scopes in limits.items()
+    }
+    if app.config['RATE_LIMIT'] != 'none':
+        app.before_request(_check_limits)
+
+
+def get_limiter():
+    limiter = current_app.extensions.get('rate_limiter')
+    if limiter is None:
+        with _limiter_lock:
+            limiter = current_app.extensions.get('rate_limiter')
+            if limiter is None:
+                config = current_app.config
+                backend = config['RATE_LIMIT']
+                if backend == 'memory':
+                    limiter = MemoryLimiter(config['RATE_LIMIT_MAX_KEYS'])
+                elif backend == 'sqlite':
+                    limiter = SQLiteLimiter(config['RATE_LIMIT_PATH'])
+                elif backend == 'none':
+                    limiter = NullLimiter()
+                else:
+                    raise ValueError(f'Unknown RATE_LIMIT backend: {backend!r}')
+                current_app.extensions['rate_limiter'] = limiter
+    return limiter
+
+
+def _account():
+    """Who this request acts as, without touching the database. None if nobody."""
+    if request.endpoint in EMAIL_ENDPOINTS:
+        data = request.get_json(silent=True) if request.is_json else None
+        email = (data or request.form).get('email')
+        return f'email:{email.strip().lower()}' if isinstance(email, str) and email.strip() else None
+    if request.blueprint == 'api':
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and token.strip():
+            # Only a hash of the token is kept, even in memory
+            return 'token:' + hashlib.sha256(token.strip().encode()).hexdigest()[:32]
+        return None
+    user_id = session.get('user_id')
+    return None if user_id is None else f'user:{user_id}'
+
+
+def _check_limits():
+    if request.method in UNCOUNTED_METHODS:
+        return None
+    limits = current_app.extensions['rate_limits'].get(request.endpoint)
+    if not limits:
+        return None
+
+    # Every scope is checked before any token is taken, so a request refused
+    # by its account limit doesn't also use up the client's IP allowance
+    scopes, checks = [], []
+    for scope, limit in limits:
+        who = request.remote_addr if scope == 'ip' else _account()
+        if who is not None:
+            scopes.append(scope)
+            checks.append((f'{request.endpoint}|{scope}|{who}', limit))
+    if not checks:
+        return None
+    allowed, retry_after, refused = get_limiter().hit(checks)
+    if not allowed:
+        metrics.count_rate_limited(request.endpoint, scopes[refused])
+        return _too_many_requests(retry_after)
+    return None
+
+
+def _too_many_requests(retry_after):
+    seconds = max(1, int(retry_after + 0.999))   # Retry-After is whole seconds; round up
+    if request.blueprint == 'api':
+        response = jsonify({'error': 'Too many requests, slow down.', 'retry_after': seconds})
+        response.status_code = 429
+    else:
+        response = make_response(f'Too many attempts, please try again in {seconds} seconds.', 429)
+    response.headers['Retry-After'] = str(seconds)
+    return response
@@ -0,0 +1,80 @@
+import re
+
+import lesson_bodies
+import pagination
+
+# Full-text search over the course catalogue, backed by SQLite FTS5.
+# The course_search table itself is created by migrations.py.
+# Each row of course_search mirrors one course (rowid = courses.id) and holds
+# its title, description and the titles + content of all of its lessons.
+# The routes in app.py call index_course() / remove_course() whenever a course
+# or one of its lessons changes, so the index never needs a full rebuild
+# during normal use.
+
+# Column weights for bm25(): a hit in the title counts more than one in the
+# description, which counts more than one buried in a lesson.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 5.0
+LESSONS_WEIGHT = 1.0
+
+
+def _lessons_text(conn, course_id):
+    # Lesson bodies may be compressed (see lesson_bodies.py), so they are joined here, not in SQL
+    rows = conn.execute('SELECT title, content FROM lessons WHERE course_id = ? ORDER BY lesson_order IS NULL, lesson_order, id',
+                        (course_id,)).fetchall()
+    if not rows:
+        return None
+    return ' '.join(f"{title} {lesson_bodies.unpack(content) or ''}" for title, content in rows)
+
+
+def index_course(conn, course_id):
+    """(Re)index a single course. The caller commits."""
+    conn.execute('DELETE FROM course_search WHERE rowid = ?', (course_id,))
+    course = conn.execute('SELECT id, title, description FROM courses WHERE id = ?', (course_id,)).fetchone()
+    if course is not None:
+        conn.execute('INSERT INTO course_search (rowid, title, description, lessons) VALUES (?, ?, ?, ?)',
+                     (course[0], course[1], course[2], _lessons_text(conn, course_id)))
+
+
+def remove_course(conn, course_id):
+    """Drop a deleted course from the index. The caller commits."""
+    conn.execute('DELETE FROM course_search WHERE rowid = ?', (course_id,))
+
+
+def rebuild_search_index(conn):
+    """Throw away the whole index and rebuild it from the courses table."""
+    conn.execute('DELETE FROM course_search')
+    course_ids = [row[0] for row in conn.execute('SELECT id FROM courses -- full scan: rebuilding touches every course')]
+    for course_id in course_ids:
+        index_course(conn, course_id)
+    return conn.execute('SELECT COUNT(*) FROM course_search').fetchone()[0]
+
+
+def build_match_query(search_query):
+    """Turn what the user typed into a safe FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term ("pyth"*), and the terms are
+    implicitly AND-ed, so "intro pyth" finds "Introduction to Python".
+    Quoting means characters like - or : can never be parsed as FTS syntax.
+    """
+    words = re.findall(r'\w+', search_query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_courses(conn, search_query, cursor=None, page_size=pagination.DEFAULT_PAGE_SIZE, columns='courses.*'):
+    """Return one pagination.Page of the courses matching search_query, best match first.
+
+    columns picks what to select from courses (it must include courses.id).
+    """
+    match = build_match_query(search_query)
+    if not match:
+        return pagination.Page([])
+
+    # bm25 scores are negative, lower = better; the id breaks ties so pages are stable
+    return pagination.paginate(conn, f'''
+        SELECT {columns}, bm25(course_search, ?, ?, ?) AS score
+        FROM course_search
+        JOIN courses ON courses.id = course_search.rowid
+        WHERE course_search MATCH ?
+    ''', (TITLE_WEIGHT, DESCRIPTION_WEIGHT, LESSONS_WEIGHT, match), ('score', 'id'),
+        cursor=cursor, page_size=page_size)
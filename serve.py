@@ -0,0 +1,213 @@
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+import db
+import migrations
+import settings
+from app import create_app
+
+# Production entry point: N worker processes x M threads, on werkzeug's server.
+#
+#   SECRET_KEY=... python serve.py --workers 4 --threads 8 --port 8000
+#
+# The parent process binds the port, applies any pending migrations once, and
+# then forks the workers. Every worker builds its own app, so each process gets
+# its own database pool (SQLite connections must never cross a fork), and all
+# of them accept() from the same listening socket.
+#
+# SIGTERM / SIGINT shut down gracefully. /readyz starts answering 503 at once
+# (so a load balancer stops sending traffic), and after --drain seconds the
+# workers stop accepting, finish their in-flight requests and exit. Anything
+# still running after --graceful-timeout is killed. A worker that dies on its
+# own is replaced.
+#
+# Settings come from the environment (see settings.py); WEB_WORKERS,
+# WEB_THREADS, HOST and PORT give the defaults for the options below.
+
+
+class _RequestHandler(WSGIRequestHandler):
+    # One request per connection: an idle keep-alive client would otherwise
+    # hold one of the worker's few threads
+    protocol_version = 'HTTP/1.0'
+    timeout = 30   # seconds a slow client may take to send its request
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """werkzeug's WSGI server, handling requests on a fixed pool of threads."""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None):
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix='http')
+        self._free = threading.BoundedSemaphore(threads)
+        super().__init__(host, port, app, handler=_RequestHandler, fd=fd)
+
+    def process_request(self, request, client_address):
+        # Wait for a free thread before going back to accept(), so a busy
+        # worker leaves new connections in the shared queue for the others
+        self._free.acquire()
+        self._executor.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._free.release()
+
+    def close(self):
+        # Let the requests already being handled finish, then close the socket
+        self._executor.shutdown(wait=True)
+        self.server_close()
+
+
+def _log(message):
+    print(f'[{os.getpid()}] {message}', file=sys.stderr, flush=True)
+
+
+def run_worker(sock, threads, drain):
+    """Serve requests from sock until SIGTERM / SIGINT."""
+    app = create_app()
+    with app.app_context():
+        db.get_pool()   # This process's own connections
+
+    host, port = sock.getsockname()[:2]
+    server = PooledWSGIServer(host, port, app, threads, fd=sock.fileno())
+
+    def stop(signum, frame):
+        if app.extensions.get('draining'):
+            return
+        app.extensions['draining'] = True
+
+        def drain_then_stop():
+            time.sleep(drain)
+            server.shutdown()
+        threading.Thread(target=drain_then_stop, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    _log(f'worker serving with {threads} threads')
+    server.serve_forever()
+    server.close()
+
+    # Close the things create_app() opened lazily
+    if 'db_pool' in app.extensions:
+        app.extensions['db_pool'].close_all()
+    if 'hashing_pool' in app.extensions:
+        app.extensions['hashing_pool'].shutdown()
+    _log('worker stopped')
+
+
+def supervise(sock, workers, threads, drain, graceful_timeout):
+    """Fork the workers, replace any that die, and stop them all on SIGTERM / SIGINT."""
+    children = set()
+    stopping = threading.Event()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(sock, threads, drain)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def kill_stragglers():
+        for pid in list(children):
+            _log(f'worker {pid} did not stop in {graceful_timeout}s, killing it')
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def stop(signum, frame):
+        if stopping.is_set():
+            return
+        stopping.set()
+        _log('shutting down')
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        timer = threading.Timer(drain + graceful_timeout, kill_stragglers)
+        timer.daemon = True
+        timer.start()
+
+    for _ in range(workers):
+        spawn()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping.is_set():
+            _log(f'worker {pid} exited unexpectedly (status {status}), starting a new one')
+            time.sleep(1)   # Don't spin if workers crash straight away
+            spawn()
+    _log('all workers stopped')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run EduLearn Pro with several worker processes and threads.')
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', 2)),
+                        help='worker processes (default 2)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 8)),
+                        help='request threads per worker (default 8)')
+    parser.add_argument('--drain', type=float, default=0,
+                        help='seconds to keep serving (with /readyz failing) after a shutdown signal')
+    parser.add_argument('--graceful-timeout', type=float, default=30,
+                        help='seconds to wait for in-flight requests before killing a worker')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    if app.config['SECRET_KEY'] == settings.DEVELOPMENT_SECRET_KEY:
+        raise SystemExit('Set the SECRET_KEY environment variable before serving in production.')
+    if args.threads > app.config['DB_POOL_SIZE']:
+        _log(f'note: {args.threads} threads share {app.config["DB_POOL_SIZE"]} database connections '
+             f'(raise DB_POOL_SIZE to match)')
+
+    # Migrate once here, so the workers don't all queue up to do it
+    conn = db.connect(app.config['DATABASE'])
+    for version, name in migrations.migrate(conn):
+        _log(f'applied migration {version:03d}: {name}')
+    conn.close()
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.set_inheritable(True)
+    _log(f'listening on http://{args.host}:{args.port} with {args.workers} worker(s) x {args.threads} thread(s)')
+
+    try:
+        if args.workers <= 1 or not hasattr(os, 'fork'):
+            # One process (and the only option on Windows)
+            run_worker(sock, args.threads, args.drain)
+        else:
+            supervise(sock, args.workers, args.threads, args.drain, args.graceful_timeout)
+    finally:
+        sock.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import json
+import os
+
+# Settings read from environment variables, for create_app() in app.py.
+# Only the variables that are actually set are returned; everything else keeps
+# the default from the module that owns the setting (db.init_app(),
+# fragment_cache.init_app(), ...), so each default lives in one place.
+#
+# Example:
+#   DATABASE=/srv/edulearn/database.db SECRET_KEY=... DB_POOL_SIZE=16 python serve.py
+
+# Used only when SECRET_KEY is not set. serve.py refuses to start with it.
+DEVELOPMENT_SECRET_KEY = 'super_secret_key'
+
+
+def _flag(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _json(value):
+    return json.loads(value)
+
+
+# name -> how to turn the environment string into the config value
+SETTINGS = {
+    'SECRET_KEY': str,
+    'DATABASE': str,
+    'DB_POOL_SIZE': int,
+    'DB_POOL_TIMEOUT': float,
+    'DB_BUSY_TIMEOUT_MS': int,
+    'DB_CACHE_SIZE_KB': int,
+    'BACKUP_DIR': str,
+    'BACKUP_PAGES_PER_STEP': int,
+    'BACKUP_SLEEP_MS': int,
+    'BACKUP_KEEP': int,
+    'BACKUP_MAX_RESTARTS': int,
+    'REPORTING_REPLICA': str,
+    'PURGE_BATCH_SIZE': int,
+    'PURGE_PAUSE_MS': int,
+    'AUTO_MIGRATE': _flag,
+    'PAGE_SIZE': int,
+    'UPLOAD_FOLDER': str,
+    'MAX_UPLOAD_BYTES': int,
+    'FRAGMENT_CACHE': str,
+    'FRAGMENT_CACHE_BYTES': int,
+    'FRAGMENT_CACHE_PATH': str,
+    'RATE_LIMIT': str,
+    'RATE_LIMIT_PATH': str,
+    'RATE_LIMIT_MAX_KEYS': int,
+    'RATE_LIMITS': _json,   # e.g. {"main.login": {"ip": "30/60", "account": "10/300"}}
+    'PASSWORD_HASH_METHOD': str,
+    'PASSWORD_HASH_WORKERS': int,
+    'PASSWORD_HASH_QUEUE': int,
+    'PASSWORD_HASH_TIMEOUT': float,
+    'METRICS': _flag,
+    'METRICS_SAMPLE_RATE': float,
+    'METRICS_SLOW_QUERY_MS': float,
+    'METRICS_N_PLUS_ONE': int,
+    'API_TOKEN_TTL': int,
+    'API_MAX_PAGE_SIZE': int,
+    'API_MAX_SYNC_LESSONS': int,
+    'COMPRESS': _flag,
+    'COMPRESS_MIN_BYTES': int,
+    'COMPRESS_LEVEL': int,
+    'STATIC_MANIFEST': str,
+}
+
+
+def from_env(environ=None):
+    """Return the settings found in environ (default: os.environ) as a dict."""
+    environ = os.environ if environ is None else environ
+    config = {}
+    for name, parse in SETTINGS.items():
+        value = environ.get(name)
+        if value not in (None, ''):
+            try:
+                config[name] = parse(value)
+            except ValueError:
+                raise ValueError(f'{name}={value!r} is not a valid {parse.__name__}') from None
+    return config
@@ -0,0 +1,91 @@
+// Course page: fill in the progress bar, load each lesson's text the first
+// time it is opened instead of with the whole page, let the instructor drag
+// lessons into a new order, and open the lesson named in the URL.
+document.addEventListener("DOMContentLoaded", function() {
+    var pBar = document.getElementById("studentProgressBar");
+    if(pBar) {
+        pBar.style.width = pBar.getAttribute("data-width");
+    }
+
+    // Load a lesson's text the first time it is opened, instead of with the whole page
+    document.querySelectorAll(".lesson-body[data-src]").forEach(function(body) {
+        body.closest(".accordion-collapse").addEventListener("show.bs.collapse", function() {
+            if (body.dataset.loaded) {
+                return;
+            }
+            body.dataset.loaded = "yes";
+            fetch(body.dataset.src)
+                .then(function(response) {
+                    if (!response.ok) { throw new Error(response.status); }
+                    return response.text();
+                })
+                .then(function(html) { body.innerHTML = html; })
+                .catch(function() {
+                    delete body.dataset.loaded;   // try again next time it is opened
+                    body.innerHTML = '<p class="text-danger">Could not load this lesson. Please try again.</p>';
+                });
+        });
+    });
+
+    // Instructors: drag a lesson to a new place. Only the lesson that moved is
+    // sent, with the lesson it now follows (see the /lesson/<id>/move route)
+    var list = document.getElementById("lessonsAccordion");
+    if (list && list.dataset.reorder) {
+        var dragged = null;
+        var startedAfter = null;
+        var items = function() { return list.querySelectorAll(".accordion-item[data-lesson-id]"); };
+        var previousLesson = function(item) {
+            var previous = item.previousElementSibling;
+            while (previous && !previous.dataset.lessonId) { previous = previous.previousElementSibling; }
+            return previous;
+        };
+
+        items().forEach(function(item) {
+            item.addEventListener("dragstart", function(event) {
+                dragged = item;
+                startedAfter = previousLesson(item);
+                event.dataTransfer.effectAllowed = "move";
+                item.classList.add("opacity-50");
+            });
+            item.addEventListener("dragover", function(event) {
+                event.preventDefault();
+                if (!dragged || item === dragged) { return; }
+                var box = item.getBoundingClientRect();
+                var below = event.clientY > box.top + box.height / 2;
+                list.insertBefore(dragged, below ? item.nextSibling : item);
+            });
+            item.addEventListener("dragend", function() {
+                var moved = dragged;
+                dragged = null;
+                moved.classList.remove("opacity-50");
+                var after = previousLesson(moved);
+                if (after === startedAfter) { return; }
+
+                items().forEach(function(lesson, index) {
+                    lesson.querySelector(".lesson-number").textContent = index + 1;
+                });
+                var form = new FormData();
+                if (after) { form.append("after_id", after.dataset.lessonId); }
+                fetch(moved.dataset.moveUrl, {method: "POST", body: form})
+                    .then(function(response) {
+                        if (!response.ok) { throw new Error(response.status); }
+                    })
+                    .catch(function() {
+                        alert("Could not save the new order. The page will reload.");
+                        location.reload();
+                    });
+            });
+        });
+        list.addEventListener("dragover", function(event) { event.preventDefault(); });
+    }
+
+    // "Continue" links from the dashboard end in #lesson-<id>: open that lesson
+    if (location.hash.indexOf("#lesson-") === 0) {
+        var item = document.getElementById(location.hash.slice(1));
+        var panel = item && item.querySelector(".accordion-collapse");
+        if (panel) {
+            bootstrap.Collapse.getOrCreateInstance(panel).show();
+            item.scrollIntoView();
+        }
+    }
+});
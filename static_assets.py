@@ -0,0 +1,132 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from flask import current_app, request, send_from_directory
+
+import compression
+
+# Fingerprinted static files.
+# The manifest maps every file under static/ to a name with a hash of its
+# content in it:  js/course_details.js -> js/course_details.3f9a2c1b7e04.js
+# url_for('static', filename='js/course_details.js') then links to the hashed
+# name, which is served with "Cache-Control: public, max-age=1 year, immutable".
+# Browsers never have to revalidate it; changing the file changes its URL.
+#
+# The manifest is read from STATIC_MANIFEST (static/manifest.json, written by
+# `flask build-static-manifest` during a deploy) if that file exists, and is
+# otherwise built from the files - once, on the first url_for('static', ...)
+# or static request, not while the app is created. Files not in the manifest
+# are still served normally, just without the long cache lifetime.
+# User uploads (static/uploads) change at runtime and are never fingerprinted.
+
+ONE_YEAR = 365 * 24 * 3600
+HASH_LENGTH = 12
+MANIFEST_NAME = 'manifest.json'
+SKIP_DIRS = {'uploads'}
+
+_gzip_lock = threading.Lock()
+_assets_lock = threading.Lock()
+
+
+def fingerprint(path, digest):
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{digest[:HASH_LENGTH]}{ext}'
+
+
+def build_manifest(static_folder):
+    """{real path: fingerprinted path} for every file under static_folder (paths use '/')."""
+    manifest = {}
+    for root, dirs, files in os.walk(static_folder):
+        rel_root = os.path.relpath(root, static_folder)
+        if rel_root == '.':
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        else:
+            dirs.sort()
+        for name in sorted(files):
+            path = name if rel_root == '.' else f"{rel_root.replace(os.sep, '/')}/{name}"
+            if path == MANIFEST_NAME:
+                continue
+            with open(os.path.join(root, name), 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            manifest[path] = fingerprint(path, digest)
+    return manifest
+
+
+def write_manifest(static_folder, path=None):
+    manifest = build_manifest(static_folder)
+    with open(path or os.path.join(static_folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return manifest
+
+
+class StaticAssets:
+    def __init__(self, static_folder, manifest):
+        self.static_folder = static_folder
+        self.manifest = manifest                                    # real -> hashed
+        self.originals = {hashed: real for real, hashed in manifest.items()}
+        self._gzipped = {}                                          # hashed -> gzip bytes
+
+
+def init_app(app):
+    app.config.setdefault('STATIC_MANIFEST', os.path.join(app.static_folder, MANIFEST_NAME))
+
+    # url_for('static', ...) picks up the hashed name, and the static route serves it
+    app.url_defaults(_hashed_url)
+    app.view_functions['static'] = send_static
+
+
+def get_assets():
+    assets = current_app.extensions.get('static_assets')
+    if assets is None:
+        with _assets_lock:
+            assets = current_app.extensions.get('static_assets')
+            if assets is None:
+                path = current_app.config['STATIC_MANIFEST']
+                if os.path.exists(path):
+                    with open(path) as f:
+                        manifest = json.load(f)
+                else:
+                    manifest = build_manifest(current_app.static_folder)
+                assets = StaticAssets(current_app.static_folder, manifest)
+                current_app.extensions['static_assets'] = assets
+    return assets
+
+
+def _hashed_url(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        assets = get_assets()
+        values['filename'] = assets.manifest.get(values['filename'], values['filename'])
+
+
+def send_static(filename):
+    assets = get_assets()
+    real = assets.originals.get(filename)
+    if real is None:
+        # An old hash or an unlisted file: serve it the ordinary way
+        return current_app.send_static_file(filename)
+
+    response = send_from_directory(assets.static_folder, real, max_age=ONE_YEAR, etag=False)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.set_etag(filename)
+    response.vary.add('Accept-Encoding')
+
+    # Immutable, so each file is compressed once and then kept
+    compressible = current_app.config['COMPRESS'] and response.mimetype in compression.COMPRESSIBLE_TYPES
+    if compressible and compression.accepts_gzip():
+        body = assets._gzipped.get(filename)
+        if body is None:
+            with open(os.path.join(assets.static_folder, real), 'rb') as f:
+                body = gzip.compress(f.read(), current_app.config['COMPRESS_LEVEL'])
+            with _gzip_lock:
+                assets._gzipped[filename] = body
+        response.close()
+        response.direct_passthrough = False
+        response.set_data(body)
+        response.headers['Content-Encoding'] = 'gzip'
+        compression.weaken_etag(response)
+    return response.make_conditional(request)
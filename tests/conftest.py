@@ -0,0 +1,35 @@
+import os
+import sys
+from io import BytesIO
+
+import pytest
+
+# The app's modules live at the top of the repo, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A fresh database per test (created by the migrations on first use),
+    # cheap password hashes, and no rate limits getting in the way
+    return create_app({
+        'DATABASE': str(tmp_path / 'test.db'),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'RATE_LIMIT': 'none',
+        'FRAGMENT_CACHE': 'none',
+    })
+
+
+def sign_up(client, email, role):
+    client.post('/signup', data={'name': email.split('@')[0], 'email': email, 'password': 'pw',
+                                 'confirm_password': 'pw', 'role': role})
+    client.post('/login', data={'email': email, 'password': 'pw'})
+
+
+def create_course(client, title):
+    client.post('/create_course', data={'title': title, 'description': 'About ' + title,
+                                        'thumbnail': (BytesIO(b''), '')},
+                content_type='multipart/form-data')
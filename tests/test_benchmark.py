@@ -0,0 +1,37 @@
+import random
+import urllib.parse
+
+from app import create_app
+from benchmark import datagen, driver
+
+
+def _bench_app(tmp_path):
+    path = str(tmp_path / 'bench.db')
+    scale = datagen.Scale(students=10, instructors=2, courses=8, lessons_per_course=4, enrollments_per_student=2,
+                          completions=20, quiz_every=2, questions_per_quiz=2)
+    datagen.generate(path, scale, seed=1, password_method='pbkdf2:sha256:1000', log=lambda *args: None)
+    app = create_app({'DATABASE': path, 'RATE_LIMIT': 'none', 'PAGE_SIZE': 50,
+                      'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'})
+    return app, path
+
+
+def test_search_requests_use_the_parameter_the_app_reads(tmp_path):
+    app, path = _bench_app(tmp_path)
+    student = driver.load_students(path, 1, seed=1)[0]
+    [(method, search_path, _)] = driver._requests_for('courses_search', student, random.Random(1), None)
+    parameter = next(iter(urllib.parse.parse_qs(urllib.parse.urlsplit(search_path).query)))
+
+    client = app.test_client()
+    everything = client.get('/courses').get_data(as_text=True).count('card-title')
+    nothing = client.get('/courses?' + urllib.parse.urlencode({parameter: 'zzzznomatch'})).get_data(as_text=True)
+    assert method == 'GET' and everything > 0
+    assert nothing.count('card-title') == 0   # the app really filtered on that parameter
+
+
+def test_driver_runs_the_whole_mix_without_errors(tmp_path):
+    app, path = _bench_app(tmp_path)
+    students = driver.load_students(path, 2, seed=1)
+    report = driver.run(driver.TestClientTransport(app), students, clients=2, requests=60, warmup=5, seed=1)
+    assert report['total']['requests'] >= 60
+    assert report['total']['errors'] == 0
+    assert set(report['total']['statuses']) <= {'200', '302', '304'}
@@ -0,0 +1,52 @@
+from conftest import create_course, sign_up
+
+
+def test_rebuild_search_index(app):
+    instructor = app.test_client()
+    sign_up(instructor, 'teacher@example.com', 'instructor')
+    create_course(instructor, 'Python Basics')
+    create_course(instructor, 'Cooking')
+
+    result = app.test_cli_runner().invoke(args=['rebuild-search-index'])
+    assert result.exception is None, result.output
+    assert 'search index rebuilt for 2 courses' in result.output
+    page = instructor.get('/courses?search=python').get_data(as_text=True)
+    assert 'Python Basics' in page and 'Cooking' not in page
+
+
+def test_check_query_plans_from_another_folder(app, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = app.test_cli_runner().invoke(args=['check-query-plans'])
+    assert result.exit_code == 0, result.output
+    assert 'every query uses an index' in result.output
+
+
+def _run(app, *args):
+    result = app.test_cli_runner().invoke(args=list(args))
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_maintenance_commands(app, tmp_path):
+    student = app.test_client()
+    instructor = app.test_client()
+    sign_up(instructor, 'teacher@example.com', 'instructor')
+    create_course(instructor, 'Course')
+    instructor.post('/course/1/add_lesson', data={'title': 'Lesson 1', 'content': 'Text', 'video_url': ''})
+    sign_up(student, 'student@example.com', 'student')
+    student.post('/enroll/1')
+    student.post('/complete_lesson/1')
+
+    assert 'schema at version' in _run(app, 'migrate')
+    assert 'SUCCESS' in _run(app, 'verify-progress', '--rebuild')
+    assert 'swept 0 orphaned' in _run(app, 'sweep-orphans')
+    assert 'Analytics refreshed' in _run(app, 'refresh-analytics')
+    assert 'SUCCESS' in _run(app, 'issue-certificates')
+
+    app.config['BACKUP_DIR'] = str(tmp_path / 'backups')
+    assert 'written and verified' in _run(app, 'backup')
+    assert 'passed the integrity check' in _run(app, 'verify-backup')
+
+    app.config['STATIC_MANIFEST'] = str(tmp_path / 'manifest.json')
+    assert 'SUCCESS' in _run(app, 'build-static-manifest')
+    assert (tmp_path / 'manifest.json').exists()
@@ -0,0 +1,54 @@
+from conftest import create_course, sign_up
+
+FAR_FUTURE = 'Fri, 01 Jan 2100 00:00:00 GMT'
+
+
+def _course_with_two_students(app):
+    instructor = app.test_client()
+    sign_up(instructor, 'teacher@example.com', 'instructor')
+    create_course(instructor, 'Course')
+    instructor.post('/course/1/add_lesson', data={'title': 'Lesson 1', 'content': 'Text', 'video_url': ''})
+
+    first, second = app.test_client(), app.test_client()
+    for client, email in ((first, 'first@example.com'), (second, 'second@example.com')):
+        sign_up(client, email, 'student')
+        client.post('/enroll/1')
+        client.get('/dashboard')   # show the flash message, so the next page can carry validators
+    first.post('/complete_lesson/1')
+    first.get('/dashboard')
+    return instructor, first, second
+
+
+def test_etag_is_per_viewer(app):
+    _, first, second = _course_with_two_students(app)
+    response = first.get('/course/1')
+    etag = response.headers['ETag']
+    assert response.status_code == 200 and etag
+
+    assert first.get('/course/1', headers={'If-None-Match': etag}).status_code == 304
+    # Someone else's copy must not be confirmed as theirs
+    assert second.get('/course/1', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_if_modified_since_ignored_for_signed_in_viewers(app):
+    _, first, second = _course_with_two_students(app)
+    response = first.get('/course/1')
+    assert 'Last-Modified' not in response.headers
+    assert second.get('/course/1', headers={'If-Modified-Since': FAR_FUTURE}).status_code == 200
+
+
+def test_if_modified_since_for_anonymous_visitors(app):
+    _course_with_two_students(app)
+    visitor = app.test_client()
+    response = visitor.get('/course/1')
+    assert response.status_code == 200 and 'Last-Modified' in response.headers
+    assert visitor.get('/course/1', headers={'If-Modified-Since': FAR_FUTURE}).status_code == 304
+    assert visitor.get('/course/1', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_new_lesson_changes_etag(app):
+    instructor, first, _ = _course_with_two_students(app)
+    etag = first.get('/course/1').headers['ETag']
+    instructor.post('/course/1/add_lesson', data={'title': 'Lesson 2', 'content': 'Text', 'video_url': ''})
+    response = first.get('/course/1', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and 'Lesson 2' in response.get_data(as_text=True)
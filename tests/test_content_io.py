@@ -0,0 +1,60 @@
+import json
+
+from conftest import create_course, sign_up
+from db import get_db_connection
+
+RECORDS = [
+    {'type': 'course', 'external_id': 'py', 'title': 'Python', 'description': 'Basics',
+     'instructor_email': 'teacher@example.com'},
+    {'type': 'lesson', 'external_id': 'py-1', 'course': 'py', 'title': 'Variables', 'content': 'x = 1'},
+    {'type': 'lesson', 'external_id': 'py-2', 'course': 'py', 'title': 'Loops', 'content': 'for ...'},
+    {'type': 'quiz', 'external_id': 'py-1-q', 'lesson': 'py-1', 'question': '1 + 1?', 'option_a': '1',
+     'option_b': '2', 'option_c': '3', 'option_d': '4', 'correct_option': 'B'},
+]
+
+
+def _write(path, records):
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records), encoding='utf-8')
+    return str(path)
+
+
+def _counts(app):
+    with app.app_context():
+        conn = get_db_connection()
+        return tuple(conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                     for table in ('courses', 'lessons', 'quizzes'))
+
+
+def _run(app, *args):
+    result = app.test_cli_runner().invoke(args=list(args))
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def test_export_from_replica_reimports_in_place(app, tmp_path):
+    instructor = app.test_client()
+    sign_up(instructor, 'teacher@example.com', 'instructor')
+    # One course made through the web form, without an external id yet
+    create_course(instructor, 'Cooking')
+    instructor.post('/course/1/add_lesson', data={'title': 'Knives', 'content': 'Sharp', 'video_url': ''})
+    _run(app, 'content', 'import', _write(tmp_path / 'in.jsonl', RECORDS))
+    assert _counts(app) == (2, 3, 1)
+
+    # Export from a read-only snapshot: the ids are written on the primary
+    _run(app, 'backup')
+    app.config['REPORTING_REPLICA'] = 'latest'
+    exported = tmp_path / 'out.jsonl'
+    _run(app, 'content', 'export', str(exported))
+    records = [json.loads(line) for line in exported.read_text(encoding='utf-8').splitlines()]
+    assert len(records) == 6
+    assert {'course-1', 'lesson-1', 'py', 'py-1', 'py-2', 'py-1-q'} == {r['external_id'] for r in records}
+    with app.app_context():
+        assert get_db_connection().execute('SELECT external_id FROM courses WHERE id = 1').fetchone()[0] == 'course-1'
+
+    # Importing the export again changes nothing
+    _run(app, 'content', 'import', str(exported))
+    assert _counts(app) == (2, 3, 1)
+    again = tmp_path / 'again.jsonl'
+    app.config['REPORTING_REPLICA'] = ''
+    _run(app, 'content', 'export', str(again))
+    assert again.read_text(encoding='utf-8') == exported.read_text(encoding='utf-8')
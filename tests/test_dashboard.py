@@ -0,0 +1,51 @@
+import metrics
+from conftest import create_course, sign_up
+
+
+def _dashboard_statements(client, monkeypatch):
+    """How many SQL statements one GET /dashboard runs."""
+    counted = []
+    record = metrics._record_statement
+
+    def counting(sql, seconds):
+        if getattr(metrics._current, 'trace', None) is not None:
+            counted.append(sql)
+        record(sql, seconds)
+
+    monkeypatch.setattr(metrics, '_record_statement', counting)
+    response = client.get('/dashboard')
+    monkeypatch.setattr(metrics, '_record_statement', record)
+    assert response.status_code == 200
+    return len(counted)
+
+
+def test_student_dashboard_query_count_does_not_grow_with_courses(app, monkeypatch):
+    # Trace every request, so every statement is counted
+    app.config['METRICS_SAMPLE_RATE'] = 1.0
+    app.config['PAGE_SIZE'] = 50
+
+    instructor = app.test_client()
+    sign_up(instructor, 'teacher@example.com', 'instructor')
+    course_count = 12
+    for number in range(1, course_count + 1):
+        create_course(instructor, f'Course {number}')
+        for lesson in range(3):
+            instructor.post(f'/course/{number}/add_lesson',
+                            data={'title': f'Lesson {lesson + 1}', 'content': 'Text', 'video_url': ''})
+
+    student = app.test_client()
+    sign_up(student, 'student@example.com', 'student')
+    student.post('/enroll/1')
+    student.post('/complete_lesson/1')
+    one_course = _dashboard_statements(student, monkeypatch)
+
+    for number in range(2, course_count + 1):
+        student.post(f'/enroll/{number}')
+        # Finish the first lesson of every other course, so the cards differ
+        if number % 2:
+            student.post(f'/complete_lesson/{(number - 1) * 3 + 1}')
+    many_courses = _dashboard_statements(student, monkeypatch)
+
+    page = student.get('/dashboard').get_data(as_text=True)
+    assert page.count('Continue:') == course_count
+    assert one_course == many_courses == 2   # the page of courses + progress.course_summaries()
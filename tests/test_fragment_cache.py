@@ -0,0 +1,55 @@
+import sqlite3
+import threading
+
+from fragment_cache import SQLiteCache
+
+
+def _stored_bytes(path):
+    conn = sqlite3.connect(path)
+    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM fragments').fetchone()[0]
+    conn.close()
+    return total
+
+
+def test_sqlite_cache_keeps_a_running_byte_total(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = SQLiteCache(path, max_bytes=1000)
+    cache.set('a', 'x' * 300, tag=1)
+    cache.set('b', 'x' * 300, tag=2)
+    cache.set('a', 'x' * 100, tag=1)          # replaced with a smaller value
+    assert cache.info()['bytes'] == _stored_bytes(path) == 400
+
+    cache.set('c', 'x' * 400, tag=3)
+    cache.set('d', 'x' * 400, tag=3)          # over budget: the least recently used go
+    info = cache.info()
+    assert info['bytes'] == _stored_bytes(path) <= 1000
+    assert info['evictions'] >= 1
+    assert cache.get('d') == 'x' * 400
+
+    cache.invalidate(3)
+    assert cache.info()['bytes'] == _stored_bytes(path)
+
+
+def test_sqlite_cache_counts_existing_file_once(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    SQLiteCache(path).set('a', 'x' * 250)
+    # A second worker opening the same file sees the same total
+    assert SQLiteCache(path).info()['bytes'] == 250
+
+
+def test_sqlite_cache_counters_are_thread_safe(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.db'))
+    cache.set('hit', 'value')
+
+    def lookups():
+        for _ in range(200):
+            cache.get('hit')
+            cache.get('miss')
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    info = cache.info()
+    assert (info['hits'], info['misses']) == (1600, 1600)
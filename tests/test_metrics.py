@@ -0,0 +1,35 @@
+import metrics
+from db import get_db_connection
+
+
+def _traced_statements(app, run):
+    with app.test_request_context():
+        conn = get_db_connection()   # migrates the new database first, outside the trace
+        metrics._current.trace = metrics.RequestTrace(0)
+        try:
+            run(conn)
+            return metrics._current.trace.queries
+        finally:
+            metrics._current.trace = None
+
+
+def test_statements_are_counted(app):
+    def run(conn):
+        conn.execute('SELECT 1')
+        conn.cursor().execute('SELECT 2')
+        conn.execute('CREATE TEMP TABLE scratch (x)')
+        conn.executemany('INSERT INTO scratch (x) VALUES (?)', [(1,), (2,)])
+    assert _traced_statements(app, run) == 4
+
+
+def test_executescript_is_counted(app):
+    def run(conn):
+        conn.executescript('CREATE TEMP TABLE scratch (x); DROP TABLE scratch;')
+        conn.cursor().executescript('SELECT 1;')
+    assert _traced_statements(app, run) == 2
+
+
+def test_untraced_requests_are_not_counted(app):
+    with app.test_request_context():
+        metrics._current.trace = None
+        get_db_connection().execute('SELECT 1')   # no trace: nothing to record into, and no error
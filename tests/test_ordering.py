@@ -0,0 +1,55 @@
+import re
+
+from conftest import create_course, sign_up
+from db import get_db_connection
+
+
+def _course(app, lessons=3):
+    instructor = app.test_client()
+    sign_up(instructor, 'teacher@example.com', 'instructor')
+    create_course(instructor, 'Course')
+    for number in range(1, lessons + 1):
+        instructor.post('/course/1/add_lesson', data={'title': f'L{number}', 'content': 'Text', 'video_url': ''})
+    return instructor
+
+
+def _outline(client):
+    page = client.get('/course/1').get_data(as_text=True)
+    return re.findall(r'Lesson <span class="lesson-number ms-1">\d+</span>: (L\d+)', page)
+
+
+def _api_outline(client):
+    return [lesson['title'] for lesson in client.get('/api/v1/courses/1/lessons?fields=title').get_json()['items']]
+
+
+def test_move_lesson(app):
+    instructor = _course(app)
+    assert instructor.post('/lesson/3/move', data={'after_id': '1'}).status_code == 200
+    assert _outline(instructor) == ['L1', 'L3', 'L2']
+    assert instructor.post('/lesson/2/move', data={}).status_code == 200   # no after_id: to the front
+    assert _outline(instructor) == ['L2', 'L1', 'L3'] == _api_outline(instructor)
+
+
+def test_squeezing_one_spot_renumbers_and_keeps_the_order(app):
+    instructor = _course(app, lessons=4)
+    renumbered = 0
+    for turn in range(14):
+        # L1 and L4 take turns squeezing in right after L2
+        moved = 4 if turn % 2 else 1
+        renumbered += instructor.post(f'/lesson/{moved}/move', json={'after_id': 2}).get_json()['renumbered']
+    assert renumbered >= 1
+    assert _outline(instructor) == ['L2', 'L4', 'L1', 'L3']
+
+
+def test_lesson_without_a_key_stays_last(app):
+    instructor = _course(app)
+    with app.app_context():
+        conn = get_db_connection()
+        conn.execute('UPDATE lessons SET lesson_order = NULL WHERE id = 2')
+        conn.commit()
+    assert _outline(instructor) == ['L1', 'L3', 'L2'] == _api_outline(instructor)
+
+    # The first move renumbers the course; the keyless lesson must not jump to the front
+    response = instructor.post('/lesson/3/move', data={})
+    assert response.get_json()['renumbered']
+    assert _outline(instructor) == ['L3', 'L1', 'L2'] == _api_outline(instructor)
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+import passwords
+
+
+def _occupy(pool):
+    """Start a job that holds the pool's only worker until the returned event is set."""
+    release, started = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait(5)
+
+    def hold():
+        try:
+            pool.run(job)
+        except passwords.HashingBusy:
+            pass   # with a short timeout, the holder itself stops waiting; the job keeps its worker
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    assert started.wait(5)
+    return release, thread
+
+
+def test_full_pool_refuses_right_away():
+    pool = passwords.HashingPool(workers=1, queue_depth=0, timeout=5)
+    release, thread = _occupy(pool)
+    try:
+        with pytest.raises(passwords.HashingBusy):
+            pool.run(len, 'x')
+    finally:
+        release.set()
+        thread.join()
+    assert pool.run(len, 'x') == 1   # room again once the job is done
+    pool.shutdown()
+
+
+def test_timeout_is_reported_as_busy():
+    pool = passwords.HashingPool(workers=1, queue_depth=1, timeout=0.05)
+    release, thread = _occupy(pool)
+    try:
+        # Queued behind the running job for longer than the timeout
+        with pytest.raises(passwords.HashingBusy):
+            pool.run(len, 'x')
+    finally:
+        release.set()
+        thread.join()
+    pool.shutdown()
+
+
+def test_login_answers_503_with_retry_after_when_hashing_is_saturated(app):
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0)
+    client = app.test_client()
+    client.post('/signup', data={'name': 'a', 'email': 'a@example.com', 'password': 'pw',
+                                 'confirm_password': 'pw', 'role': 'student'})
+    with app.app_context():
+        release, thread = _occupy(passwords.get_pool())
+    try:
+        response = client.post('/login', data={'email': 'a@example.com', 'password': 'pw'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == str(passwords.HashingBusy.retry_after)
+    finally:
+        release.set()
+        thread.join()
+    assert client.post('/login', data={'email': 'a@example.com', 'password': 'pw'}).status_code == 302
@@ -0,0 +1,94 @@
+import sqlite3
+from unittest import mock
+
+import pytest
+
+import passwords
+import rate_limit
+from app import create_app
+from conftest import sign_up
+
+
+def _limited_app(tmp_path, backend='memory', limits=None):
+    return create_app({
+        'DATABASE': str(tmp_path / 'test.db'),
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'RATE_LIMIT': backend,
+        'RATE_LIMIT_PATH': str(tmp_path / 'rate_limit.db'),
+        'RATE_LIMITS': limits or {'main.login': {'ip': '5/60', 'account': '2/60'}},
+    })
+
+
+def _login(client, email, password='wrong'):
+    return client.post('/login', data={'email': email, 'password': password})
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_429_before_any_hashing(tmp_path, backend):
+    client = _limited_app(tmp_path, backend).test_client()
+    client.post('/signup', data={'name': 'a', 'email': 'a@example.com', 'password': 'pw',
+                                 'confirm_password': 'pw', 'role': 'student'})
+    with mock.patch('passwords.verify_password', wraps=passwords.verify_password) as verify:
+        assert [_login(client, 'a@example.com').status_code for _ in range(3)] == [302, 302, 429]
+        assert verify.call_count == 2
+    response = _login(client, 'a@example.com')
+    assert response.status_code == 429
+    assert 1 <= int(response.headers['Retry-After']) <= 30
+
+
+def test_refused_request_does_not_use_up_the_ip_budget(tmp_path):
+    client = _limited_app(tmp_path).test_client()
+    for _ in range(2):
+        _login(client, 'a@example.com')
+    # Refused by the account limit: these must not eat the 3 IP tokens that are left
+    for _ in range(5):
+        assert _login(client, 'a@example.com').status_code == 429
+    assert [_login(client, f'{n}@example.com').status_code for n in range(4)] == [302, 302, 302, 429]
+
+
+def test_sqlite_backend_is_shared_between_workers(tmp_path):
+    first = _limited_app(tmp_path, 'sqlite').test_client()
+    second = _limited_app(tmp_path, 'sqlite').test_client()
+    _login(first, 'a@example.com')
+    _login(first, 'a@example.com')
+    assert _login(second, 'a@example.com').status_code == 429
+
+
+def test_locked_sqlite_backend_lets_the_request_through(tmp_path):
+    app = _limited_app(tmp_path, 'sqlite')
+    client = app.test_client()
+    _login(client, 'a@example.com')   # creates the rate limit file
+    blocker = sqlite3.connect(str(tmp_path / 'rate_limit.db'), isolation_level=None)
+    blocker.execute('BEGIN IMMEDIATE')
+    try:
+        # Don't sit out the usual 5 second busy timeout
+        app.extensions['rate_limiter']._local.conn.execute('PRAGMA busy_timeout = 10')
+        assert _login(client, 'a@example.com').status_code == 302
+    finally:
+        blocker.execute('ROLLBACK')
+        blocker.close()
+
+
+def test_api_gets_json_429(tmp_path):
+    client = _limited_app(tmp_path, limits={'api.create_token': {'ip': '1/60'}}).test_client()
+    client.post('/api/v1/tokens', json={'email': 'a@example.com', 'password': 'pw'})
+    response = client.post('/api/v1/tokens', json={'email': 'a@example.com', 'password': 'pw'})
+    assert response.status_code == 429
+    assert response.get_json()['retry_after'] == int(response.headers['Retry-After'])
+
+
+def test_signed_in_routes_limit_per_account(tmp_path):
+    app = _limited_app(tmp_path, limits={'main.enroll': {'account': '2/60'}})
+    student = app.test_client()
+    sign_up(student, 'student@example.com', 'student')
+    codes = [student.post(f'/enroll/{n}').status_code for n in range(1, 4)]
+    assert codes == [302, 302, 429]
+
+
+def test_token_bucket_refills():
+    limit = rate_limit.parse_limit('2/10')
+    limiter = rate_limit.MemoryLimiter()
+    with mock.patch('time.monotonic', return_value=100.0):
+        assert [limiter.hit([('k', limit)])[0] for _ in range(3)] == [True, True, False]
+    with mock.patch('time.monotonic', return_value=105.0):
+        assert limiter.hit([('k', limit)])[0]
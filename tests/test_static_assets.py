@@ -0,0 +1,46 @@
+import gzip
+import json
+from unittest import mock
+
+from flask import url_for
+
+import static_assets
+from app import create_app
+
+
+def test_create_app_does_not_read_static_files(tmp_path):
+    with mock.patch('static_assets.build_manifest', wraps=static_assets.build_manifest) as build:
+        app = create_app({'DATABASE': str(tmp_path / 'test.db'),
+                          'STATIC_MANIFEST': str(tmp_path / 'missing.json')})
+        assert build.call_count == 0 and 'static_assets' not in app.extensions
+        with app.test_request_context():
+            first = url_for('static', filename='js/course_details.js')
+            second = url_for('static', filename='js/course_details.js')
+        assert build.call_count == 1   # built once, on first use
+    assert first == second != '/static/js/course_details.js'
+
+
+def test_written_manifest_is_used(app, tmp_path):
+    path = tmp_path / 'manifest.json'
+    app.config['STATIC_MANIFEST'] = str(path)
+    path.write_text(json.dumps({'js/course_details.js': 'js/course_details.fromfile.js'}))
+    with app.test_request_context():
+        assert url_for('static', filename='js/course_details.js') == '/static/js/course_details.fromfile.js'
+
+
+def test_hashed_files_are_immutable_and_gzipped(app):
+    with app.test_request_context():
+        url = url_for('static', filename='js/course_details.js')
+    client = app.test_client()
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.cache_control.immutable and response.cache_control.max_age == static_assets.ONE_YEAR
+    assert response.headers['Content-Encoding'] == 'gzip'
+    with open(f'{app.static_folder}/js/course_details.js', 'rb') as f:
+        assert gzip.decompress(response.get_data()) == f.read()
+
+    again = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+    plain = client.get('/static/js/course_details.js')   # the unhashed name still works
+    assert plain.status_code == 200 and not plain.cache_control.immutable
@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+from io import BytesIO
+
+from werkzeug.datastructures import FileStorage
+
+import db
+import uploads
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'pixels' * 20
+
+
+def _png():
+    return FileStorage(stream=BytesIO(PNG), filename='picture.png')
+
+
+def test_same_bytes_are_stored_once_and_purged_when_unused(app):
+    with app.app_context():
+        conn = db.get_db_connection()
+        first = uploads.save_upload(conn, _png())
+        second = uploads.save_upload(conn, _png())
+        conn.commit()
+        assert first == second and uploads.is_content_addressed(first)
+        path = os.path.join(app.config['UPLOAD_FOLDER'], first)
+
+        uploads.release(conn, first)
+        conn.commit()
+        assert uploads.purge_orphans(conn) == 0 and os.path.exists(path)   # one reference left
+        uploads.release(conn, first)
+        conn.commit()
+        assert uploads.purge_orphans(conn) == 1 and not os.path.exists(path)
+
+
+def test_upload_racing_the_orphan_purge_keeps_its_file(app, monkeypatch):
+    # The file is orphaned; the purge deletes its row, and while it is unlinking
+    # the file the same picture is uploaded again
+    with app.app_context():
+        conn = db.get_db_connection()
+        name = uploads.save_upload(conn, _png())
+        conn.commit()
+        uploads.release(conn, name)
+        conn.commit()
+    path = os.path.join(app.config['UPLOAD_FOLDER'], name)
+
+    unlinking = threading.Event()
+    remove = os.remove
+
+    def slow_remove(target):
+        if target == path and threading.current_thread().name == 'purge':
+            unlinking.set()
+            time.sleep(0.3)
+        remove(target)
+
+    monkeypatch.setattr(os, 'remove', slow_remove)
+
+    def purge():
+        with app.app_context():
+            purge_conn = db.connect(app.config['DATABASE'])
+            uploads.purge_orphans(purge_conn)
+            purge_conn.close()
+
+    thread = threading.Thread(target=purge, name='purge')
+    thread.start()
+    assert unlinking.wait(5)
+    with app.app_context():
+        conn = db.connect(app.config['DATABASE'])
+        assert uploads.save_upload(conn, _png()) == name
+        conn.commit()
+        thread.join()
+        refcount = conn.execute('SELECT refcount FROM uploads WHERE filename = ?', (name,)).fetchone()
+        conn.close()
+
+    assert refcount is not None and refcount[0] == 1
+    assert os.path.exists(path)
+    with open(path, 'rb') as f:
+        assert f.read() == PNG
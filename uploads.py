@@ -0,0 +1,129 @@
+import hashlib
+import os
+import tempfile
+
+from flask import current_app
+
+# Content-addressed storage for uploaded images (course thumbnails, profile pictures).
+# Every file is streamed to disk in chunks while it is hashed, then stored as
+# <sha256>.<ext>. Two instructors uploading "thumbnail.jpg" no longer overwrite
+# each other, and the same picture uploaded twice is only stored once.
+#
+# The uploads table counts how many rows (courses.thumbnail / users.profile_pic)
+# point at each file. save_upload() adds a reference and release() drops one,
+# both inside the caller's transaction. After committing, purge_orphans()
+# deletes the files nobody points at any more.
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+
+# Detected from the first bytes of the file, not trusted from its name
+_SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+
+
+class UploadError(Exception):
+    """The uploaded file was rejected (too big or not an image)."""
+
+
+def _detect_type(head):
+    for signature, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def is_content_addressed(filename):
+    """True for names created by save_upload(), which never change content."""
+    stem, _, extension = filename.partition('.')
+    return len(stem) == 64 and extension in ALLOWED_EXTENSIONS and all(c in '0123456789abcdef' for c in stem)
+
+
+def save_upload(conn, file):
+    """Store an uploaded file and add one reference to it. Returns the stored filename."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    max_bytes = current_app.config['MAX_UPLOAD_BYTES']
+    os.makedirs(upload_folder, exist_ok=True)
+
+    extension = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+    if extension not in ALLOWED_EXTENSIONS:
+        raise UploadError('Only JPG, PNG, GIF or WEBP images can be uploaded.')
+
+    digest = hashlib.sha256()
+    size = 0
+    detected = None
+    # Write to a temporary file in the SAME folder so the final rename is atomic
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if detected is None:
+                    detected = _detect_type(chunk) or ''
+                    if not detected:
+                        raise UploadError('That file does not look like an image.')
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f'Images must be smaller than {max_bytes // (1024 * 1024)} MB.')
+                digest.update(chunk)
+                out.write(chunk)
+
+        if size == 0:
+            raise UploadError('The uploaded file is empty.')
+
+        filename = f'{digest.hexdigest()}.{detected}'
+        final_path = os.path.join(upload_folder, filename)
+        conn.execute('''
+            INSERT INTO uploads (filename, size, refcount) VALUES (?, ?, 1)
+            ON CONFLICT (filename) DO UPDATE SET refcount = refcount + 1
+        ''', (filename, size))
+        # Only look at the disk once our reference is in: purge_orphans() deletes
+        # the row and the file while holding the write lock, so now the file is
+        # either safely there or already gone (then our copy takes its place)
+        if os.path.exists(final_path):
+            os.remove(temp_path)  # Same bytes are already stored
+        else:
+            os.replace(temp_path, final_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return filename
+
+
+def release(conn, filename):
+    """Drop one reference to filename (if any). The file is removed by purge_orphans()."""
+    if filename:
+        conn.execute('UPDATE uploads SET refcount = refcount - 1 WHERE filename = ? AND refcount > 0', (filename,))
+
+
+def purge_orphans(conn):
+    """Delete the files no row points at any more. Call AFTER committing."""
+    orphans = conn.execute('SELECT filename FROM uploads WHERE refcount = 0').fetchall()
+    removed = 0
+    for row in orphans:
+        # Re-check inside the delete, in case a new upload of the same bytes just claimed it
+        cursor = conn.execute('DELETE FROM uploads WHERE filename = ? AND refcount = 0', (row['filename'],))
+        if cursor.rowcount:
+            # Remove the file BEFORE committing: save_upload() can't add its
+            # reference until we let go of the write lock, and then it sees
+            # the file is gone and puts its own copy back
+            path = os.path.join(current_app.config['UPLOAD_FOLDER'], row['filename'])
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except BaseException:
+                conn.rollback()
+                raise
+            removed += 1
+        conn.commit()
+    return removed
@@ -0,0 +1,114 @@
+import hashlib
+import time
+
+from flask import make_response, request, session
+
+# Version stamps for conditional GET (ETag / Last-Modified / 304).
+# content_versions holds a counter + timestamp for the whole catalogue
+# ('catalogue') and for each course ('course:<id>'). Every write that changes
+# what /courses or /course/<id> would show calls bump() in the same
+# transaction, so a matching ETag really means "nothing changed".
+#
+# The pages are personalised (instructor buttons, completed lessons), so the
+# ETag also mixes in who is looking. Last-Modified / If-Modified-Since only
+# know about the content, not the viewer, so they are used for anonymous
+# visitors only; a signed-in page has to match its ETag. A page is never given validators while a
+# flash message is waiting, otherwise the browser could replay the message.
+
+CATALOGUE = 'catalogue'
+
+
+def course_scope(course_id):
+    return f'course:{course_id}'
+
+
+def bump(conn, course_id=None, catalogue=True):
+    """Mark a course (and, by default, the catalogue) as changed. The caller commits."""
+    scopes = []
+    if catalogue:
+        scopes.append(CATALOGUE)
+    if course_id is not None:
+        scopes.append(course_scope(course_id))
+    now = time.time()
+    conn.executemany('''
+        INSERT INTO content_versions (scope, version, updated_at) VALUES (?, 1, ?)
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+    ''', [(scope, now) for scope in scopes])
+
+
+def bump_all(conn):
+    """Mark every course and the catalogue as changed (after a bulk import). The caller commits."""
+    now = time.time()
+    conn.execute('''
+        INSERT OR IGNORE INTO content_versions (scope, version, updated_at)
+        SELECT 'course:' || id, 0, ? FROM courses -- full scan: stamping every course
+    ''', (now,))
+    conn.execute("INSERT OR IGNORE INTO content_versions (scope, version, updated_at) VALUES ('catalogue', 0, ?)", (now,))
+    conn.execute('UPDATE content_versions SET version = version + 1, updated_at = ? -- full scan: every stamp', (now,))
+
+
+def forget(conn, course_id):
+    """Drop a deleted course's stamp. The caller commits."""
+    conn.execute('DELETE FROM content_versions WHERE scope = ?', (course_scope(course_id),))
+
+
+def get_stamp(conn, scope):
+    """Return (version, updated_at) for scope, or None if it has never been stamped."""
+    row = conn.execute('SELECT version, updated_at FROM content_versions WHERE scope = ?', (scope,)).fetchone()
+    return (row['version'], row['updated_at']) if row else None
+
+
+def get_course_versions(conn, course_ids):
+    """Return {course_id: version} for many courses in one query."""
+    if not course_ids:
+        return {}
+    scopes = [course_scope(course_id) for course_id in course_ids]
+    rows = conn.execute(f'SELECT scope, version FROM content_versions WHERE scope IN ({", ".join("?" * len(scopes))})',
+                        scopes).fetchall()
+    return {int(row['scope'].split(':')[1]): row['version'] for row in rows}
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def viewer():
+    """The parts of the session that change how a page looks."""
+    return session.get('role'), session.get('user_id')
+
+
+def personalised():
+    """True when the page depends on who is signed in."""
+    return session.get('user_id') is not None
+
+
+def can_validate():
+    # A pending flash message is part of the next page, so that page is not cacheable
+    return '_flashes' not in session
+
+
+def not_modified(etag, last_modified):
+    """Return a 304 response if the browser's copy is still good, else None."""
+    if request.if_none_match:
+        # Weak comparison, as If-None-Match requires: a gzipped page sends its ETag as W/"..."
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and not personalised():
+        matched = int(last_modified) <= request.if_modified_since.timestamp()
+    else:
+        matched = False
+
+    if not matched:
+        return None
+    response = make_response('', 304)
+    return add_validators(response, etag, last_modified)
+
+
+def add_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if not personalised():
+        response.last_modified = int(last_modified)
+    # Personalised: only the browser may keep it, and it must check back every time
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response